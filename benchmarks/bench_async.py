@@ -0,0 +1,95 @@
+"""
+Benchmark of the async blog views against the sync ones under an ASGI server.
+Serves the app with uvicorn, through asgiref's WsgiToAsgi adapter,
+    once with the sync views and once with ASYNC_VIEWS,
+    and prints the requests per second of concurrent clients.
+
+Usage (with flaskr[async] and uvicorn installed):
+    python benchmarks/bench_async.py [--clients 32] [--seconds 5]
+"""
+import argparse
+import os
+import socket
+import tempfile
+import threading
+import time
+import urllib.request
+
+import uvicorn
+from asgiref.wsgi import WsgiToAsgi
+
+from bench_pool import seed
+from flaskr import create_app
+from flaskr.db import dispose_pool
+
+def free_port():
+    """
+    Returns a port nobody listens on
+    """
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def run(app, path, clients, seconds):
+    """
+    Serves the app with uvicorn and lets the given number of client
+        threads request path as fast as they can for the given time.
+    Returns the number of requests per second.
+    """
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(
+        WsgiToAsgi(app), host="127.0.0.1", port=port, log_level="error"
+    ))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    url = "http://127.0.0.1:{0}{1}".format(port, path)
+    counts = [0] * clients
+    deadline = time.perf_counter() + seconds
+
+    def client(i):
+        while time.perf_counter() < deadline:
+            with urllib.request.urlopen(url) as response:
+                response.read()
+            counts[i] += 1
+
+    threads = [threading.Thread(target=client, args=(i, )) for i in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    server.should_exit = True
+    thread.join()
+    return sum(counts) / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--posts", type=int, default=100)
+    parser.add_argument("--path", default="/search?q=body")
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp()
+    try:
+        for async_views in (False, True):
+            app = create_app({"DATABASE": db_path, "ASYNC_VIEWS": async_views})
+            seed(app, args.posts)
+            rate = run(app, args.path, args.clients, args.seconds)
+            dispose_pool(app)
+            print("ASYNC_VIEWS={0!s:<6} {1:10.1f} requests/sec".format(
+                async_views, rate
+            ))
+    finally:
+        os.close(db_fd)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.unlink(db_path + suffix)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark of the database connection pool.
+Runs the app under the threaded werkzeug server twice,
+    once opening a connection for every request (DATABASE_POOL_SIZE = 0)
+    and once with the connection pool,
+    and prints the requests per second of each run.
+
+Usage (with flaskr installed, e.g. pip install -e .):
+    python benchmarks/bench_pool.py [--threads 8] [--seconds 5]
+"""
+import argparse
+import logging
+import os
+import tempfile
+import threading
+import time
+import urllib.request
+
+from werkzeug.serving import make_server
+
+from flaskr import create_app
+from flaskr.blog import make_excerpt
+from flaskr.db import dispose_pool, get_db, init_db
+
+def seed(app, posts):
+    """
+    Creates the schema and one user with the given number of posts
+    """
+    with app.app_context():
+        init_db()
+        db = get_db()
+        db.execute("INSERT INTO user (username, password) VALUES ('bench', '')")
+        db.executemany(
+            "INSERT INTO post (title, body, excerpt, author_id)"
+            " VALUES (?, ?, ?, 1)",
+            [("post {0}".format(i), "body " * 50, make_excerpt("body " * 50))
+             for i in range(posts)]
+        )
+        db.commit()
+
+def run(app, path, threads, seconds):
+    """
+    Serves the app on a free port and lets the given number of client
+        threads request path as fast as they can for the given time.
+    Returns the number of requests per second.
+    """
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:{0}{1}".format(server.server_port, path)
+
+    counts = [0] * threads
+    deadline = time.perf_counter() + seconds
+
+    def client(i):
+        while time.perf_counter() < deadline:
+            with urllib.request.urlopen(url) as response:
+                response.read()
+            counts[i] += 1
+
+    clients = [
+        threading.Thread(target=client, args=(i, )) for i in range(threads)
+    ]
+    start = time.perf_counter()
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    server.shutdown()
+    return sum(counts) / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--posts", type=int, default=100)
+    parser.add_argument("--pool-size", type=int, default=8)
+    parser.add_argument("--path", default="/")
+    args = parser.parse_args()
+
+    # Do not print a log line for every request
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    db_fd, db_path = tempfile.mkstemp()
+    try:
+        for pool_size in (0, args.pool_size):
+            app = create_app({"DATABASE": db_path, "DATABASE_POOL_SIZE": pool_size})
+            seed(app, args.posts)
+            rate = run(app, args.path, args.threads, args.seconds)
+            dispose_pool(app)
+            print("DATABASE_POOL_SIZE={0:<3} {1:10.1f} requests/sec".format(
+                pool_size, rate
+            ))
+    finally:
+        os.close(db_fd)
+        os.unlink(db_path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Concurrent read/write load test of the database pragma profiles.
+While writer threads keep committing new posts, reader threads keep
+    requesting the index, once for every profile in PRAGMA_PROFILES.
+Prints the read latencies, which stall behind the writers'
+    commits with the default rollback journal but not in WAL mode.
+
+Usage (with flaskr installed, e.g. pip install -e .):
+    python benchmarks/bench_wal.py [--readers 4] [--writers 2] [--seconds 5]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from flaskr import create_app
+from flaskr.db import PRAGMA_PROFILES, dispose_pool, get_db, get_pool, init_db
+
+def percentile(values, p):
+    """
+    Returns the p-th percentile of a sorted list of values
+    """
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+def run(app, readers, writers, seconds):
+    """
+    Runs the reader and writer threads against the app for the given time.
+    Returns the sorted read latencies in milliseconds and the number of writes.
+    """
+    latencies, writes = [], [0]
+    deadline = time.perf_counter() + seconds
+
+    def reader():
+        client = app.test_client()
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            client.get("/")
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    def writer():
+        with app.app_context():
+            db = get_pool().connect()
+        while time.perf_counter() < deadline:
+            # The body is shorter than the excerpt length, so it is its own excerpt
+            db.execute(
+                "INSERT INTO post (title, body, excerpt, author_id)"
+                " VALUES (?, ?, ?, 1)",
+                ("post", "body " * 50, "body " * 50)
+            )
+            db.commit()
+            writes[0] += 1
+        db.close()
+
+    threads = [threading.Thread(target=reader) for i in range(readers)]
+    threads += [threading.Thread(target=writer) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), writes[0]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    for profile in PRAGMA_PROFILES:
+        db_fd, db_path = tempfile.mkstemp()
+        app = create_app({"DATABASE": db_path, "DATABASE_PRAGMAS": profile})
+        try:
+            with app.app_context():
+                init_db()
+                db = get_db()
+                db.execute("INSERT INTO user (username, password) VALUES ('bench', '')")
+                db.commit()
+
+            latencies, writes = run(app, args.readers, args.writers, args.seconds)
+            print(
+                "{0:<8} reads {1:6d}  p50 {2:7.2f}ms  p99 {3:7.2f}ms"
+                "  max {4:8.2f}ms  writes {5:6d}".format(
+                    profile, len(latencies), percentile(latencies, 50),
+                    percentile(latencies, 99), latencies[-1], writes
+                )
+            )
+        finally:
+            dispose_pool(app)
+            os.close(db_fd)
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(db_path + suffix):
+                    os.unlink(db_path + suffix)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Compares two result files of suite.py, usually of two commits.
+Prints the change in throughput and latency of every scenario,
+    and exits with status 1 if any scenario got slower than the threshold,
+    so it can fail a CI job.
+
+Usage:
+    python benchmarks/compare.py BASELINE.json CURRENT.json [--threshold 10]
+"""
+import argparse
+import json
+import sys
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+def change(old, new):
+    """
+    Returns the change from old to new in percent, or None if unknown
+    """
+    if not old or new is None:
+        return None
+    return (new - old) / old * 100
+
+def compare(baseline, current, threshold):
+    """
+    Prints the comparison of every scenario found in both results,
+        and returns the names of the scenarios that regressed,
+        losing more than threshold percent of their throughput
+        or adding more than threshold percent to their p99 latency
+    """
+    regressions = []
+    print("{0:<9} {1:>10} {2:>10} {3:>8}  {4:>9} {5:>9} {6:>8}".format(
+        "scenario", "req/s", "was", "change", "p99 ms", "was", "change"
+    ))
+    for name, new in current["scenarios"].items():
+        old = baseline["scenarios"].get(name)
+        if old is None:
+            continue
+        # Fewer clients were busy for part of the run, so it measured less
+        for result, which in ((old, "baseline"), (new, "current")):
+            if result.get("clients_stopped_early"):
+                print("Warning: clients of {0} stopped early in {1}".format(
+                    name, which
+                ))
+        rps = change(old["requests_per_second"], new["requests_per_second"])
+        p99 = change(old["latency_ms"]["p99"], new["latency_ms"]["p99"])
+        regressed = ((rps is not None and rps < -threshold)
+                     or (p99 is not None and p99 > threshold))
+        if regressed:
+            regressions.append(name)
+        print("{0:<9} {1:10.1f} {2:10.1f} {3:>8}  {4:9.2f} {5:9.2f} {6:>8}{7}".format(
+            name, new["requests_per_second"], old["requests_per_second"],
+            format_change(rps), new["latency_ms"]["p99"] or 0,
+            old["latency_ms"]["p99"] or 0, format_change(p99),
+            "  REGRESSION" if regressed else ""
+        ))
+    return regressions
+
+def format_change(percent):
+    return "n/a" if percent is None else "{0:+.1f}%".format(percent)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=10,
+                        help="percent change counted as a regression")
+    args = parser.parse_args()
+
+    baseline, current = load(args.baseline), load(args.current)
+    # Results of different setups cannot be compared fairly
+    for key in ("mode", "users", "posts", "clients", "workers"):
+        if baseline.get(key) != current.get(key):
+            print("Warning: {0} differs ({1} and {2})".format(
+                key, baseline.get(key), current.get(key)
+            ))
+    print("Comparing {0} to {1}".format(
+        (current.get("commit") or "?")[:10], (baseline.get("commit") or "?")[:10]
+    ))
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print("Regressed: {0}".format(", ".join(regressions)))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""
+Seeds a flaskr database with users and posts for benchmarking.
+Every user is called user<n> and has the password "bench",
+    and posts are shared out between the users in turn.
+
+Usage (with flaskr installed, e.g. pip install -e .):
+    python benchmarks/seed.py DATABASE [--users 1000] [--posts 100000]
+"""
+import argparse
+import time
+
+from werkzeug.security import generate_password_hash
+
+from flaskr import create_app
+from flaskr.blog import make_excerpt
+from flaskr.db import dispose_pool, get_db, init_db
+
+# Password of every seeded user
+PASSWORD = "bench"
+
+def seed(app, users, posts, body_words=50, batch_size=10000):
+    """
+    Creates the schema, then the given number of users and posts,
+        inserted with executemany in batches of batch_size rows.
+    Posts are one second apart, the most recent one being the last.
+    """
+    # Hashing is slow on purpose, so every user gets the same hash,
+    #   made with the method the app is configured with
+    pwhash = generate_password_hash(
+        PASSWORD, app.config["PASSWORD_HASH_METHOD"]
+    )
+    body = " ".join("word{0}".format(i % 100) for i in range(body_words))
+
+    with app.app_context():
+        excerpt = make_excerpt(body)
+        init_db()
+        db = get_db()
+        for start in range(0, users, batch_size):
+            db.executemany(
+                "INSERT INTO user (username, password) VALUES (?, ?)",
+                [("user{0}".format(i), pwhash)
+                 for i in range(start, min(start + batch_size, users))]
+            )
+        for start in range(0, posts, batch_size):
+            db.executemany(
+                "INSERT INTO post"
+                " (title, body, excerpt, truncated, author_id, created)"
+                " VALUES (?, ?, ?, ?, ?, datetime('2020-01-01', ? || ' seconds'))",
+                [("post {0}".format(i), body, excerpt, excerpt != body,
+                  i % users + 1, i)
+                 for i in range(start, min(start + batch_size, posts))]
+            )
+        db.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("database")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--posts", type=int, default=100000)
+    parser.add_argument("--body-words", type=int, default=50)
+    args = parser.parse_args()
+
+    app = create_app({"DATABASE": args.database})
+    start = time.perf_counter()
+    seed(app, args.users, args.posts, args.body_words)
+    dispose_pool(app)
+    print("Seeded {0} users and {1} posts in {2:.1f}s".format(
+        args.users, args.posts, time.perf_counter() - start
+    ))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+"""
+Load test of the flaskr endpoints, with results stored as JSON.
+Seeds a database, then runs every scenario for a fixed time with
+    concurrent clients, either in this process through the Flask test
+    client, or over HTTP against a local server with several worker
+    processes. Prints and saves the throughput and latency percentiles
+    of every scenario, to be compared between commits with compare.py.
+
+Usage (with flaskr installed, e.g. pip install -e .):
+    python benchmarks/suite.py [--mode inprocess|server] [--users 100]
+        [--posts 10000] [--clients 8] [--seconds 10] [--workers 4]
+        [--scenario index ...] [--output results.json]
+"""
+import argparse
+import http.cookiejar
+import itertools
+import json
+import logging
+import os
+import platform
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from werkzeug.serving import make_server
+
+from seed import PASSWORD, seed
+from flaskr import create_app
+from flaskr.db import dispose_pool, get_db
+
+# Configuration of the app under test, on top of the defaults.
+#   Logins would be rate limited at once otherwise.
+CONFIG = {
+    "LOGIN_RATE_LIMIT": 10 ** 9,
+}
+
+class InProcessClient(object):
+    """
+    A client calling the app in this process through the Flask test client
+    """
+    def __init__(self, app):
+        self._client = app.test_client()
+
+    def get(self, path):
+        return self._client.get(path).status_code
+
+    def post(self, path, data):
+        return self._client.post(path, data=data).status_code
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """
+    Makes urllib return redirects instead of following them,
+        so that every measured request is exactly one request
+    """
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+class HTTPClient(object):
+    """
+    A client calling a server over HTTP, keeping its session cookie
+    """
+    def __init__(self, base_url):
+        self._base_url = base_url
+        self._opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+            _NoRedirect,
+        )
+
+    def _open(self, path, data=None):
+        if data is not None:
+            data = urllib.parse.urlencode(data).encode("ascii")
+        try:
+            with self._opener.open(self._base_url + path, data) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def get(self, path):
+        return self._open(path)
+
+    def post(self, path, data):
+        return self._open(path, data)
+
+class Scenario(object):
+    """
+    One kind of request to measure.
+    setup is called once per client before the clock starts,
+        with the client and its number, and returns the client state.
+    request is called in a loop with the client, its state and the
+        number of the request, and returns the HTTP status, or None
+        without sending a request once the client has nothing left to do,
+        which stops that client.
+    """
+    def __init__(self, name, request, setup=None):
+        self.name = name
+        self.request = request
+        self.setup = setup or (lambda client, i, db: None)
+
+def login(client, i, db):
+    """
+    Logs client number i in as its own seeded user,
+        and returns the ids of the posts of that user
+    """
+    client.post("/auth/login", {"username": "user{0}".format(i), "password": PASSWORD})
+    return [row[0] for row in db.execute(
+        "SELECT p.id FROM post p JOIN user u ON p.author_id = u.id"
+        " WHERE username = ? ORDER BY p.id", ("user{0}".format(i), )
+    ).fetchall()]
+
+def update(client, post_ids, n):
+    return client.post(
+        "/{0}/update".format(post_ids[n % len(post_ids)]),
+        {"title": "updated {0}".format(n), "body": "updated body"}
+    )
+
+def delete(client, post_ids, n):
+    # Once a client has deleted all its posts it stops, rather than
+    #   measure requests it did not send. Seed enough posts per user
+    #   for the length of the run to keep every client busy.
+    if n >= len(post_ids):
+        return None
+    return client.post("/{0}/delete".format(post_ids[n]), {})
+
+# Every register needs a new username, across clients and workers
+_registered = itertools.count()
+
+SCENARIOS = [
+    Scenario("index", lambda client, state, n: client.get("/")),
+    Scenario("create", lambda client, state, n: client.post(
+        "/create", {"title": "bench {0}".format(n), "body": "bench body"}
+    ), setup=login),
+    Scenario("update", update, setup=login),
+    Scenario("delete", delete, setup=login),
+    Scenario("login", lambda client, state, n: client.post(
+        "/auth/login", {"username": state, "password": PASSWORD}
+    ), setup=lambda client, i, db: "user{0}".format(i)),
+    Scenario("register", lambda client, state, n: client.post(
+        "/auth/register",
+        {"username": "new{0}-{1}".format(os.getpid(), next(_registered)),
+         "password": PASSWORD}
+    )),
+]
+
+def percentile(values, p):
+    """
+    Returns the p-th percentile of a sorted list of values
+    """
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+def run_scenario(scenario, make_client, clients, seconds, db):
+    """
+    Runs the scenario with the given number of concurrent clients
+        for the given time, and returns its statistics
+    """
+    latencies, errors, finished, early = [], [0], [], [0]
+    lock = threading.Lock()
+    # The clock starts once every client is set up
+    deadline = []
+    ready = threading.Barrier(clients, action=lambda: deadline.append(
+        time.perf_counter() + seconds
+    ))
+
+    def client_thread(i):
+        client = make_client()
+        # The clients share one connection to look up their posts
+        with lock:
+            state = scenario.setup(client, i, db)
+        ready.wait()
+        mine, n = [], 0
+        while time.perf_counter() < deadline[0]:
+            start = time.perf_counter()
+            status = scenario.request(client, state, n)
+            if status is None:
+                with lock:
+                    early[0] += 1
+                break
+            mine.append(time.perf_counter() - start)
+            if status >= 400:
+                with lock:
+                    errors[0] += 1
+            n += 1
+        with lock:
+            latencies.extend(mine)
+            finished.append(time.perf_counter())
+
+    threads = [threading.Thread(target=client_thread, args=(i, ))
+               for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Clients that stop early only count for the time they ran,
+    #   and if they all did, the run is as long as the last of them
+    elapsed = max(finished) - deadline[0] + seconds
+
+    latencies.sort()
+    ms = lambda value: None if value is None else round(value * 1000, 3)
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "clients_stopped_early": early[0],
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "p50": ms(percentile(latencies, 50)),
+            "p90": ms(percentile(latencies, 90)),
+            "p99": ms(percentile(latencies, 99)),
+            "max": ms(latencies[-1] if latencies else None),
+        },
+    }
+
+def start_server(config, workers, threaded=True):
+    """
+    Starts a server of the app with the given number of worker processes,
+        all accepting connections on one listening socket.
+    Returns the base url and the worker process ids.
+    """
+    listener = socket.socket()
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(128)
+    port = listener.getsockname()[1]
+
+    pids = []
+    for i in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            # Worker process: serve until killed. It leads its own process
+            #   group, so its password hashing processes are killed with it.
+            os.setpgrp()
+            app = create_app(config)
+            server = make_server(
+                "127.0.0.1", port, app, threaded=threaded, fd=listener.fileno()
+            )
+            server.serve_forever()
+            os._exit(0)
+        pids.append(pid)
+    listener.close()
+    return "http://127.0.0.1:{0}".format(port), pids
+
+def stop_server(pids):
+    """
+    Stops the worker processes of start_server
+    """
+    for pid in pids:
+        os.killpg(pid, signal.SIGTERM)
+    for pid in pids:
+        os.waitpid(pid, 0)
+
+def git_commit():
+    """
+    Returns the commit being benchmarked, if this is a git checkout
+    """
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mode", choices=("inprocess", "server"),
+                        default="inprocess")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--posts", type=int, default=10000)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--scenario", action="append",
+                        choices=[scenario.name for scenario in SCENARIOS])
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    if args.clients > args.users:
+        parser.error("every client needs its own user, raise --users")
+
+    # Do not print a log line for every request
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    db_fd, db_path = tempfile.mkstemp()
+    config = dict(CONFIG, DATABASE=db_path)
+    results = {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "mode": args.mode,
+        "users": args.users,
+        "posts": args.posts,
+        "clients": args.clients,
+        "seconds": args.seconds,
+        "workers": args.workers if args.mode == "server" else None,
+        "scenarios": {},
+    }
+
+    try:
+        for scenario in SCENARIOS:
+            if args.scenario and scenario.name not in args.scenario:
+                continue
+
+            # Every scenario starts from the same freshly seeded database
+            app = create_app(config)
+            seed(app, args.users, args.posts)
+            dispose_pool(app)
+
+            pids = []
+            if args.mode == "server":
+                base_url, pids = start_server(config, args.workers)
+                make_client = lambda: HTTPClient(base_url)
+            else:
+                make_client = lambda: InProcessClient(app)
+
+            try:
+                with app.app_context():
+                    stats = run_scenario(
+                        scenario, make_client, args.clients, args.seconds,
+                        get_db()
+                    )
+            finally:
+                stop_server(pids)
+                dispose_pool(app)
+
+            results["scenarios"][scenario.name] = stats
+            print("{0:<9} {1:9.1f} req/s  p50 {2:8.2f}ms  p99 {3:8.2f}ms"
+                  "  errors {4}".format(
+                      scenario.name, stats["requests_per_second"],
+                      stats["latency_ms"]["p50"] or 0,
+                      stats["latency_ms"]["p99"] or 0, stats["errors"]))
+            if stats["clients_stopped_early"]:
+                print("Warning: {0} clients of {1} ran out of work,"
+                      " raise --posts".format(
+                          stats["clients_stopped_early"], scenario.name))
+    finally:
+        os.close(db_fd)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.unlink(db_path + suffix)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print("Saved results to {0}".format(args.output))
+
+if __name__ == "__main__":
+    sys.exit(main())
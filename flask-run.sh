@@ -1,17 +1,28 @@
 #!/bin/bash
 
-# Production
-#export FLASK_APP=hello.py
-#export FLASK_ENV=production
-#flask run --host=0.0.0.0
-
-# Development
+# Usage: ./flask-run.sh [production]
 
 # FLASK_APP is an environment variable
-#   which tells flask what module to import 
+#   which tells flask what module to import
 #   at flask run
 export FLASK_APP=flaskr
 
+# Production
+#   flaskr serve runs the app under gunicorn (pip install flaskr[serve])
+#   with several worker processes, by default 2 per CPU plus 1.
+#   FLASKR_BIND, FLASKR_WORKERS and FLASKR_THREADS change the defaults,
+#   see flaskr serve --help. Behind a reverse proxy like nginx, set
+#   TRUSTED_PROXIES in instance/config.py to the number of proxies,
+#   or every client counts as the proxy's address for the login rate limit.
+#   Send SIGHUP to the server process
+#   to replace its workers gracefully.
+if [ "$1" = "production" ]; then
+    export FLASK_ENV=production
+    exec flaskr serve --bind "${FLASKR_BIND:-0.0.0.0:8000}"
+fi
+
+# Development
+
 # FLASK_ENV is an environment variable
 #   which determines what mode flask will be run
 #   In development mode, the app activate the debugger,
@@ -19,5 +30,4 @@ export FLASK_APP=flaskr
 export FLASK_ENV=development
 
 # We run the flask app
-flask run 
-
+flask run
@@ -2,6 +2,7 @@ import os
 import click
 from flask import Flask
 from flask.cli import with_appcontext 
+from jinja2 import FileSystemBytecodeCache
 
 def create_app(test_config=None):
     """
@@ -20,9 +21,94 @@ def create_app(test_config=None):
     #   SECRET_KEY will be a key to encrypt data, set to "dev" during development
     #   DATABASE will be the path where the database instance will be stored
     #       it is set to be inside Flask instance/ directory.
+    #   DATABASE_READ is the path of a copy of the database, such as a
+    #       replica, that pages are read from through read-only connections.
+    #       None reads DATABASE through read-only connections.
+    #   DATABASE_POOL_SIZE is the number of idle database connections
+    #       kept open between requests, 0 opens one for every request.
+    #   DATABASE_PRAGMAS is the pragma profile applied to new connections,
+    #       see PRAGMA_PROFILES in db.py
+    #   ASYNC_VIEWS replaces the blog views by their async variants,
+    #       which need the asgiref package (pip install flaskr[async]).
+    #       Their database calls run on DATABASE_ASYNC_THREADS threads.
+    #   WRITE_QUEUE hands the writes of requests to one writer thread,
+    #       which commits up to WRITE_QUEUE_BATCH_SIZE of them at once,
+    #       waiting at most WRITE_QUEUE_MAX_LATENCY seconds for them to
+    #       gather. Requests still wait for their write to be committed,
+    #       but at most WRITE_QUEUE_TIMEOUT seconds. The writer commits
+    #       with synchronous=FULL, so a write is on disk once it returns.
+    #   METRICS_ENABLED times requests, queries, templates and password
+    #       hashing, and serves the timings at /_metrics for Prometheus.
+    #   SLOW_QUERY_SECONDS logs a warning for every statement slower than it,
+    #       None turns the slow query log off.
+    #   POSTS_PER_PAGE is the number of posts shown on each page of the index
+    #   STREAM_PAGES sends the pages of posts while they are rendered,
+    #       reading the posts from the cursor, instead of all at once.
+    #       Streamed pages are not kept in the page cache.
+    #   POST_EXCERPT_LENGTH is the most characters of a post body shown on
+    #       the pages of posts. Excerpts are made when a post is saved,
+    #       so a new length only applies to posts saved after the change.
+    #   FEED_SIZE is the number of latest posts in the Atom and RSS feeds.
+    #   PAGE_CACHE is where rendered pages are kept, "lru" keeps them in
+    #       memory, "null" turns the cache off, see cache.py for others.
+    #       PAGE_CACHE_SIZE pages are kept for at most PAGE_CACHE_TTL seconds.
+    #   FRAGMENT_CACHE_SIZE rendered posts are kept in memory for the index.
+    #   TEMPLATE_BYTECODE_CACHE is the directory where compiled templates
+    #       are kept between restarts, None turns it off.
+    #   USER_CACHE_SIZE logged in users are kept in memory
+    #       for at most USER_CACHE_TTL seconds.
+    #   PASSWORD_HASH_METHOD and PASSWORD_SALT_LENGTH are how passwords are
+    #       hashed, see werkzeug.security.generate_password_hash.
+    #       Passwords hashed otherwise are hashed again at the next login.
+    #   PASSWORD_HASH_WORKERS is the number of processes hashing passwords,
+    #       0 hashes them in the request itself.
+    #   LOGIN_RATE_LIMIT is how many times an address or a username may try
+    #       to log in or register within LOGIN_RATE_WINDOW seconds.
+    #   TRUSTED_PROXIES is the number of reverse proxies, like nginx, in
+    #       front of the app. Their X-Forwarded-For and X-Forwarded-Proto
+    #       headers are then trusted for the address and scheme of the
+    #       client, or else the rate limit counts every client behind the
+    #       proxy as one address. Leave it 0 without a proxy, since
+    #       clients could otherwise send any address they like.
+    #   COMPRESS_MIN_SIZE is the smallest body, in bytes, of an HTML or JSON
+    #       response compressed with gzip, or brotli if the brotli package
+    #       is installed (pip install flaskr[brotli]). None turns it off.
+    #   STATIC_FINGERPRINTS puts the hash of every static file in its url,
+    #       so browsers keep the file until it changes. flask
+    #       precompress-static writes compressed variants of the files.
     app.config.from_mapping(
         SECRET_KEY="dev",
         DATABASE=os.path.join(app.instance_path, "flaskr.sqlite"),
+        DATABASE_READ=None,
+        DATABASE_POOL_SIZE=8,
+        DATABASE_PRAGMAS="wal",
+        ASYNC_VIEWS=False,
+        DATABASE_ASYNC_THREADS=4,
+        WRITE_QUEUE=False,
+        WRITE_QUEUE_BATCH_SIZE=64,
+        WRITE_QUEUE_MAX_LATENCY=0.002,
+        WRITE_QUEUE_TIMEOUT=30,
+        METRICS_ENABLED=False,
+        SLOW_QUERY_SECONDS=None,
+        POSTS_PER_PAGE=10,
+        STREAM_PAGES=False,
+        POST_EXCERPT_LENGTH=300,
+        FEED_SIZE=20,
+        PAGE_CACHE="lru",
+        PAGE_CACHE_SIZE=256,
+        PAGE_CACHE_TTL=300,
+        FRAGMENT_CACHE_SIZE=1024,
+        TEMPLATE_BYTECODE_CACHE=os.path.join(app.instance_path, "jinja"),
+        USER_CACHE_SIZE=1024,
+        USER_CACHE_TTL=60,
+        PASSWORD_HASH_METHOD="pbkdf2:sha256:260000",
+        PASSWORD_SALT_LENGTH=16,
+        PASSWORD_HASH_WORKERS=min(4, os.cpu_count() or 1),
+        LOGIN_RATE_LIMIT=10,
+        LOGIN_RATE_WINDOW=60,
+        TRUSTED_PROXIES=0,
+        COMPRESS_MIN_SIZE=500,
+        STATIC_FINGERPRINTS=True,
     )
     
     # Ensure that the instance folder exists
@@ -43,6 +129,14 @@ def create_app(test_config=None):
         app.config.from_mapping(test_config)
         print(" * Test Configuration")
 
+    # Keep compiled templates on disk, so that new processes
+    #   load them instead of compiling every template again
+    if app.config["TEMPLATE_BYTECODE_CACHE"]:
+        os.makedirs(app.config["TEMPLATE_BYTECODE_CACHE"], exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(
+            app.config["TEMPLATE_BYTECODE_CACHE"]
+        )
+
     # Initializes config.py by command line
     @click.command("init-key-config")
     @with_appcontext
@@ -60,12 +154,44 @@ def create_app(test_config=None):
     def hello():
         return "Hello World!"
 
+    # Time requests and serve the timings, if asked to.
+    #   This comes first, so that it times everything that follows.
+    from . import metrics
+    metrics.init_app(app)
+
+    # Compress responses. This comes after the metrics, so that
+    #   it runs before them and they time the compression too.
+    from . import compress
+    compress.init_app(app)
+
+    # Serve fingerprinted and precompressed static files
+    from . import assets
+    assets.init_app(app)
+
     # Register init_db_command and close_db from db.py file
     from . import db
     db.init_app(app)
 
-    # Register the authentication blueprint
+    # Register the build-static command
+    from . import staticsite
+    staticsite.init_app(app)
+
+    # Register the serve command, which runs the app in production
+    from . import serve
+    serve.init_app(app)
+
+    # Register the export-posts and import-posts commands
+    from . import transfer
+    transfer.init_app(app)
+
+    # Create the rendered page cache
+    from . import cache
+    cache.init_app(app)
+
+    # Register the authentication blueprint,
+    #   which also loads g.user from the session
     from . import auth
+    auth.init_app(app)
     app.register_blueprint(auth.bp)
 
     # Register the blog blueprint
@@ -74,5 +200,23 @@ def create_app(test_config=None):
     # Makes sure that url_for("index") and url_for("blog.index") are same
     app.add_url_rule("/", endpoint="index")
 
+    # Register the JSON API blueprint
+    from . import api
+    app.register_blueprint(api.bp)
+
+    # Replace the blog views by their async variants, if asked to
+    if app.config["ASYNC_VIEWS"]:
+        from . import blog_async
+        blog_async.init_app(app)
+
+    # Take the address of the client from the headers of trusted proxies
+    if app.config["TRUSTED_PROXIES"]:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(
+            app.wsgi_app,
+            x_for=app.config["TRUSTED_PROXIES"],
+            x_proto=app.config["TRUSTED_PROXIES"],
+        )
+
     # Return app
     return app
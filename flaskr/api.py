@@ -0,0 +1,285 @@
+import functools
+from datetime import datetime
+from flask import Blueprint, g, json, jsonify, request, url_for
+from werkzeug.exceptions import HTTPException, abort
+from flaskr.blog import (
+    create_post, delete_post, get_author, get_post, get_post_revision,
+    get_posts_page, get_revision, update_post
+)
+from flaskr.cache import conditional
+from flaskr.db import MAX_INTEGER, get_db, get_read_db
+
+# Blueprint object for the JSON API, versioned by its url prefix
+#   so that clients keep working when a later version changes
+bp = Blueprint("api", __name__, url_prefix="/api/v1")
+
+# The fields of a post clients may ask for with ?fields=,
+#   and the column each one is read from
+POST_FIELDS = {
+    "id": "p.id",
+    "title": "title",
+    "body": "body",
+    "excerpt": "excerpt",
+    "created": "created",
+    "updated": "updated",
+    "version": "version",
+    "author_id": "author_id",
+    "author": "username AS author",
+}
+# The fields of a post sent without ?fields=, like the pages of posts,
+#   and of one post, which also has its body
+LIST_FIELDS = ("id", "title", "excerpt", "author", "created", "updated")
+POST_DETAIL_FIELDS = LIST_FIELDS + ("body", "version")
+
+# The fields of a user
+USER_FIELDS = ("id", "username", "post_count")
+
+# The most posts asked for at once with ?ids=
+MAX_IDS = 100
+
+def login_required(view):
+    """
+    This function is a decorator.
+    It checks that the user is logged in, like auth.login_required,
+        but answers 401 instead of redirecting to the login page,
+        which an API client cannot use.
+    """
+    @functools.wraps(view)
+    def wrapped_view(**kwargs):
+        if g.user is None:
+            abort(401)
+        return view(**kwargs)
+
+    return wrapped_view
+
+def get_fields(available, default):
+    """
+    Reads the comma separated ?fields= of the request,
+        or returns default if there are none,
+        and aborts with 400 error if one is not in available
+    """
+    fields = request.args.get("fields")
+    if not fields:
+        return default
+    # Repeated fields are only sent once
+    fields = tuple(dict.fromkeys(
+        field.strip() for field in fields.split(",") if field.strip()
+    ))
+    unknown = [field for field in fields if field not in available]
+    if unknown or not fields:
+        abort(400, "Unknown fields: {0}.".format(", ".join(unknown)))
+    return fields
+
+def get_columns(fields):
+    """
+    Returns the columns to select for the fields of a post.
+    The id and created time are always read, for the page cursors.
+    """
+    return ", ".join(
+        POST_FIELDS[field] for field in dict.fromkeys(("id", "created") + fields)
+    )
+
+def get_ids():
+    """
+    Reads the comma separated ?ids= of the request, in order and
+        without repeats, and aborts with 400 error if they are not
+        integers sqlite can hold or more than MAX_IDS
+    """
+    try:
+        ids = tuple(dict.fromkeys(
+            int(id) for id in request.args["ids"].split(",") if id.strip()
+        ))
+    except ValueError:
+        abort(400, "Invalid post ids.")
+    if any(not 0 <= id <= MAX_INTEGER for id in ids):
+        abort(400, "Invalid post ids.")
+    if len(ids) > MAX_IDS:
+        abort(400, "At most {0} post ids at once.".format(MAX_IDS))
+    return ids
+
+def to_json(row, fields):
+    """
+    Turns a row into a dict of the fields, with times in ISO 8601.
+    sqlite timestamps are UTC, which the Z says.
+    """
+    data = {}
+    for field in fields:
+        value = row[field]
+        if isinstance(value, datetime):
+            value = value.isoformat() + "Z"
+        data[field] = value
+    return data
+
+def get_posts_by_ids(ids, fields, db=None):
+    """
+    Retrieves the posts with the ids in one query, instead of one get_post
+        per id, in the order of ids. Posts that do not exist are left out.
+    They are read from the read-only connection, unless given another db.
+    """
+    if not ids:
+        return []
+    posts = (db or get_read_db()).execute(
+        "SELECT " + get_columns(fields) +
+        " FROM post p JOIN user u ON p.author_id = u.id"
+        " WHERE p.id IN (" + ", ".join("?" * len(ids)) + ")",
+        ids
+    ).fetchall()
+    posts = {post["id"]: post for post in posts}
+    return [posts[id] for id in ids if id in posts]
+
+def page_url(**args):
+    """
+    Returns the url of another page of the posts of this request,
+        with the same fields and author, or None without a cursor
+    """
+    if not any(args.values()):
+        return None
+    query = {key: value for key, value in request.args.items()
+             if key not in ("before", "after")}
+    return url_for("api.posts", **dict(query, **args))
+
+def get_json_object():
+    """
+    Returns the JSON object of the request, or aborts with 400 error
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        abort(400, "Expected a JSON object.")
+    return data
+
+def read_post_json(post=None):
+    """
+    Reads the title and body of a post from the JSON object of the request,
+        and aborts with 400 error like read_post_form if they are not valid.
+    Fields left out keep their value in post, when changing one.
+    """
+    data = get_json_object()
+    title = data.get("title", post["title"] if post is not None else "")
+    body = data.get("body", post["body"] if post is not None else "")
+    if not isinstance(title, str) or not isinstance(body, str):
+        abort(400, "Title and body must be strings.")
+    if not title:
+        abort(400, "Title is required.")
+    return title, body
+
+@bp.route("/posts")
+@conditional(get_revision)
+def posts():
+    """
+    This function is linked to the /api/v1/posts url.
+    With ?ids=1,2,3 it returns those posts, all read in one query.
+    Otherwise it returns one page of posts, most recent first, of the
+        ?author= username if given, paged like the index with ?before=
+        and ?after= cursors, which are returned with the links to the
+        newer and older pages.
+    ?fields=id,title only reads and returns those fields of every post.
+    """
+    fields = get_fields(POST_FIELDS, LIST_FIELDS)
+    if "ids" in request.args:
+        posts = get_posts_by_ids(get_ids(), fields)
+        return jsonify(posts=[to_json(post, fields) for post in posts])
+
+    author = request.args.get("author")
+    page = get_posts_page(
+        before=request.args.get("before"), after=request.args.get("after"),
+        author_id=get_author(author)["id"] if author else None,
+        columns=get_columns(fields)
+    )
+    return jsonify(
+        posts=[to_json(post, fields) for post in page],
+        newer=page.newer,
+        older=page.older,
+        links={
+            "newer": page_url(after=page.newer),
+            "older": page_url(before=page.older),
+        },
+    )
+
+@bp.route("/posts", methods=("POST", ))
+@login_required
+def create():
+    """
+    This function is linked to POST of the /api/v1/posts url,
+        and it creates a post of the logged in user from a JSON object
+        with a title and a body, and returns it with 201 status
+    """
+    title, body = read_post_json()
+    id = create_post(title, body, g.user["id"])
+    # A replica may not have the post yet, so it is read where it was written
+    post = get_posts_by_ids((id, ), POST_DETAIL_FIELDS, get_db())[0]
+    response = jsonify(to_json(post, POST_DETAIL_FIELDS))
+    response.status_code = 201
+    response.headers["Location"] = url_for("api.post", id=id)
+    return response
+
+@bp.route("/posts/<int:id>")
+@conditional(get_post_revision)
+def post(id):
+    """
+    This function is linked to the /api/v1/posts/id url,
+        and it returns one post, with its body, or the ?fields= of it
+    """
+    fields = get_fields(POST_FIELDS, POST_DETAIL_FIELDS)
+    posts = get_posts_by_ids((id, ), fields)
+    if not posts:
+        abort(404, "Post id {0} doesn't exist.".format(id))
+    return jsonify(to_json(posts[0], fields))
+
+@bp.route("/posts/<int:id>", methods=("PATCH", ))
+@login_required
+def update(id):
+    """
+    This function is linked to PATCH of the /api/v1/posts/id url,
+        and it changes the title or body of a post of the logged in user
+        from a JSON object, and returns the post.
+    With a version in the object, the post is only changed if it still
+        has that version, or else the answer is 409 error.
+    """
+    data = get_json_object()
+    version = data.get("version")
+    if version is not None and not isinstance(version, int):
+        abort(400, "Version must be an integer.")
+
+    # With both fields, the update checks the post by itself. Otherwise
+    #   the post is read for the other field, which aborts with 404 or 403
+    #   error like the update page, and must not change before the update.
+    post = None
+    if "title" not in data or "body" not in data:
+        post = get_post(id)
+        if version is None:
+            version = post["version"]
+    title, body = read_post_json(post)
+    update_post(id, title, body, g.user["id"], version)
+    post = get_posts_by_ids((id, ), POST_DETAIL_FIELDS, get_db())[0]
+    return jsonify(to_json(post, POST_DETAIL_FIELDS))
+
+@bp.route("/posts/<int:id>", methods=("DELETE", ))
+@login_required
+def delete(id):
+    """
+    This function is linked to DELETE of the /api/v1/posts/id url,
+        and it deletes a post of the logged in user
+    """
+    delete_post(id, g.user["id"])
+    return "", 204
+
+@bp.route("/users/<username>")
+def user(username):
+    """
+    This function is linked to the /api/v1/users/username url,
+        and it returns the user and their number of posts.
+    Their posts are at /api/v1/posts?author=username.
+    """
+    fields = get_fields(USER_FIELDS, USER_FIELDS)
+    return jsonify(to_json(get_author(username), fields))
+
+@bp.errorhandler(HTTPException)
+def handle_error(e):
+    """
+    Errors of the API are sent as a JSON object with the error message,
+        instead of an HTML page
+    """
+    response = e.get_response()
+    response.data = json.dumps({"error": e.description})
+    response.content_type = "application/json"
+    return response
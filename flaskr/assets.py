@@ -0,0 +1,174 @@
+import hashlib
+import mimetypes
+import os
+import re
+import click
+from flask import current_app, request, send_from_directory
+from flask.cli import with_appcontext
+from werkzeug.security import safe_join
+from flaskr import compress
+
+# A fingerprinted static file name, like style.0123456789ab.css
+FINGERPRINTED = re.compile(
+    r"^(?P<name>.+)\.(?P<fingerprint>[0-9a-f]{12})(?P<ext>\.[^./]+)$"
+)
+
+# A fingerprinted url always gets the same file,
+#   so browsers may keep it for a year without asking again
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+# The precompressed variants of a static file, by content coding
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+
+def get_fingerprint(filename):
+    """
+    Returns the fingerprint of a static file, the beginning of the
+        sha256 of its contents, or None if there is no such file.
+    Fingerprints are remembered until the file changes,
+        so a page only costs a stat of every file it links to.
+    """
+    path = safe_join(current_app.static_folder, filename)
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return None
+
+    fingerprints = current_app.extensions["flaskr.static_fingerprints"]
+    version = (stat.st_mtime_ns, stat.st_size)
+    known = fingerprints.get(filename)
+    if known is not None and known[0] == version:
+        return known[1]
+    with open(path, "rb") as f:
+        fingerprint = hashlib.sha256(f.read()).hexdigest()[:12]
+    fingerprints[filename] = (version, fingerprint)
+    return fingerprint
+
+def fingerprint_url(endpoint, values):
+    """
+    Puts the fingerprint of the file in every url_for("static"),
+        so that the url changes whenever the file does
+    """
+    if endpoint != "static" or "filename" not in values:
+        return
+    name, ext = os.path.splitext(values["filename"])
+    fingerprint = get_fingerprint(values["filename"]) if ext else None
+    if fingerprint is not None:
+        values["filename"] = "{0}.{1}{2}".format(name, fingerprint, ext)
+
+def send_static(filename):
+    """
+    This function replaces the static view of Flask.
+    A fingerprinted url is answered with the file of that name, which
+        may be kept forever if the fingerprint is the current one.
+        An older fingerprint still gets the current file, to be revalidated.
+    A file is sent precompressed when the client accepts one of its
+        variants written by the precompress-static command.
+    """
+    immutable = False
+    match = FINGERPRINTED.match(filename)
+    if match is not None and get_fingerprint(filename) is None:
+        filename = match.group("name") + match.group("ext")
+        immutable = get_fingerprint(filename) == match.group("fingerprint")
+
+    response = send_precompressed(filename) or \
+        current_app.send_static_file(filename)
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+def send_precompressed(filename):
+    """
+    Sends the best precompressed variant of a static file the client
+        accepts, or returns None if there is none.
+    Variants older than the file are left out, being out of date.
+    """
+    path = safe_join(current_app.static_folder, filename)
+    if path is None or not os.path.isfile(path):
+        return None
+    modified = os.stat(path).st_mtime
+    variants = {
+        encoding: suffix for encoding, suffix in PRECOMPRESSED
+        if os.path.isfile(path + suffix)
+        and os.stat(path + suffix).st_mtime >= modified
+    }
+    if not variants:
+        return None
+
+    encoding = request.accept_encodings.best_match(
+        [encoding for encoding, suffix in PRECOMPRESSED if encoding in variants]
+    )
+    if encoding is None:
+        return None
+    response = send_from_directory(
+        current_app.static_folder, filename + variants[encoding],
+        mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+        max_age=current_app.get_send_file_max_age(filename)
+    )
+    response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
+
+def precompress_static(static_folder):
+    """
+    Writes a .gz variant, and a .br one if brotli is installed, next to
+        every static file of a compressible type, compressed as hard as
+        possible since it is only done once.
+    Variants newer than their file are kept, and variants that would be
+        no smaller than the file are not written.
+    Returns the numbers of variants written and kept.
+    """
+    encodings = compress.get_encodings()
+    suffixes = tuple(suffix for encoding, suffix in PRECOMPRESSED)
+    written = kept = 0
+    for root, dirs, files in os.walk(static_folder):
+        for name in sorted(files):
+            mimetype = mimetypes.guess_type(name)[0]
+            if (name.endswith(suffixes)
+                    or mimetype not in compress.COMPRESSIBLE_MIMETYPES):
+                continue
+            path = os.path.join(root, name)
+            modified = os.stat(path).st_mtime
+            data = None
+            for encoding, suffix in PRECOMPRESSED:
+                if encoding not in encodings:
+                    continue
+                if (os.path.isfile(path + suffix)
+                        and os.stat(path + suffix).st_mtime >= modified):
+                    kept += 1
+                    continue
+                if data is None:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                compressed = compress.compress(data, encoding, best=True)
+                if len(compressed) >= len(data):
+                    continue
+                with open(path + suffix, "wb") as f:
+                    f.write(compressed)
+                written += 1
+    return written, kept
+
+@click.command("precompress-static")
+@with_appcontext
+def precompress_static_command():
+    """
+    This function writes the compressed variants of the static files,
+        to be run whenever they change, for example when deploying.
+    The function is linked to a newly created flask command precompress-static
+    """
+    written, kept = precompress_static(current_app.static_folder)
+    click.echo("Compressed {0} static files, {1} up to date".format(
+        written, kept
+    ))
+
+def init_app(app):
+    """
+    We serve the static files with send_static, fingerprint their urls
+        if STATIC_FINGERPRINTS is set, and register precompress-static
+    """
+    app.extensions["flaskr.static_fingerprints"] = {}
+    app.view_functions["static"] = send_static
+    if app.config["STATIC_FINGERPRINTS"]:
+        app.url_defaults(fingerprint_url)
+    app.cli.add_command(precompress_static_command)
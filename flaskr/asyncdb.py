@@ -0,0 +1,101 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, g
+from flaskr.db import get_db
+
+class AsyncConnection(object):
+    """
+    A non-blocking wrapper of the connection get_db hands out,
+        in the style of aiosqlite, for async views.
+    sqlite3 calls block, so every call is run in a thread of the
+        DATABASE_ASYNC_THREADS executor while the event loop goes on.
+    Calls keep the app and request context of the view,
+        so functions like get_posts_page can be run as they are.
+    """
+    def __init__(self, executor):
+        """
+        Constructor to store the executor that runs the sqlite3 calls
+        """
+        self._executor = executor
+
+    async def run(self, function, *args):
+        """
+        Runs function(*args) in the executor and returns its result.
+        The function may call get_db, which gives it the connection
+            of the current app context, like in a sync view.
+        """
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(context.run, function, *args)
+        )
+
+    async def execute(self, sql, parameters=()):
+        """
+        Executes one statement, and returns an AsyncCursor over its rows
+        """
+        cursor = await self.run(lambda: get_db().execute(sql, parameters))
+        return AsyncCursor(self, cursor)
+
+    async def executemany(self, sql, seq_of_parameters):
+        """
+        Executes one statement for every set of parameters
+        """
+        cursor = await self.run(
+            lambda: get_db().executemany(sql, seq_of_parameters)
+        )
+        return AsyncCursor(self, cursor)
+
+    async def commit(self):
+        await self.run(lambda: get_db().commit())
+
+    async def rollback(self):
+        await self.run(lambda: get_db().rollback())
+
+class AsyncCursor(object):
+    """
+    A non-blocking wrapper of a sqlite3 cursor, made by AsyncConnection
+    """
+    def __init__(self, connection, cursor):
+        """
+        Constructor to store the connection that runs the calls
+            and the cursor they are made on
+        """
+        self._connection = connection
+        self._cursor = cursor
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    async def fetchone(self):
+        return await self._connection.run(self._cursor.fetchone)
+
+    async def fetchall(self):
+        return await self._connection.run(self._cursor.fetchall)
+
+def get_async_db():
+    """
+    Returns the AsyncConnection of the current app context,
+        attached to the global object g like get_db does
+    """
+    if "async_db" not in g:
+        g.async_db = AsyncConnection(
+            current_app.extensions["flaskr.async_executor"]
+        )
+    return g.async_db
+
+def init_app(app):
+    """
+    We create the executor that runs the sqlite3 calls of async views
+    """
+    app.extensions["flaskr.async_executor"] = ThreadPoolExecutor(
+        max_workers=app.config["DATABASE_ASYNC_THREADS"],
+        thread_name_prefix="flaskr-db",
+    )
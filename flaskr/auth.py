@@ -1,9 +1,16 @@
 import functools
 from flask import (
-    Blueprint, flash, g, redirect, render_template, request, session, url_for
+    Blueprint, current_app, flash, g, has_request_context, redirect,
+    render_template, request, session, url_for
 )
-from werkzeug.security import check_password_hash, generate_password_hash
-from flaskr.db import get_db
+from flask.ctx import _AppCtxGlobals
+from flaskr import passwords
+from flaskr.cache import LRUCache
+from flaskr.db import get_db, get_read_db
+from flaskr.passwords import (
+    check_rate_limit, hash_password, needs_rehash, verify_password
+)
+from flaskr.writequeue import write
 
 # Blueprint object for website authentication
 bp = Blueprint("auth", __name__, url_prefix="/auth")
@@ -29,6 +36,11 @@ def register():
         db = get_db()
         error = None
         
+        # Check that this address or username is not trying too often,
+        #   since every attempt costs a slow password hash
+        if not check_rate_limit(request.remote_addr, username):
+            flash("Too many attempts. Try again later.")
+            return render_template("auth/register.html"), 429
         # Check if the username is filled out
         if not username:
             error = "Username is required."
@@ -44,11 +56,13 @@ def register():
         # If input is valid, then we create a username and password
         #   in the database and redirect the user to login page
         if error is None:
-            db.execute(
+            # The password is hashed before the write is queued,
+            #   so the writer never waits for it
+            pwhash = hash_password(password)
+            write(lambda db: db.execute(
                 "INSERT INTO user (username, password) VALUES (?,?)",
-                (username, generate_password_hash(password))
-            )
-            db.commit()
+                (username, pwhash)
+            ))
             return redirect(url_for("auth.login"))
 
         # If the input is invalid, we store error in flash object
@@ -78,6 +92,13 @@ def login():
         password = request.form["password"]
         db = get_db()
         error = None
+
+        # Check that this address or username is not trying too often,
+        #   since every attempt costs a slow password hash
+        if not check_rate_limit(request.remote_addr, username):
+            flash("Too many attempts. Try again later.")
+            return render_template("auth/login.html"), 429
+
         user = db.execute(
             "SELECT * FROM user WHERE username = ?", (username,)
         ).fetchone()
@@ -86,12 +107,22 @@ def login():
         if user is None:
             error = "Incorrect username."
         # Check if password is correct
-        elif not check_password_hash(user["password"], password):
+        elif not verify_password(user["password"], password):
             error = "Incorrect password."
         
         # If input is valid, store the user's id on a session object
         #   redirect the user to index page.         
         if error is None:
+            # If the password hash settings changed since the password
+            #   was stored, we hash it again now that we know it
+            if needs_rehash(user["password"]):
+                pwhash = hash_password(password)
+                write(lambda db: db.execute(
+                    "UPDATE user SET password = ? WHERE id = ?",
+                    (pwhash, user["id"])
+                ))
+                invalidate_user(user["id"])
+
             session.clear()
             session["user_id"] = user["id"]
             return redirect(url_for("index"))
@@ -103,25 +134,62 @@ def login():
     # If request method is GET, then we simply serve the login view
     return render_template("auth/login.html")
 
-@bp.before_app_request
+class Globals(_AppCtxGlobals):
+    """
+    The class of the g object.
+    g.user is loaded from the session the first time it is read,
+        so requests that never look at it, like /hello or static files,
+        never open a database connection for it.
+    """
+    def __getattr__(self, name):
+        if name == "user":
+            self.user = load_logged_in_user()
+            return self.user
+        return super().__getattr__(name)
+
+def get_user_cache():
+    """
+    Returns the cache of user rows by user id
+    """
+    return current_app.extensions["flaskr.user_cache"]
+
+def invalidate_user(user_id):
+    """
+    Forgets the cached row of a user,
+        which has to be called after every change to the user table
+    """
+    get_user_cache().delete(user_id)
+
 def load_logged_in_user():
     """
-    This function will transfer user information
-    from session object to g object. 
-    If user is not logged in, session.user and g.user are both None
+    This function returns the user information
+        of the user id in the session object, which becomes g.user.
+    If user is not logged in, session.user and g.user are both None.
+    User rows are kept in a small cache, so that logged in users
+        do not cost a query on every request.
     """
+    # Outside of a request, like in flask commands, nobody is logged in
+    if not has_request_context():
+        return None
+
     # Get the user id from session object
     user_id = session.get("user_id")
-    
+
     # If user id is None, g.user is also None
     if user_id is None:
-        g.user = None
+        return None
+
     # If user id is not None, we pull all data for that user
-    #   from the database and store that in g.user
-    else:
-        g.user = get_db().execute(
+    #   from the cache, or else from the database
+    cache = get_user_cache()
+    user = cache.get(user_id)
+    if user is None:
+        user = get_read_db().execute(
             "SELECT * FROM user WHERE id = ?", (user_id, )
         ).fetchone()
+        if user is not None:
+            cache.set(user_id, user)
+    return user
 
 @bp.route("/logout")
 def logout():
@@ -148,8 +216,21 @@ def login_required(view):
         # If g.user is none, we redirect to login page
         if g.user is None:
             return redirect(url_for("auth.login"))
-        # Return view if g.user has information
-        return view(**kwargs)
+        # Return view if g.user has information,
+        #   running it to completion if it is an async view
+        return current_app.ensure_sync(view)(**kwargs)
 
     # return wrapper view
     return wrapped_view
+
+def init_app(app):
+    """
+    We make g load the user lazily, create the user cache
+        from the USER_CACHE_SIZE and USER_CACHE_TTL config
+        and the login rate limiter
+    """
+    app.app_ctx_globals_class = Globals
+    passwords.init_app(app)
+    app.extensions["flaskr.user_cache"] = LRUCache(
+        app.config["USER_CACHE_SIZE"], app.config["USER_CACHE_TTL"]
+    )
@@ -1,29 +1,501 @@
+import base64
+import binascii
+import re
+from datetime import datetime, timezone
 from flask import (
-    Blueprint, flash, g, redirect, render_template, request, url_for
+    Blueprint, current_app, flash, g, redirect, render_template, request,
+    stream_with_context, url_for
 )
-from werkzeug.exceptions import abort
+from markupsafe import Markup, escape
+from werkzeug.exceptions import Conflict, abort
+from werkzeug.http import http_date
 from flaskr.auth import login_required
-from flaskr.db import get_db
+from flaskr.cache import cached_page, conditional, get_fragment_cache
+from flaskr.db import MAX_INTEGER, TIMESTAMP_FORMAT, get_db, get_read_db
+from flaskr.writequeue import write
 
 # Blueprint object for blogposts - note we do not have a url_prefix
 bp = Blueprint("blog", __name__)
 
+def encode_cursor(post):
+    """
+    Turns the (created, id) position of a post into an opaque string
+        that can be placed in the url query string.
+    The created value is kept in the same text form sqlite stores it,
+        so it compares correctly against the created column.
+    """
+    value = "{0}|{1}".format(post["created"], post["id"])
+    return base64.urlsafe_b64encode(value.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor):
+    """
+    Turns a cursor made by encode_cursor back into a (created, id) pair
+        and aborts with 400 error if the cursor was tampered with,
+        including ids sqlite cannot hold and created values
+        that are not timestamps. A date alone compares correctly
+        against the stored timestamps, so it is accepted as well.
+    """
+    try:
+        value = base64.urlsafe_b64decode(cursor.encode("ascii"))
+        created, id = value.decode("utf-8").rsplit("|", 1)
+        datetime.strptime(
+            created, TIMESTAMP_FORMAT if " " in created else "%Y-%m-%d"
+        )
+        id = int(id)
+    except (ValueError, UnicodeError, binascii.Error):
+        abort(400, "Invalid page cursor.")
+    if not 0 <= id <= MAX_INTEGER:
+        abort(400, "Invalid page cursor.")
+    return created, id
+
+class PostsPage(object):
+    """
+    One page of posts, as get_posts_page reads it.
+    It iterates over the posts, and its newer and older attributes are
+        the cursors of the pages around it, None when there is no such page.
+    A streamed page reads its posts from the cursor while the template
+        iterates over them, so it only knows newer and older afterwards,
+        which is why the templates ask for the links after the posts.
+    """
+    def __init__(self, posts=(), newer=None, older=None):
+        """
+        Constructor to store the posts and the cursors of the pages around
+        """
+        self.posts = posts
+        self.newer = newer
+        self.older = older
+
+    def __iter__(self):
+        return iter(self.posts)
+
+    @property
+    def prev_url(self):
+        """
+        The url of the page of newer posts, leading to the same view,
+            like an author page, as this one
+        """
+        return self._url(after=self.newer) if self.newer else None
+
+    @property
+    def next_url(self):
+        """
+        The url of the page of older posts
+        """
+        return self._url(before=self.older) if self.older else None
+
+    def _url(self, **args):
+        return url_for(request.endpoint, **dict(request.view_args or {}, **args))
+
+def stream_posts(page, cursor, per_page, has_newer):
+    """
+    Yields the posts of a page from the cursor one at a time,
+        setting the newer and older cursors of the page on the way
+    """
+    last = None
+    for i, post in enumerate(cursor):
+        # The post after the page only tells that there is an older page
+        if i == per_page:
+            page.older = encode_cursor(last)
+            break
+        if i == 0 and has_newer:
+            page.newer = encode_cursor(post)
+        last = post
+        yield post
+
+# The columns of the posts on the pages of posts
+POST_COLUMNS = (
+    "p.id, title, excerpt, truncated, created, updated, version, author_id,"
+    " username"
+)
+
+def get_posts_page(before=None, after=None, author_id=None, stream=False,
+                   columns=POST_COLUMNS):
+    """
+    Retrieves one page of posts, most recent first, using keyset pagination.
+    Instead of OFFSET, we remember the (created, id) of the last post shown
+        and ask for the posts strictly older (before) or newer (after) than it,
+        so sqlite walks the post_created_id index and never reads skipped rows.
+    With an author_id, only the posts of that author are retrieved,
+        walking the post_author_created_id index the same way.
+    Only the excerpt of every post is read, not the whole body, unless
+        columns asks for other columns of post and user, which must
+        include p.id and created for the cursors.
+    Returns a PostsPage. With stream, its posts are read from the cursor
+        as they are iterated over, instead of all at once, except for
+        pages of newer posts, which are read in reverse and flipped.
+    """
+    per_page = current_app.config["POSTS_PER_PAGE"]
+    query = (
+        "SELECT " + columns + " FROM post p JOIN user u ON p.author_id = u.id"
+    )
+    conditions, args = [], ()
+    if author_id is not None:
+        conditions.append("author_id = ?")
+        args += (author_id, )
+
+    # We ask for one post more than the page size,
+    #   to know whether there is another page after this one
+    if after is not None:
+        # Walk towards newer posts and flip them back to most recent first
+        conditions.append("(created, p.id) > (?, ?)")
+        posts = get_read_db().execute(
+            query + " WHERE " + " AND ".join(conditions) +
+            " ORDER BY created ASC, p.id ASC LIMIT ?",
+            args + decode_cursor(after) + (per_page + 1, )
+        ).fetchall()
+        has_newer, has_older = len(posts) > per_page, True
+        posts = posts[:per_page][::-1]
+    else:
+        if before is not None:
+            conditions.append("(created, p.id) < (?, ?)")
+            args += decode_cursor(before)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        cursor = get_read_db().execute(
+            query + " ORDER BY created DESC, p.id DESC LIMIT ?",
+            args + (per_page + 1, )
+        )
+        if stream:
+            page = PostsPage()
+            page.posts = stream_posts(page, cursor, per_page, before is not None)
+            return page
+        posts = cursor.fetchall()
+        has_newer, has_older = before is not None, len(posts) > per_page
+        posts = posts[:per_page]
+
+    # Cursors point at the first and last posts on this page
+    return PostsPage(
+        posts,
+        newer=encode_cursor(posts[0]) if posts and has_newer else None,
+        older=encode_cursor(posts[-1]) if posts and has_older else None,
+    )
+
+@bp.app_template_global()
+def render_post(post):
+    """
+    Renders the <article> of one post on the index, from the
+        blog/_post.html template or from the cache of rendered posts.
+    Only the Edit link differs between users, so a post is cached once
+        for its author and once for everybody else, and the cached HTML is
+        only used while the version of the post still matches.
+    Every edit raises the version, even several within one second,
+        so no process keeps showing a post another one has edited.
+    """
+    is_author = g.user is not None and g.user["id"] == post["author_id"]
+    cache = get_fragment_cache()
+    key = (post["id"], is_author)
+    fragment = cache.get(key)
+    if fragment is not None and fragment[0] == post["version"]:
+        return fragment[1]
+
+    html = Markup(current_app.jinja_env.get_template("blog/_post.html").render(
+        post=post, is_author=is_author
+    ))
+    cache.set(key, (post["version"], html))
+    return html
+
+def get_revision():
+    """
+    Returns the revision and modified time of the posts,
+        which change with every write to the post table.
+    This is the validator of conditional GETs of the index.
+    """
+    revision = get_read_db().execute(
+        "SELECT revision, modified FROM post_revision"
+    ).fetchone()
+    return revision["revision"], revision["modified"]
+
+def get_post_revision(id):
+    """
+    Returns the revision of the posts and the last update time of one post,
+        which are the validators of conditional GETs of that post,
+        or None if the post does not exist.
+    Timestamps only have whole seconds, so the revision
+        tells apart two edits made within the same second.
+    """
+    post = get_read_db().execute(
+        "SELECT revision, updated FROM post p, post_revision"
+        " WHERE p.id = ?", (id, )
+    ).fetchone()
+    if post is None:
+        return None
+    return post["revision"], post["updated"]
+
 @bp.route("/")
+@conditional(get_revision)
+@cached_page(get_revision)
 def index():
     """
     This function is linked to the / url or index url,
-        and it shows all the blogposts
+        and it shows one page of the blogposts.
+    The ?before= and ?after= query arguments hold the cursor
+        of the page we came from.
     """
-    db = get_db()
-    # Gets the entire blog information and user information
-    #   ordered by most recent first 
-    posts = db.execute(
-        "SELECT p.id, title, body, created, author_id, username"
-        " FROM post p JOIN user u ON p.author_id = u.id"
-        " ORDER BY created DESC"
+    # Gets one page of blog information and user information
+    #   ordered by most recent first
+    page = get_posts_page(
+        before=request.args.get("before"), after=request.args.get("after"),
+        stream=current_app.config["STREAM_PAGES"]
+    )
+    return render_index(page)
+
+def render_index(page, template="blog/index.html", **context):
+    """
+    Renders a PostsPage with the links to the
+        newer and older pages of posts, if there are any.
+    With STREAM_PAGES, the page is sent while it is rendered, so the
+        header reaches the client before the posts are read. Such pages
+        are not kept by cached_page, which would have to wait for them.
+    """
+    if not current_app.config["STREAM_PAGES"]:
+        return render_template(template, page=page, **context)
+
+    context = dict(context, page=page)
+    current_app.update_template_context(context)
+    return current_app.response_class(
+        stream_with_context(
+            current_app.jinja_env.get_template(template).generate(context)
+        ),
+        mimetype="text/html"
+    )
+
+def get_author(username):
+    """
+    Retrieves the user with the username and their number of posts,
+        or aborts with 404 error if there is no such user
+    """
+    author = get_read_db().execute(
+        "SELECT id, username, post_count FROM user WHERE username = ?",
+        (username, )
+    ).fetchone()
+    if author is None:
+        abort(404, "User {0} doesn't exist.".format(username))
+    return author
+
+def get_author_revision(username):
+    """
+    Returns the revision and modified time of the posts like get_revision,
+        which are the validators of conditional GETs of an author page,
+        or None if there is no such user
+    """
+    revision = get_read_db().execute(
+        "SELECT revision, modified FROM user, post_revision"
+        " WHERE username = ?", (username, )
+    ).fetchone()
+    if revision is None:
+        return None
+    return revision["revision"], revision["modified"]
+
+@bp.route("/u/<username>")
+@conditional(get_author_revision)
+@cached_page(get_author_revision)
+def author(username):
+    """
+    This function is linked to the /u/username url,
+        and it shows one page of the posts of that user,
+        paged like the index with ?before= and ?after=
+    """
+    author = get_author(username)
+    page = get_posts_page(
+        before=request.args.get("before"), after=request.args.get("after"),
+        author_id=author["id"], stream=current_app.config["STREAM_PAGES"]
+    )
+    return render_index(page, template="blog/author.html", author=author)
+
+@bp.route("/<int:id>")
+@conditional(get_post_revision)
+@cached_page(get_post_revision)
+def detail(id):
+    """
+    This function is linked to the /id url,
+        and it shows one blogpost
+    """
+    post = get_post(id, check_author=False)
+    return render_template("blog/post.html", post=post)
+
+# The latest posts for the feeds, walking the post_created_id index
+#   from its end, so only FEED_SIZE posts are ever read
+FEED_QUERY = (
+    "SELECT p.id, title, body, created, updated, username"
+    " FROM post p JOIN user u ON p.author_id = u.id"
+    " ORDER BY created DESC, p.id DESC LIMIT ?"
+)
+
+@bp.app_template_filter("rfc3339")
+def rfc3339(value):
+    """
+    Formats a sqlite timestamp, which is UTC, for Atom feeds
+    """
+    return value.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+@bp.app_template_filter("rfc822")
+def rfc822(value):
+    """
+    Formats a sqlite timestamp, which is UTC, for RSS feeds
+    """
+    return http_date(value.replace(tzinfo=timezone.utc))
+
+def render_feed(template, mimetype):
+    """
+    Renders the FEED_SIZE latest posts with a feed template.
+    The feed was last updated when the posts last changed,
+        which is the modified time of get_revision.
+    """
+    posts = get_read_db().execute(
+        FEED_QUERY, (current_app.config["FEED_SIZE"], )
+    ).fetchall()
+    return current_app.response_class(
+        render_template(template, posts=posts, updated=get_revision()[1]),
+        mimetype=mimetype
+    )
+
+# Feed readers poll the feeds often, so they are answered like the index:
+#   304 Not Modified while the posts are unchanged, otherwise from the page
+#   cache, and only rendered once after every write to the posts.
+#   A feed is the same for everybody, so it is cached once for all.
+
+@bp.route("/feed.atom")
+@conditional(get_revision, per_user=False)
+@cached_page(get_revision, mimetype="application/atom+xml", per_user=False)
+def feed_atom():
+    """
+    This function is linked to the /feed.atom url,
+        and it serves an Atom feed of the latest posts
+    """
+    return render_feed("blog/feed.atom.xml", "application/atom+xml")
+
+@bp.route("/feed.rss")
+@conditional(get_revision, per_user=False)
+@cached_page(get_revision, mimetype="application/rss+xml", per_user=False)
+def feed_rss():
+    """
+    This function is linked to the /feed.rss url,
+        and it serves an RSS feed of the latest posts
+    """
+    return render_feed("blog/feed.rss.xml", "application/rss+xml")
+
+# Control characters that cannot appear in a post,
+#   used to mark the matched words in search snippets
+SNIPPET_START, SNIPPET_END = "\x02", "\x03"
+
+# Control characters, which FTS5 cannot read even inside a quoted word
+CONTROL_CHARACTERS = re.compile(r"[\x00-\x1f\x7f]")
+
+# Results are read with OFFSET, which gets slower with every page,
+#   so search results are not paged beyond this
+MAX_SEARCH_PAGE = 100
+
+def make_match_query(q):
+    """
+    Turns what the user typed into an FTS5 match query.
+    Every word is quoted, so that characters like * or " or words like OR
+        are searched for instead of being read as FTS5 syntax,
+        and a post has to contain all of the words to match.
+    Control characters are left out.
+    """
+    return " ".join(
+        '"{0}"'.format(word.replace('"', '""'))
+        for word in CONTROL_CHARACTERS.sub(" ", q).split()
+    )
+
+def read_search_args():
+    """
+    Reads the ?q= words and the ?page= number of a search,
+        and aborts with 400 error for a page beyond MAX_SEARCH_PAGE
+    """
+    q = CONTROL_CHARACTERS.sub(" ", request.args.get("q", "")).strip()
+    page = max(request.args.get("page", 1, type=int), 1)
+    if page > MAX_SEARCH_PAGE:
+        abort(400, "Search results have at most {0} pages.".format(
+            MAX_SEARCH_PAGE
+        ))
+    return q, page
+
+def highlight(snippet):
+    """
+    Escapes a search snippet for HTML and turns the marked words
+        into <mark> elements
+    """
+    return Markup(
+        escape(snippet)
+        .replace(SNIPPET_START, Markup("<mark>"))
+        .replace(SNIPPET_END, Markup("</mark>"))
+    )
+
+def search_posts(q, page):
+    """
+    Retrieves one page of the posts matching the words in q,
+        best matches first, with a snippet of the matched words.
+    Returns the posts and whether there is another page after this one.
+    """
+    per_page = current_app.config["POSTS_PER_PAGE"]
+    match = make_match_query(q)
+    if not match:
+        return [], False
+
+    # bm25 ranks the best matches with the lowest score,
+    #   and we count a match in the title ten times as much as one in the body.
+    #   We ask for one result more than the page size,
+    #   to know whether there is another page after this one.
+    results = get_read_db().execute(
+        "SELECT p.id, p.title, created, author_id, username,"
+        " snippet(post_fts, -1, ?, ?, '...', 24) AS snippet"
+        " FROM post_fts"
+        " JOIN post p ON p.id = post_fts.rowid"
+        " JOIN user u ON p.author_id = u.id"
+        " WHERE post_fts MATCH ?"
+        " ORDER BY bm25(post_fts, 10.0, 1.0)"
+        " LIMIT ? OFFSET ?",
+        (SNIPPET_START, SNIPPET_END, match,
+         per_page + 1, (page - 1) * per_page)
     ).fetchall()
-    # Render the template
-    return render_template("blog/index.html", posts=posts)
+    return results[:per_page], len(results) > per_page
+
+@bp.route("/search")
+def search():
+    """
+    This function is linked to the /search url,
+        and it shows the posts matching the ?q= words,
+        best matches first, with the matched words highlighted.
+    Results are paged with ?page=, since they are ordered by rank.
+    """
+    q, page = read_search_args()
+    results, has_next = search_posts(q, page) if q else ([], False)
+    return render_search(q, page, results, has_next)
+
+def render_search(q, page, results, has_next):
+    """
+    Renders a page of search results with the links to the
+        previous and next pages of results, if there are any
+    """
+    prev_url = url_for("blog.search", q=q, page=page - 1) if page > 1 else None
+    next_url = url_for("blog.search", q=q, page=page + 1) if has_next else None
+    return render_template(
+        "blog/search.html", q=q, results=results, highlight=highlight,
+        prev_url=prev_url, next_url=next_url
+    )
+
+def read_post_form():
+    """
+    Reads the title and body of a submitted post form.
+    Returns them as a pair if they are valid, or else flashes
+        an error message for the template and returns None.
+    """
+    # We save the contents of the form, where missing fields are empty
+    title = request.form.get("title", "")
+    body = request.form.get("body", "")
+    error = None
+
+    # We check if there is a title.
+    if not title:
+        error = "Title is required."
+
+    # If input is not valid, we save an error message to flash
+    #   to be flashed onto a template.
+    if error is not None:
+        flash(error)
+        return None
+    return title, body
 
 @bp.route("/create", methods=("GET", "POST"))
 @login_required
@@ -40,42 +512,107 @@ def create():
     """
     # If the user request method is POST
     if request.method == "POST":
-        # We save the contents of the form
-        title = request.form["title"]
-        body = request.form["body"]
-        error = None
-
-        # We check if there is a title.
-        if not title:
-            error = "Title is required."
-        
-        # If input is not valid, we save an error message to flash
-        #   to be flashed onto a template.
-        if error is not None:
-            flash(error)
+        # We check the contents of the form, which flashes
+        #   an error to the template if they are not valid.
+        form = read_post_form()
         # If input is valid, we insert the post details to database
         # and redirect user to index page 
-        else:
-            db = get_db()
-            db.execute(
-                "INSERT INTO post (title, body, author_id) VALUES (?, ?, ?)",
-                (title, body, g.user['id'])
-            )
-            db.commit()
+        if form is not None:
+            create_post(form[0], form[1], g.user["id"])
             return redirect(url_for("blog.index"))
 
     # If the user request method is GET, then we simply serve the view.
     return render_template("blog/create.html")
 
+def make_excerpt(body):
+    """
+    Returns the beginning of a post body shown on the pages of posts,
+        which is the whole body if it has at most POST_EXCERPT_LENGTH
+        characters, or else as many whole words as fit, followed by "..."
+    The excerpt is cut short exactly when it differs from the body,
+        which is stored in the truncated column next to it, since a body
+        may well end with "..." itself.
+    """
+    length = current_app.config["POST_EXCERPT_LENGTH"]
+    if len(body) <= length:
+        return body
+    # A word that ends right at the limit is kept
+    words = body[:length + 1].rsplit(None, 1)
+    excerpt = words[0] if len(words) > 1 else body[:length]
+    return excerpt.rstrip() + "..."
+
+def create_post(title, body, author_id):
+    """
+    Inserts a new post in the database, together with its excerpt,
+        and returns the id of the new post
+    """
+    excerpt = make_excerpt(body)
+    return write(lambda db: db.execute(
+        "INSERT INTO post (title, body, excerpt, truncated, author_id)"
+        " VALUES (?, ?, ?, ?, ?)",
+        (title, body, excerpt, excerpt != body, author_id)
+    ).lastrowid)
+
+def update_post(id, title, body, author_id, version=None):
+    """
+    Changes the title, body and excerpt of a post of author_id
+        in the database, in one statement that also checks the author.
+    With a version, the post is only changed if it still has that version,
+        so that an edit does not silently undo one made since the post
+        was read. Otherwise, or when the post is missing or not theirs,
+        check_post_write aborts with the reason.
+    """
+    excerpt = make_excerpt(body)
+    query = (
+        "UPDATE post SET title = ?, body = ?, excerpt = ?, truncated = ?,"
+        " updated = CURRENT_TIMESTAMP, version = version + 1"
+        " WHERE id = ? AND author_id = ?"
+    )
+    args = (title, body, excerpt, excerpt != body, id, author_id)
+    if version is not None:
+        query += " AND version = ?"
+        args += (version, )
+    if not write(lambda db: db.execute(query, args).rowcount):
+        check_post_write(id, author_id)
+
+def delete_post(id, author_id):
+    """
+    Deletes a post of author_id from the database, in one statement
+        that also checks the author, or aborts like update_post
+    """
+    if not write(lambda db: db.execute(
+        "DELETE FROM post WHERE id = ? AND author_id = ?", (id, author_id)
+    ).rowcount):
+        check_post_write(id, author_id)
+
+def check_post_write(id, author_id):
+    """
+    Finds out why a write to a post changed nothing and aborts with
+        404 error if the post does not exist, 403 error if author_id
+        did not write it, or else 409 error, since it has changed.
+    The writes check all of this themselves, so this query is only
+        paid for when they fail.
+    """
+    post = get_db().execute(
+        "SELECT author_id FROM post WHERE id = ?", (id, )
+    ).fetchone()
+    if post is None:
+        abort(404, "Post id {0} doesn't exist.".format(id))
+    if post["author_id"] != author_id:
+        abort(403)
+    abort(409, "Post id {0} has changed since it was read.".format(id))
+
 def get_post(id, check_author=True):
     """
     Retrieves a post from the database and 
         checks whether the post exists 
         and if the user wrote it
     """
-    # Queries database for a post
-    post = get_db().execute(
-        "SELECT p.id, title, body, created, author_id, username"
+    # Queries database for a post. Posts about to be changed are read
+    #   from the database that is written, which a replica may lag behind.
+    db = get_db() if check_author else get_read_db()
+    post = db.execute(
+        "SELECT p.id, title, body, created, version, author_id, username"
         " FROM post p JOIN user u ON p.author_id = u.id"
         " WHERE p.id = ?", 
         (id, )
@@ -92,49 +629,45 @@ def get_post(id, check_author=True):
 
     return post
 
+# Shown when someone else saved a post while the user was editing it
+CONFLICT_MESSAGE = (
+    "This post was changed while you were editing it."
+    " Save again to replace those changes with yours."
+)
+
 @bp.route("/<int:id>/update", methods=("GET", "POST"))
 @login_required
 def update(id):
     """
     This function is used for updating a post for /id/update url
-    We query for the post, and then, 
-        if the user didn't update the post and is just arriving at the url,
-        we serve him the view and if he updates the post and submits,
-        we update the post in the database and redirect to the index page.
+    If the user updates the post and submits, we update the post
+        in the database and redirect to the index page.
+        The update itself checks that the post exists and is theirs.
+    Otherwise, we query for the post and serve the view.
     """
-    # Get post information
-    post = get_post(id)
-    
-    # If the request method is POST, we store the form values,
+    status = 200
+
+    # If the request method is POST, we check the form values,
     #   we update the post in the database, and redirect
     if request.method == "POST":
-        # Store post in variables
-        title = request.form["title"]
-        body = request.form["body"]
-        error = None
-
-        # Check if title exists
-        if not title:
-            error = "Title is required."
-
-        # If input is not valid, we store error message in flash object for
-        #   template rendering
-        if error is not None:
-            flash(error)
+        form = read_post_form()
         # If input is valid, we update the database entry and redirect
-        #   to index endpoint
-        else:
-            db = get_db()
-            db.execute(
-                "UPDATE post SET title = ?, body = ?"
-                " WHERE id = ?",
-                (title, body, id)
-            )
-            db.commit()
-            return redirect(url_for("blog.index"))
-    
-    # If the request method is GET, we just serve the update view
-    return render_template("blog/update.html", post=post) 
+        #   to index endpoint, unless the post changed since the form
+        #   was served, with the version in it.
+        if form is not None:
+            try:
+                update_post(
+                    id, form[0], form[1], g.user["id"],
+                    request.form.get("version", type=int)
+                )
+                return redirect(url_for("blog.index"))
+            except Conflict:
+                flash(CONFLICT_MESSAGE)
+                status = 409
+
+    # We serve the update view, with what the user typed if there was
+    #   an error, and with the current version of the post
+    return render_template("blog/update.html", post=get_post(id)), status
 
 @bp.route("/<int:id>/delete", methods=("POST", ))
 @login_required
@@ -143,8 +676,5 @@ def delete(id):
     This function corresponds to the /id/delete/ url
         and it deletes the post and redirects to index
     """
-    get_post(id)
-    db = get_db()
-    db.execute("DELETE FROM post WHERE id = ?", (id,))
-    db.commit()
+    delete_post(id, g.user["id"])
     return redirect(url_for("blog.index"))
@@ -0,0 +1,117 @@
+from flask import flash, g, redirect, render_template, request, url_for
+from werkzeug.exceptions import Conflict
+from flaskr import asyncdb
+from flaskr.asyncdb import get_async_db
+from flaskr.auth import login_required
+from flaskr.blog import (
+    CONFLICT_MESSAGE, create_post, delete_post, get_author, get_author_revision, get_post,
+    get_post_revision, get_posts_page, get_revision, read_post_form,
+    read_search_args, render_index, render_search, search_posts, update_post
+)
+from flaskr.cache import cached_page, conditional
+
+# The async variants of the views in blog.py, used when ASYNC_VIEWS is set.
+#   They do the same as their sync variants, but wait for the database
+#   through get_async_db instead of blocking on it.
+#   Their decorators stay sync: Flask runs them on the request thread and
+#   only then starts an event loop for the view, so the validator query of
+#   conditional and cached_page and the g.user lookup of login_required
+#   block that request thread, as in a sync view, but no event loop.
+
+@conditional(get_revision)
+@cached_page(get_revision)
+async def index():
+    """
+    Async variant of blog.index, showing one page of the blogposts
+    """
+    page = await get_async_db().run(
+        get_posts_page, request.args.get("before"), request.args.get("after")
+    )
+    return render_index(page)
+
+@conditional(get_post_revision)
+@cached_page(get_post_revision)
+async def detail(id):
+    """
+    Async variant of blog.detail, showing one blogpost
+    """
+    post = await get_async_db().run(get_post, id, False)
+    return render_template("blog/post.html", post=post)
+
+@conditional(get_author_revision)
+@cached_page(get_author_revision)
+async def author(username):
+    """
+    Async variant of blog.author, showing one page of the posts of a user
+    """
+    author = await get_async_db().run(get_author, username)
+    page = await get_async_db().run(
+        get_posts_page, request.args.get("before"), request.args.get("after"),
+        author["id"]
+    )
+    return render_index(page, template="blog/author.html", author=author)
+
+async def search():
+    """
+    Async variant of blog.search, showing the posts matching the ?q= words
+    """
+    q, page = read_search_args()
+    results, has_next = [], False
+    if q:
+        results, has_next = await get_async_db().run(search_posts, q, page)
+    return render_search(q, page, results, has_next)
+
+@login_required
+async def create():
+    """
+    Async variant of blog.create, for the user to create posts
+    """
+    if request.method == "POST":
+        form = read_post_form()
+        if form is not None:
+            await get_async_db().run(
+                create_post, form[0], form[1], g.user["id"]
+            )
+            return redirect(url_for("blog.index"))
+
+    return render_template("blog/create.html")
+
+@login_required
+async def update(id):
+    """
+    Async variant of blog.update, for the author to update a post
+    """
+    status = 200
+    if request.method == "POST":
+        form = read_post_form()
+        if form is not None:
+            try:
+                await get_async_db().run(
+                    update_post, id, form[0], form[1], g.user["id"],
+                    request.form.get("version", type=int)
+                )
+                return redirect(url_for("blog.index"))
+            except Conflict:
+                flash(CONFLICT_MESSAGE)
+                status = 409
+
+    post = await get_async_db().run(get_post, id)
+    return render_template("blog/update.html", post=post), status
+
+@login_required
+async def delete(id):
+    """
+    Async variant of blog.delete, for the author to delete a post
+    """
+    await get_async_db().run(delete_post, id, g.user["id"])
+    return redirect(url_for("blog.index"))
+
+def init_app(app):
+    """
+    We replace the views of the blog blueprint by their async variants.
+    The urls stay those of blog.py, and any blog view without
+        an async variant stays as it is.
+    """
+    asyncdb.init_app(app)
+    for view in (index, detail, author, search, create, update, delete):
+        app.view_functions["blog." + view.__name__] = view
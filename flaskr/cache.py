@@ -0,0 +1,277 @@
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import timezone
+from flask import current_app, g, make_response, request, session
+
+class CacheBackend(object):
+    """
+    Interface of the cache backends.
+    A backend maps hashable keys to values, and may forget
+        any entry at any time, so get can always return None.
+    Any object with these four methods can be set as PAGE_CACHE
+        to keep rendered pages somewhere else, like a shared memcached.
+    """
+    def get(self, key):
+        """
+        Returns the value stored for key, or None
+        """
+        raise NotImplementedError
+
+    def set(self, key, value):
+        """
+        Stores value for key
+        """
+        raise NotImplementedError
+
+    def delete(self, key):
+        """
+        Forgets the value stored for key, if there is one
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        """
+        Forgets every value
+        """
+        raise NotImplementedError
+
+class NullCache(CacheBackend):
+    """
+    A backend that never stores anything, to turn caching off
+    """
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+class LRUCache(CacheBackend):
+    """
+    An in-process backend that keeps at most maxsize entries,
+        forgetting the least recently used one when it is full,
+        and forgets entries older than ttl seconds (None keeps them forever).
+    It is safe to use from several threads.
+    """
+    def __init__(self, maxsize=128, ttl=None):
+        """
+        Constructor to store the size and time limits
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            # Move the entry to the end, which is the most recently used
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            # Forget the least recently used entries, at the front
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+def make_backend(backend, maxsize, ttl):
+    """
+    Turns a backend config value into a backend object.
+    The value is "lru", "null" or already a CacheBackend object.
+    """
+    if backend == "lru":
+        return LRUCache(maxsize, ttl)
+    if backend == "null":
+        return NullCache()
+    return backend
+
+def get_page_cache():
+    """
+    Returns the rendered page cache of the application
+    """
+    return current_app.extensions["flaskr.page_cache"]
+
+def get_fragment_cache():
+    """
+    Returns the cache of rendered posts of the application
+    """
+    return current_app.extensions["flaskr.fragment_cache"]
+
+def get_validators(validator, kwargs):
+    """
+    Calls validator with the view arguments once per request,
+        so that cached_page and conditional share one query
+    """
+    validators = g.setdefault("page_validators", {})
+    key = (validator, tuple(sorted(kwargs.items())))
+    if key not in validators:
+        validators[key] = validator(**kwargs)
+    return validators[key]
+
+def cached_page(validator, mimetype="text/html", per_user=True):
+    """
+    This function is a decorator factory.
+    It stores the HTML of a successful GET of the view in the page cache,
+        and serves it from there next time without calling the view,
+        so neither the database nor the templates are touched.
+    Pages are keyed by url, including the page cursor in the query string,
+        by who is logged in, since logged in users see their name
+        and the Edit links of their own posts, and by the tag of the
+        validator, the same one conditional uses. Without per_user, the
+        page is the same for everybody and is only kept once.
+        Pages served from the cache are sent with mimetype.
+    Since every write to the posts changes the tag, pages of an older tag
+        are never served again, in any process sharing the database,
+        and are left for the cache to forget. validator is called before
+        the view reads anything, so a page rendered while a write commits
+        is at worst newer than its tag, never older.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped_view(**kwargs):
+            # Flashed messages are only shown once, so such pages are not kept
+            call_view = current_app.ensure_sync(view)
+            if request.method != "GET" or "_flashes" in session:
+                return call_view(**kwargs)
+
+            validators = get_validators(validator, kwargs)
+            if validators is None:
+                return call_view(**kwargs)
+
+            cache = get_page_cache()
+            key = (
+                request.endpoint, request.full_path,
+                session.get("user_id") if per_user else None, validators[0]
+            )
+            page = cache.get(key)
+            if page is not None:
+                return current_app.response_class(page, mimetype=mimetype)
+
+            response = make_response(call_view(**kwargs))
+            # Streamed pages are sent as they are rendered,
+            #   so there is nothing to keep without waiting for all of it
+            if response.status_code == 200 and not response.is_streamed:
+                cache.set(key, response.get_data())
+            return response
+
+        return wrapped_view
+
+    return decorator
+
+def conditional(validator, per_user=True):
+    """
+    This function is a decorator factory.
+    validator is called with the view arguments and returns a cheap
+        (tag, last_modified) pair that changes whenever the page would,
+        or None to let the view handle the request, for example with a 404.
+    When the ETag built from the tag, or the last_modified datetime, shows
+        that the client already has the page, we answer 304 Not Modified
+        without calling the view. Otherwise the view's response gets the
+        ETag and Last-Modified headers for the client's next request.
+    It goes above cached_page with the same validator, so that a cached
+        body always belongs to the ETag it is sent with. Otherwise a body
+        cached before someone else's write could be sent with the new ETag,
+        and the client would then be told 304 for it until the next write.
+    Without per_user, the page is the same for everybody, so the ETag does
+        not depend on who is logged in and shared caches may keep one copy.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped_view(**kwargs):
+            # Flashed messages are only shown once, so such pages
+            #   must not be confused with the ones the client has
+            # Async views are run to completion, see blog_async.py
+            call_view = current_app.ensure_sync(view)
+            if request.method != "GET" or "_flashes" in session:
+                return call_view(**kwargs)
+
+            validators = get_validators(validator, kwargs)
+            if validators is None:
+                return call_view(**kwargs)
+            tag, last_modified = validators
+
+            # The page differs for every logged in user,
+            #   so the user is part of the ETag as well
+            user_id = session.get("user_id") if per_user else None
+            etag = hashlib.md5(
+                repr((tag, user_id)).encode("utf-8")
+            ).hexdigest()
+            # sqlite timestamps are UTC, but have no timezone
+            if last_modified is not None:
+                last_modified = last_modified.replace(tzinfo=timezone.utc)
+
+            if is_fresh(etag, last_modified):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(call_view(**kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag, weak=True)
+            response.last_modified = last_modified
+            # Clients and proxies may keep the page,
+            #   but must check with us before using it again
+            response.cache_control.no_cache = True
+            if per_user:
+                response.vary.add("Cookie")
+            return response
+
+        return wrapped_view
+
+    return decorator
+
+def is_fresh(etag, last_modified):
+    """
+    Checks the If-None-Match and If-Modified-Since headers of the request
+        against the current validators of the page.
+    If-None-Match wins when both are given, as HTTP says.
+    """
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified is not None:
+        return last_modified <= request.if_modified_since
+    return False
+
+def init_app(app):
+    """
+    We create the page cache of the application
+        from the PAGE_CACHE, PAGE_CACHE_SIZE and PAGE_CACHE_TTL config,
+        and the cache of rendered posts from the FRAGMENT_CACHE_SIZE config
+    """
+    app.extensions["flaskr.page_cache"] = make_backend(
+        app.config["PAGE_CACHE"],
+        app.config["PAGE_CACHE_SIZE"],
+        app.config["PAGE_CACHE_TTL"],
+    )
+    app.extensions["flaskr.fragment_cache"] = LRUCache(
+        app.config["FRAGMENT_CACHE_SIZE"]
+    )
@@ -0,0 +1,79 @@
+import gzip
+from flask import current_app, request
+
+# Brotli compresses text better than gzip, but needs the brotli package
+#   (pip install flaskr[brotli]). Without it we only offer gzip.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# How hard to compress. Responses are compressed on every request,
+#   so these trade a little size for much less time than the maximum.
+#   Static files are compressed once, ahead of time, as hard as we can.
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+BEST_GZIP_LEVEL = 9
+BEST_BROTLI_QUALITY = 11
+
+# The types of responses worth compressing. Images and the like
+#   are compressed already.
+COMPRESSIBLE_MIMETYPES = {
+    "text/html", "text/css", "text/plain", "text/javascript",
+    "application/javascript", "application/json", "application/xml",
+    "application/atom+xml", "application/rss+xml", "image/svg+xml",
+}
+
+def get_encodings():
+    """
+    Returns the content codings we can compress with, best first
+    """
+    return ("br", "gzip") if brotli is not None else ("gzip", )
+
+def compress(data, encoding, best=False):
+    """
+    Compresses the bytes data with the content coding encoding,
+        as hard as possible with best.
+    gzip leaves out the time, so the same data always compresses the same.
+    """
+    if encoding == "br":
+        return brotli.compress(
+            data, quality=BEST_BROTLI_QUALITY if best else BROTLI_QUALITY
+        )
+    return gzip.compress(
+        data, compresslevel=BEST_GZIP_LEVEL if best else GZIP_LEVEL, mtime=0
+    )
+
+def compress_response(response):
+    """
+    Compresses the body of a successful response with the best coding
+        the client accepts, if it has at least COMPRESS_MIN_SIZE bytes,
+        since compressing a small body costs more time than it saves.
+    Streamed responses and files are sent as they are, static files
+        are compressed ahead of time by the precompress-static command.
+    """
+    min_size = current_app.config["COMPRESS_MIN_SIZE"]
+    if (min_size is None or response.status_code != 200
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or response.is_streamed or response.direct_passthrough
+            or "Content-Encoding" in response.headers):
+        return response
+
+    # The body differs by Accept-Encoding, even when we send it as it is
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    encoding = request.accept_encodings.best_match(get_encodings())
+    if encoding is None:
+        return response
+    response.set_data(compress(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+def init_app(app):
+    """
+    We compress the responses of every view of the application
+    """
+    app.after_request(compress_response)
@@ -1,40 +1,313 @@
+import os
+import pathlib
 import sqlite3
+import threading
 import click
 from flask import current_app, g
 from flask.cli import with_appcontext
+from werkzeug.routing import IntegerConverter
+
+# PRAGMA profiles, chosen by name with the DATABASE_PRAGMAS config.
+#   DATABASE_PRAGMAS may also be a dict of pragma names to values.
+PRAGMA_PROFILES = {
+    # Whatever sqlite does by default: a rollback journal,
+    #   where every commit locks out all readers of the database
+    "default": {},
+    # A write-ahead log, where readers keep reading the last committed
+    #   data while a writer commits, and do not block the writer either
+    "wal": {
+        # Milliseconds to wait for another writer before giving up.
+        #   It comes first so that it also applies to the pragmas below
+        "busy_timeout": 5000,
+        "journal_mode": "WAL",
+        # In WAL mode NORMAL is still safe against corruption,
+        #   and only syncs to disk at checkpoints
+        "synchronous": "NORMAL",
+        # Negative cache size is in KiB, so this is 16MiB of page cache
+        "cache_size": -16000,
+        "mmap_size": 128 * 1024 * 1024,
+        "temp_store": "MEMORY",
+    },
+}
+
+# Pragmas that change the database file rather than the connection,
+#   which a read-only connection cannot apply and leaves to the writer
+WRITE_PRAGMAS = {"journal_mode"}
+
+# The range of sqlite integers. Larger python ints cannot be bound
+#   as parameters, so ids from users are checked against it first
+MIN_INTEGER, MAX_INTEGER = -2 ** 63, 2 ** 63 - 1
+
+# The text form sqlite stores TIMESTAMP columns in, which is also
+#   the only form the timestamp converter of sqlite3 reads back
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+class ConnectionPool(object):
+    """
+    A pool of sqlite connections to one database file.
+    Opening a connection means opening the file, parsing the schema
+        and starting with a cold page cache, so instead of closing
+        connections at the end of each request we keep up to size of them
+        idle here and hand them out again to the next requests.
+    The pool is shared by all threads of one process. Connections are made
+        with check_same_thread=False, which is safe because a connection
+        is only ever used by the one request that acquired it.
+    A readonly pool opens the file with mode=ro and sets query_only,
+        so that its connections can never write, not even by mistake.
+    """
+    def __init__(self, database, size, pragmas=None, readonly=False):
+        """
+        Constructor to store the database path, the maximum
+            number of idle connections kept around,
+            the pragmas to apply to every new connection
+            and whether the connections are read-only
+        """
+        self.database = database
+        self.size = size
+        self.pragmas = pragmas or {}
+        self.readonly = readonly
+        if readonly:
+            self.pragmas = dict(
+                {name: value for name, value in self.pragmas.items()
+                 if name not in WRITE_PRAGMAS},
+                query_only=1
+            )
+        self._idle = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def connect(self):
+        """
+        Opens a new connection to the database
+        """
+        database, uri = self.database, False
+        if self.readonly:
+            database = pathlib.Path(os.path.abspath(database)).as_uri()
+            database, uri = database + "?mode=ro", True
+        db = sqlite3.connect(
+            database,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+            uri=uri,
+        )
+
+        # Rows in sqlite will be dicts in python
+        db.row_factory = sqlite3.Row
+
+        # Pragmas only last as long as the connection,
+        #   so they are applied to every connection we open
+        for name, value in self.pragmas.items():
+            db.execute("PRAGMA {0} = {1}".format(name, value))
+        return db
+
+    def acquire(self):
+        """
+        Returns an idle connection from the pool, or a new one if the pool
+            is empty. Idle connections are health checked before reuse
+            and silently replaced if they no longer work.
+        """
+        with self._lock:
+            # A forked child must not share connections with its parent,
+            #   so it forgets the ones it inherited and starts afresh
+            if self._pid != os.getpid():
+                self._idle, self._pid = [], os.getpid()
+            db = self._idle.pop() if self._idle else None
+
+        while db is not None:
+            try:
+                db.execute("SELECT 1").fetchone()
+                return db
+            except sqlite3.Error:
+                _close_quietly(db)
+            with self._lock:
+                db = self._idle.pop() if self._idle else None
+
+        return self.connect()
+
+    def release(self, db):
+        """
+        Gives a connection back to the pool once a request is done with it.
+        Uncommitted work is rolled back so that the next request
+            starts from a clean connection.
+        """
+        try:
+            if db.in_transaction:
+                db.rollback()
+        except sqlite3.Error:
+            _close_quietly(db)
+            return
+
+        with self._lock:
+            if self._pid == os.getpid() and len(self._idle) < self.size:
+                self._idle.append(db)
+                return
+        db.close()
+
+    def dispose(self):
+        """
+        Closes every idle connection in the pool
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for db in idle:
+            _close_quietly(db)
+
+class PooledConnection(object):
+    """
+    The object get_db hands out for one app context.
+    It behaves like the sqlite3 connection it wraps, but closing it gives
+        the connection back to the pool, after which it raises the same
+        error a closed sqlite3 connection would.
+    """
+    def __init__(self, pool):
+        """
+        Constructor to acquire a connection from the pool
+        """
+        self._pool = pool
+        self._db = pool.acquire()
+
+    def __getattr__(self, name):
+        """
+        Everything but close is passed on to the sqlite3 connection
+        """
+        if self._db is None:
+            raise sqlite3.ProgrammingError(
+                "Cannot operate on a closed database."
+            )
+        return getattr(self._db, name)
+
+    def __enter__(self):
+        """
+        Using the connection in a with block commits or rolls back
+            the transaction, as it does for a sqlite3 connection
+        """
+        self.__getattr__("__enter__")()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self.__getattr__("__exit__")(*exc_info)
+
+    def close(self):
+        """
+        Returns the connection to the pool instead of closing it
+        """
+        db, self._db = self._db, None
+        if db is not None:
+            self._pool.release(db)
+
+def _close_quietly(db):
+    """
+    Closes a connection that may already be broken
+    """
+    try:
+        db.close()
+    except sqlite3.Error:
+        pass
+
+def get_pool(app=None, readonly=False):
+    """
+    Returns the connection pool of the application,
+        or its pool of read-only connections with readonly,
+        creating it the first time it is needed.
+    DATABASE_POOL_SIZE is how many idle connections each pool keeps,
+        and 0 turns pooling off.
+    DATABASE_PRAGMAS is the name of a profile in PRAGMA_PROFILES
+        or a dict of pragmas.
+    Read-only connections open DATABASE_READ, or DATABASE if it is None.
+    """
+    app = app or current_app._get_current_object()
+    key = "flaskr.db_read" if readonly else "flaskr.db"
+    pool = app.extensions.get(key)
+    if pool is None:
+        pragmas = app.config["DATABASE_PRAGMAS"]
+        if isinstance(pragmas, str):
+            pragmas = PRAGMA_PROFILES[pragmas]
+        database = app.config["DATABASE"]
+        if readonly and app.config["DATABASE_READ"] is not None:
+            database = app.config["DATABASE_READ"]
+        pool = app.extensions[key] = ConnectionPool(
+            database, app.config["DATABASE_POOL_SIZE"], pragmas, readonly
+        )
+    return pool
+
+def dispose_pool(app=None):
+    """
+    Closes every idle connection of the application pools,
+        for example before the database file is removed,
+        and the connection of its write queue.
+    The password hashing processes are stopped as well,
+        since this is where the application lets go of its resources.
+    """
+    app = app or current_app._get_current_object()
+    from flaskr.passwords import shutdown_executor
+    from flaskr.writequeue import stop_write_queue
+    stop_write_queue(app)
+    shutdown_executor(app)
+    for key in ("flaskr.db", "flaskr.db_read"):
+        pool = app.extensions.pop(key, None)
+        if pool is not None:
+            pool.dispose()
+
+def connect(readonly=False):
+    """
+    Acquires a connection from a pool of the application,
+        wrapped to time its statements when someone is looking at the timings
+    """
+    db = PooledConnection(get_pool(readonly=readonly))
+    config = current_app.config
+    if config["METRICS_ENABLED"] or config["SLOW_QUERY_SECONDS"] is not None:
+        from flaskr.metrics import InstrumentedConnection, get_metrics
+        db = InstrumentedConnection(
+            db, get_metrics(), config["SLOW_QUERY_SECONDS"]
+        )
+    return db
 
 def get_db():
     """
-    Creates a connection to the database instance
-        in the instance/ directory.
+    Gets a connection to the database instance
+        in the instance/ directory from the connection pool.
     Returns the database object
     Also attaches it to global object g
+    This is the connection that writes, reads go through get_read_db.
     """
     if 'db' not in g:
-        g.db = sqlite3.connect(
-            current_app.config['DATABASE'],
-            detect_types=sqlite3.PARSE_DECLTYPES,
-        )
-        
-        # Rows in sqlite will be dicts in python
-        g.db.row_factory = sqlite3.Row
+        g.db = connect()
 
     return g.db
 
+def get_read_db():
+    """
+    Gets a read-only connection from the pool of read-only connections,
+        attached to the global object g like get_db does.
+    Under WAL any number of them read while the one writer commits,
+        and with DATABASE_READ they read a copy of the database,
+        such as a replica kept up to date by another tool.
+    A request that has already got the writing connection keeps using it,
+        so that it reads what it wrote, even from a lagging replica.
+    """
+    if 'db' in g:
+        return g.db
+    if 'read_db' not in g:
+        g.read_db = connect(readonly=True)
+
+    return g.read_db
+
 def close_db(e=None):
     """
-    Checks if database object exists in g
-        if it does, it is popped from g and closed
+    Checks if database objects exist in g
+        if they do, they are popped from g and given back to their pools
     """
-    db = g.pop('db', None)
-    
-    if db is not None:
-        db.close()
+    for name in ('db', 'read_db'):
+        db = g.pop(name, None)
+
+        if db is not None:
+            db.close()
 
 def init_db():
     """
     Create a db object using get_db
-        and run sql code in schema.sql to create tables
+        and run sql code in schema.sql to create tables,
+        then bring them up to date with migrate
     """
     db = get_db();
     
@@ -44,6 +317,130 @@ def init_db():
     with current_app.open_resource("schema.sql") as f:
         db.executescript(f.read().decode("utf-8"))
 
+    migrate()
+
+def add_search(db):
+    """
+    Migration adding the full-text search table and its triggers,
+        and indexing the posts that are already there
+    """
+    run_script(db, "search.sql")
+    db.execute("INSERT INTO post_fts (post_fts) VALUES ('rebuild')")
+
+def add_excerpts(db):
+    """
+    Migration adding the excerpt column of posts,
+        and making the excerpts of the posts that are already there
+    """
+    from flaskr.blog import make_excerpt
+
+    run_script(db, "migrations/0006_post_excerpt.sql")
+    # Posts are read a batch at a time, so that memory use does not grow
+    #   with the number of posts
+    last_id = 0
+    while True:
+        posts = db.execute(
+            "SELECT id, body FROM post WHERE id > ? ORDER BY id LIMIT 1000",
+            (last_id, )
+        ).fetchall()
+        if not posts:
+            break
+        db.executemany(
+            "UPDATE post SET excerpt = ? WHERE id = ?",
+            [(make_excerpt(post["body"]), post["id"]) for post in posts]
+        )
+        last_id = posts[-1]["id"]
+
+# The changes made to schema.sql since the first version, in order.
+#   Every migration is the name of a sql script in the flaskr package,
+#   or a function called with the connection for what sql cannot do.
+#   The schema version of a database, kept in PRAGMA user_version,
+#   is the number of migrations applied to it, so only ever add to the end.
+MIGRATIONS = (
+    "migrations/0001_post_updated_version.sql",
+    "migrations/0002_post_created_id.sql",
+    "migrations/0003_post_revision.sql",
+    add_search,
+    "migrations/0005_post_author.sql",
+    add_excerpts,
+    "migrations/0007_post_truncated.sql",
+)
+
+def run_script(db, resource):
+    """
+    Executes the sql script resource of the flaskr package one statement
+        at a time, since executescript would commit the transaction
+        the statements have to be part of
+    """
+    with current_app.open_resource(resource) as f:
+        script = f.read().decode("utf-8")
+
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        # Statements end with a ; but so do the ones inside a trigger
+        if sqlite3.complete_statement(statement):
+            db.execute(statement)
+            statement = ""
+
+def get_schema_version(db):
+    """
+    Returns the number of migrations applied to the database
+    """
+    return db.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate():
+    """
+    Applies the migrations the database does not have yet,
+        and returns the schema versions before and after.
+    Every migration runs in its own BEGIN IMMEDIATE transaction together
+        with the update of user_version, so a failed migration leaves the
+        database as it was, and when several processes migrate at once the
+        others wait for the write lock and then skip what is already done.
+    Under WAL, readers keep reading the old schema while a migration like
+        CREATE INDEX runs, and writers wait up to the busy timeout, so
+        indexes can be added to a live database.
+    """
+    db = get_db()
+    before = get_schema_version(db)
+    for version, migration in enumerate(MIGRATIONS, 1):
+        if version <= before:
+            continue
+
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have applied it while we waited for the lock
+            if get_schema_version(db) < version:
+                if callable(migration):
+                    migration(db)
+                else:
+                    run_script(db, migration)
+                db.execute("PRAGMA user_version = {0}".format(version))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+    return before, get_schema_version(db)
+
+def init_search():
+    """
+    Create the full-text search table and its triggers
+        by running the sql code in search.sql, if they do not exist yet
+    """
+    db = get_db()
+    with current_app.open_resource("search.sql") as f:
+        db.executescript(f.read().decode("utf-8"))
+
+def rebuild_search():
+    """
+    Create the full-text search table if needed,
+        and fill it again from every post in the database
+    """
+    init_search()
+    db = get_db()
+    db.execute("INSERT INTO post_fts (post_fts) VALUES ('rebuild')")
+    db.commit()
+
 @click.command("init-db")
 @with_appcontext
 def init_db_command():
@@ -56,9 +453,49 @@ def init_db_command():
     init_db()
     click.echo("Initialized the database")
 
+@click.command("migrate")
+@with_appcontext
+def migrate_command():
+    """
+    This function brings an existing database up to date with migrate,
+        keeping its data, and prints the schema versions to console.
+    The function is linked to a newly created flask command migrate
+    """
+    before, after = migrate()
+    if before == after:
+        click.echo("The database is up to date (version {0})".format(after))
+    else:
+        click.echo("Migrated the database from version {0} to {1}".format(
+            before, after
+        ))
+
+@click.command("rebuild-search")
+@with_appcontext
+def rebuild_search_command():
+    """
+    This function adds full-text search to an existing database,
+        or repairs it, using rebuild_search and prints a message to console.
+    The function is linked to a newly created flask command rebuild-search
+    """
+    rebuild_search()
+    click.echo("Rebuilt the search index")
+
+class IdConverter(IntegerConverter):
+    """
+    The int converter of urls, limited to the ids sqlite can hold,
+        so that a larger id is not found instead of failing to be bound
+    """
+    def __init__(self, map, *args, **kwargs):
+        kwargs.setdefault("max", MAX_INTEGER)
+        super().__init__(map, *args, **kwargs)
+
 def init_app(app):
     """
-    We register the close_db and init_db_command with the application 
+    We register the close_db and init_db_command with the application,
+        and limit the ints of urls to what sqlite can hold
     """
+    app.url_map.converters["int"] = IdConverter
     app.teardown_appcontext(close_db)
     app.cli.add_command(init_db_command)
+    app.cli.add_command(migrate_command)
+    app.cli.add_command(rebuild_search_command)
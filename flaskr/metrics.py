@@ -0,0 +1,301 @@
+import threading
+import time
+from flask import current_app, g, has_app_context, request
+from jinja2 import Template
+
+# The metrics we record, with their Prometheus type and help text.
+#   Summaries are exposed as a _count and a _sum of seconds.
+METRICS = {
+    "flaskr_requests_total": (
+        "counter", "Requests handled, by endpoint, method and status."
+    ),
+    "flaskr_request_seconds": (
+        "summary", "Time spent handling requests, by endpoint."
+    ),
+    "flaskr_request_db_seconds": (
+        "summary", "Time requests spent in the database, by endpoint."
+    ),
+    "flaskr_request_template_seconds": (
+        "summary", "Time requests spent rendering templates, by endpoint."
+    ),
+    "flaskr_request_password_hash_seconds": (
+        "summary", "Time requests spent hashing passwords, by endpoint."
+    ),
+    "flaskr_db_query_seconds": (
+        "summary", "Time spent executing each SQL statement."
+    ),
+    "flaskr_db_query_rows_total": (
+        "counter", "Rows fetched or changed by each SQL statement."
+    ),
+    "flaskr_write_queue_writes_total": (
+        "counter", "Writes committed by the write queue."
+    ),
+    "flaskr_write_queue_errors_total": (
+        "counter", "Writes of the write queue that failed."
+    ),
+    "flaskr_write_queue_batches_total": (
+        "counter", "Transactions committed by the write queue."
+    ),
+    "flaskr_write_queue_commit_seconds": (
+        "summary", "Time spent running and committing each batch of writes."
+    ),
+    "flaskr_write_queue_wait_seconds": (
+        "summary", "Time from queueing each write until it was committed."
+    ),
+}
+
+# The per request timings, as kept on g and named in METRICS
+REQUEST_TIMINGS = ("db", "template", "password_hash")
+
+class Metrics(object):
+    """
+    The counters and summaries of one application process,
+        rendered in the Prometheus text format by /_metrics.
+    It is safe to use from several threads.
+    """
+    def __init__(self):
+        """
+        Constructor to make the empty table of values,
+            keyed by metric name and labels
+        """
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, labels, value=1):
+        """
+        Adds value to the counter name with the labels,
+            a tuple of (label, value) pairs
+        """
+        key = (name, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def observe(self, name, labels, seconds, count=1):
+        """
+        Adds count observations totalling seconds to the summary name
+        """
+        with self._lock:
+            old_count, total = self._values.get((name, labels), (0, 0.0))
+            self._values[(name, labels)] = (old_count + count, total + seconds)
+
+    def render(self):
+        """
+        Returns every value in the Prometheus text exposition format
+        """
+        with self._lock:
+            values = sorted(self._values.items())
+
+        lines = []
+        for name, (kind, help) in METRICS.items():
+            lines.append("# HELP {0} {1}".format(name, help))
+            lines.append("# TYPE {0} {1}".format(name, kind))
+            for (value_name, labels), value in values:
+                if value_name != name:
+                    continue
+                if kind == "summary":
+                    lines.append(format_sample(name + "_count", labels, value[0]))
+                    lines.append(format_sample(name + "_sum", labels, value[1]))
+                else:
+                    lines.append(format_sample(name, labels, value))
+        return "\n".join(lines) + "\n"
+
+def format_sample(name, labels, value):
+    """
+    Formats one sample line, escaping the label values
+    """
+    if not labels:
+        return "{0} {1}".format(name, value)
+    return "{0}{{{1}}} {2}".format(name, ",".join(
+        '{0}="{1}"'.format(label, str(label_value)
+            .replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for label, label_value in labels
+    ), value)
+
+def get_metrics():
+    """
+    Returns the Metrics of the application, or None if METRICS_ENABLED is off
+    """
+    return current_app.extensions.get("flaskr.metrics")
+
+def add_request_time(kind, seconds):
+    """
+    Adds seconds spent on kind of work, one of REQUEST_TIMINGS,
+        to the timings of the current request
+    """
+    if has_app_context() and "metrics_start" in g:
+        g.metrics_timings[kind] += seconds
+
+class InstrumentedConnection(object):
+    """
+    Wraps the connection get_db hands out, timing every statement,
+        counting its rows and logging it if it is slower than
+        SLOW_QUERY_SECONDS.
+    get_db only wraps connections when METRICS_ENABLED or
+        SLOW_QUERY_SECONDS is set, so otherwise it costs nothing.
+    """
+    def __init__(self, db, metrics, slow_query_seconds):
+        """
+        Constructor to store the connection and where its timings go
+        """
+        self._db = db
+        self._metrics = metrics
+        self._slow_query_seconds = slow_query_seconds
+
+    def __getattr__(self, name):
+        """
+        Everything but executing statements is passed on to the connection
+        """
+        return getattr(self._db, name)
+
+    def __enter__(self):
+        self._db.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._db.__exit__(*exc_info)
+
+    def execute(self, sql, parameters=()):
+        return self._timed(sql, self._db.execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed(sql, self._db.executemany, sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self._timed("<script>", self._db.executescript, sql_script)
+
+    def _timed(self, sql, function, *args):
+        """
+        Runs function(*args) and records how long it took for sql
+        """
+        start = time.perf_counter()
+        cursor = function(*args)
+        self.record(
+            sql, time.perf_counter() - start, max(cursor.rowcount, 0), 1
+        )
+        return InstrumentedCursor(cursor, sql, self)
+
+    def record(self, sql, seconds, rows, count=0):
+        """
+        Records the time and rows of sql. Executing it counts
+            as one more statement, fetching from it only adds time and rows.
+        """
+        add_request_time("db", seconds)
+        if self._metrics is not None:
+            labels = (("sql", sql), )
+            self._metrics.observe(
+                "flaskr_db_query_seconds", labels, seconds, count
+            )
+            if rows:
+                self._metrics.inc("flaskr_db_query_rows_total", labels, rows)
+        if (self._slow_query_seconds is not None
+                and seconds >= self._slow_query_seconds):
+            current_app.logger.warning(
+                "Slow query (%.3fs, %d rows): %s", seconds, rows, sql
+            )
+
+class InstrumentedCursor(object):
+    """
+    Wraps a cursor made by InstrumentedConnection,
+        recording the time and rows of fetching from it
+    """
+    def __init__(self, cursor, sql, connection):
+        """
+        Constructor to store the cursor, its statement and connection
+        """
+        self._cursor = cursor
+        self._sql = sql
+        self._connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._connection.record(
+            self._sql, time.perf_counter() - start, int(row is not None)
+        )
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = self._cursor.fetchmany(size or self._cursor.arraysize)
+        self._connection.record(self._sql, time.perf_counter() - start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._connection.record(self._sql, time.perf_counter() - start, len(rows))
+        return rows
+
+class TimedTemplate(Template):
+    """
+    The class of templates when METRICS_ENABLED is set,
+        adding the time spent rendering to the timings of the request.
+    Templates rendered while rendering another, like the posts
+        of the index, are counted as part of the outer one.
+    """
+    def render(self, *args, **kwargs):
+        if not has_app_context() or g.get("metrics_rendering"):
+            return super().render(*args, **kwargs)
+
+        g.metrics_rendering = True
+        start = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            add_request_time("template", time.perf_counter() - start)
+            g.metrics_rendering = False
+
+def start_request():
+    """
+    Starts the timings of a request
+    """
+    g.metrics_start = time.perf_counter()
+    g.metrics_timings = dict.fromkeys(REQUEST_TIMINGS, 0.0)
+
+def finish_request(response):
+    """
+    Records the timings of a request once its response is ready
+    """
+    metrics = get_metrics()
+    labels = (("endpoint", request.endpoint or "none"), )
+    metrics.inc("flaskr_requests_total", labels + (
+        ("method", request.method), ("status", response.status_code)
+    ))
+    metrics.observe(
+        "flaskr_request_seconds", labels,
+        time.perf_counter() - g.metrics_start
+    )
+    for kind, seconds in g.metrics_timings.items():
+        metrics.observe(
+            "flaskr_request_{0}_seconds".format(kind), labels, seconds
+        )
+    return response
+
+def metrics_view():
+    """
+    This function is linked to the /_metrics url,
+        and it serves every metric in the Prometheus text format
+    """
+    return current_app.response_class(
+        get_metrics().render(), mimetype="text/plain; version=0.0.4"
+    )
+
+def init_app(app):
+    """
+    If METRICS_ENABLED is set, we create the metrics of the application,
+        time every request and template and serve them at /_metrics
+    """
+    if not app.config["METRICS_ENABLED"]:
+        return
+
+    app.extensions["flaskr.metrics"] = Metrics()
+    app.jinja_env.template_class = TimedTemplate
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    app.add_url_rule("/_metrics", "metrics", metrics_view)
@@ -0,0 +1,22 @@
+-- Adds the updated time and the edit count of posts.
+--  sqlite cannot add a column with a CURRENT_TIMESTAMP default,
+--  so the table is made again with them and the posts copied over.
+--  This comes before any trigger or index on post, which would be lost.
+CREATE TABLE post_new (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    author_id INTEGER NOT NULL,
+    created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    -- Counts the edits of the post, which can be more than one a second
+    version INTEGER NOT NULL DEFAULT 0,
+    title TEXT NOT NULL,
+    body TEXT NOT NULL,
+    FOREIGN KEY (author_id) REFERENCES user (id)
+);
+
+INSERT INTO post_new (id, author_id, created, updated, title, body)
+SELECT id, author_id, created, created, title, body FROM post;
+
+DROP TABLE post;
+
+ALTER TABLE post_new RENAME TO post;
@@ -0,0 +1,3 @@
+-- Index for the keyset pagination of blog.index,
+--  which orders posts by (created, id) most recent first
+CREATE INDEX IF NOT EXISTS post_created_id ON post (created, id);
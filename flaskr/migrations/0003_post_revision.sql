@@ -0,0 +1,26 @@
+-- A single row that changes with every write to post.
+--  Its revision and modified time are the cheap validators
+--  of conditional GETs of the pages of posts.
+CREATE TABLE post_revision (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    revision INTEGER NOT NULL,
+    modified TIMESTAMP NOT NULL
+);
+
+INSERT INTO post_revision (id, revision, modified)
+VALUES (1, 0, CURRENT_TIMESTAMP);
+
+CREATE TRIGGER post_revision_insert AFTER INSERT ON post BEGIN
+    UPDATE post_revision
+    SET revision = revision + 1, modified = CURRENT_TIMESTAMP;
+END;
+
+CREATE TRIGGER post_revision_update AFTER UPDATE ON post BEGIN
+    UPDATE post_revision
+    SET revision = revision + 1, modified = CURRENT_TIMESTAMP;
+END;
+
+CREATE TRIGGER post_revision_delete AFTER DELETE ON post BEGIN
+    UPDATE post_revision
+    SET revision = revision + 1, modified = CURRENT_TIMESTAMP;
+END;
@@ -0,0 +1,24 @@
+-- Index for the pages of one author's posts,
+--  which order that author's posts by (created, id) most recent first
+CREATE INDEX IF NOT EXISTS post_author_created_id
+ON post (author_id, created, id);
+
+-- The number of posts of every user, kept up to date by the triggers below
+--  so that author pages do not count them with a scan
+ALTER TABLE user ADD COLUMN post_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE user
+SET post_count = (SELECT COUNT(*) FROM post WHERE author_id = user.id);
+
+CREATE TRIGGER user_post_count_insert AFTER INSERT ON post BEGIN
+    UPDATE user SET post_count = post_count + 1 WHERE id = new.author_id;
+END;
+
+CREATE TRIGGER user_post_count_delete AFTER DELETE ON post BEGIN
+    UPDATE user SET post_count = post_count - 1 WHERE id = old.author_id;
+END;
+
+CREATE TRIGGER user_post_count_update AFTER UPDATE OF author_id ON post BEGIN
+    UPDATE user SET post_count = post_count - 1 WHERE id = old.author_id;
+    UPDATE user SET post_count = post_count + 1 WHERE id = new.author_id;
+END;
@@ -0,0 +1,3 @@
+-- The beginning of the body of every post, shown on the pages of posts
+--  instead of the whole body. add_excerpts fills it in for old posts.
+ALTER TABLE post ADD COLUMN excerpt TEXT NOT NULL DEFAULT '';
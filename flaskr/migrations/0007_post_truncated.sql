@@ -0,0 +1,6 @@
+-- Whether the excerpt of a post is only the beginning of its body,
+--  so that the pages of posts know to link to the whole post without
+--  reading the body. make_excerpt returns short bodies unchanged,
+--  so an excerpt is cut short exactly when it differs from its body.
+ALTER TABLE post ADD COLUMN truncated INTEGER NOT NULL DEFAULT 0;
+UPDATE post SET truncated = excerpt != body;
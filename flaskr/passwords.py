@@ -0,0 +1,169 @@
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+from flaskr.cache import LRUCache
+from flaskr.metrics import add_request_time
+
+# Guards the creation of the process pools of every app
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """
+    Returns the process pool that hashes passwords for the application,
+        or None if PASSWORD_HASH_WORKERS is 0 and we hash in the request.
+    Password hashes are made slow on purpose, and while a thread computes
+        one it holds the GIL, so every other request of the process waits.
+        In a pool of PASSWORD_HASH_WORKERS processes they only use
+        those processes, and at most that many hashes run at once.
+    The pool is made the first time it is needed, usually in a request
+        thread. Forking a process with several threads can copy a lock
+        another thread holds, so its processes are started by a forkserver.
+    """
+    workers = current_app.config["PASSWORD_HASH_WORKERS"]
+    if not workers:
+        return None
+
+    extensions = current_app.extensions
+    with _executor_lock:
+        pid, executor = extensions.get("flaskr.password_executor", (None, None))
+        # A forked child cannot use the pool of its parent
+        if executor is None or pid != os.getpid():
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("forkserver"),
+            )
+            extensions["flaskr.password_executor"] = (os.getpid(), executor)
+        return executor
+
+def shutdown_executor(app):
+    """
+    Stops the processes of the password pool of the application,
+        if it has one, so that they do not outlive it
+    """
+    pid, executor = app.extensions.pop(
+        "flaskr.password_executor", (None, None)
+    )
+    if executor is not None and pid == os.getpid():
+        executor.shutdown()
+
+def run(function, *args):
+    """
+    Runs a hashing function in the process pool, if there is one,
+        and waits for its result
+    """
+    start = time.perf_counter()
+    executor = get_executor()
+    try:
+        if executor is None:
+            return function(*args)
+        return executor.submit(function, *args).result()
+    finally:
+        add_request_time("password_hash", time.perf_counter() - start)
+
+def hash_password(password):
+    """
+    Hashes a password with the PASSWORD_HASH_METHOD
+        and PASSWORD_SALT_LENGTH config
+    """
+    return run(
+        generate_password_hash,
+        password,
+        current_app.config["PASSWORD_HASH_METHOD"],
+        current_app.config["PASSWORD_SALT_LENGTH"],
+    )
+
+def verify_password(pwhash, password):
+    """
+    Checks a password against a hash made by hash_password
+    """
+    return run(check_password_hash, pwhash, password)
+
+def get_method_prefix(method):
+    """
+    Returns the method werkzeug writes at the start of hashes made
+        with method, which fills in what it leaves out, like the number
+        of iterations of "pbkdf2:sha256". It is found by hashing an empty
+        password once, and kept for every later call.
+    """
+    prefixes = current_app.extensions["flaskr.password_methods"]
+    if method not in prefixes:
+        prefixes[method] = run(generate_password_hash, "", method).split("$", 1)[0]
+    return prefixes[method]
+
+def needs_rehash(pwhash):
+    """
+    Checks whether a hash was made with another method, cost or salt length
+        than the PASSWORD_HASH_METHOD and PASSWORD_SALT_LENGTH config.
+    Such hashes are made again the next time the user logs in,
+        since that is the only time we know the password.
+    """
+    method, salt = pwhash.split("$", 2)[:2]
+    config = current_app.config
+    if len(salt) != config["PASSWORD_SALT_LENGTH"]:
+        return True
+    # Most hashes are made with the configured method as it is written,
+    #   so we only work out what it expands to for the others
+    if method == config["PASSWORD_HASH_METHOD"]:
+        return False
+    return method != get_method_prefix(config["PASSWORD_HASH_METHOD"])
+
+class RateLimiter(object):
+    """
+    Allows at most limit hits per key in any window of seconds.
+    The hits of at most maxsize keys are remembered, forgetting the keys
+        that were hit longest ago, so a flood of keys cannot use up memory.
+    """
+    def __init__(self, limit, window, maxsize=10000):
+        """
+        Constructor to store the limits
+        """
+        self.limit = limit
+        self.window = window
+        self._hits = LRUCache(maxsize, window)
+        self._lock = threading.Lock()
+
+    def hit(self, key):
+        """
+        Records a hit for key, and returns False if the key
+            already had limit hits in the last window of seconds
+        """
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.get(key)
+            if hits is None:
+                hits = deque()
+            # Forget the hits that have left the window
+            while hits and hits[0] <= now - self.window:
+                hits.popleft()
+            if len(hits) >= self.limit:
+                return False
+            hits.append(now)
+            self._hits.set(key, hits)
+            return True
+
+def check_rate_limit(remote_addr, username):
+    """
+    Records a login or register attempt, and returns False
+        if either the address or the username is over the limit
+        of LOGIN_RATE_LIMIT attempts per LOGIN_RATE_WINDOW seconds
+    """
+    limiter = current_app.extensions["flaskr.login_limiter"]
+    # Both are always recorded, so neither can be used to skip the other
+    address_allowed = limiter.hit(("address", remote_addr))
+    username_allowed = limiter.hit(("username", username))
+    return address_allowed and username_allowed
+
+def init_app(app):
+    """
+    We create the login rate limiter of the application,
+        and the table of hash method prefixes for needs_rehash
+    """
+    app.extensions["flaskr.password_methods"] = {}
+    app.extensions["flaskr.login_limiter"] = RateLimiter(
+        app.config["LOGIN_RATE_LIMIT"], app.config["LOGIN_RATE_WINDOW"]
+    )
@@ -1,5 +1,12 @@
+-- The first version of the schema. Everything added since is a migration
+--  in db.MIGRATIONS, which init_db applies after this script, so that new
+--  databases and migrated ones end up with the same schema.
 DROP TABLE IF EXISTS user;
 DROP TABLE IF EXISTS post;
+DROP TABLE IF EXISTS post_revision;
+DROP TABLE IF EXISTS post_fts;
+
+PRAGMA user_version = 0;
 
 CREATE TABLE user (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -0,0 +1,30 @@
+-- Full-text search index over the title and body of posts.
+--  It is an external content table: it only stores the index
+--  and reads the text itself from the post table.
+--  The triggers below keep it in sync with every write to post.
+--  Everything here is IF NOT EXISTS, so that rebuild-search
+--  can add search to a database made before it existed.
+CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5(
+    title,
+    body,
+    content='post',
+    content_rowid='id',
+    tokenize='porter unicode61'
+);
+
+CREATE TRIGGER IF NOT EXISTS post_fts_insert AFTER INSERT ON post BEGIN
+    INSERT INTO post_fts (rowid, title, body)
+    VALUES (new.id, new.title, new.body);
+END;
+
+CREATE TRIGGER IF NOT EXISTS post_fts_delete AFTER DELETE ON post BEGIN
+    INSERT INTO post_fts (post_fts, rowid, title, body)
+    VALUES ('delete', old.id, old.title, old.body);
+END;
+
+CREATE TRIGGER IF NOT EXISTS post_fts_update AFTER UPDATE OF title, body ON post BEGIN
+    INSERT INTO post_fts (post_fts, rowid, title, body)
+    VALUES ('delete', old.id, old.title, old.body);
+    INSERT INTO post_fts (rowid, title, body)
+    VALUES (new.id, new.title, new.body);
+END;
@@ -0,0 +1,133 @@
+import os
+import sqlite3
+import click
+from flask import current_app
+from flask.cli import FlaskGroup, with_appcontext
+from flaskr import create_app
+from flaskr.db import get_pool
+
+def get_cpu_count():
+    """
+    Returns the number of CPUs this process may run on,
+        which in a container can be fewer than the machine has
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def default_workers():
+    """
+    Returns the number of worker processes to run by default.
+    Python runs one thread at a time per process, so we need processes
+        to use every CPU, and a few more to keep them busy while others
+        wait for the disk, as the gunicorn documentation suggests.
+    """
+    return 2 * get_cpu_count() + 1
+
+def init_worker(app):
+    """
+    Prepares the database of a new worker process.
+    Connections must not be shared with the parent, so the pools forget
+        the ones they inherited, and we open one connection of each pool
+        now, so that the first request does not wait for it.
+    """
+    with app.app_context():
+        for readonly in (False, True):
+            pool = get_pool(readonly=readonly)
+            try:
+                pool.release(pool.acquire())
+            except sqlite3.Error as e:
+                app.logger.warning("Could not open the database: %s", e)
+
+def make_options(app, bind, workers, threads, preload, keepalive, timeout,
+                 graceful_timeout):
+    """
+    Returns the gunicorn settings to serve app with
+    """
+    def post_fork(server, worker):
+        init_worker(app)
+
+    return {
+        "bind": bind,
+        "workers": workers,
+        "threads": threads,
+        # Threads need the gthread worker, the sync worker has only one
+        "worker_class": "gthread" if threads > 1 else "sync",
+        "preload_app": preload,
+        "keepalive": keepalive,
+        "timeout": timeout,
+        "graceful_timeout": graceful_timeout,
+        "post_fork": post_fork,
+    }
+
+def run(app, options):
+    """
+    Serves app with gunicorn and the options until it is stopped
+    """
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise click.ClickException(
+            "flaskr serve needs gunicorn (pip install flaskr[serve])"
+        )
+
+    class Application(BaseApplication):
+        """
+        A gunicorn application serving the app we already made
+        """
+        def load_config(self):
+            for name, value in options.items():
+                self.cfg.set(name, value)
+
+        def load(self):
+            return app
+
+    Application().run()
+
+@click.command("serve")
+@click.option("--bind", "-b", default="127.0.0.1:8000", envvar="FLASKR_BIND",
+              show_default=True, help="Address to listen on.")
+@click.option("--workers", "-w", type=click.IntRange(min=1),
+              default=default_workers, envvar="FLASKR_WORKERS",
+              help="Worker processes, by default 2 per CPU plus 1.")
+@click.option("--threads", type=click.IntRange(min=1), default=4,
+              envvar="FLASKR_THREADS", show_default=True,
+              help="Threads per worker process.")
+@click.option("--preload/--no-preload", default=True, show_default=True,
+              help="Load the app once, before forking the workers.")
+@click.option("--keepalive", type=click.IntRange(min=0), default=5,
+              show_default=True,
+              help="Seconds to keep an idle connection open.")
+@click.option("--timeout", type=click.IntRange(min=0), default=30,
+              show_default=True,
+              help="Seconds a worker may be silent before it is restarted.")
+@click.option("--graceful-timeout", type=click.IntRange(min=0), default=30,
+              show_default=True,
+              help="Seconds workers get to finish their requests on reload.")
+@with_appcontext
+def serve_command(bind, workers, threads, preload, keepalive, timeout,
+                  graceful_timeout):
+    """
+    This function serves the app with several worker processes of
+        gunicorn, each running several threads, for production.
+    The app is made before the workers are forked, so they share its
+        memory and start at once. SIGHUP replaces the workers gracefully,
+        letting them finish their requests, but with --preload they keep
+        the code of the app; run with --no-preload to reload code that way.
+    The function is linked to a newly created flask command serve
+    """
+    app = current_app._get_current_object()
+    run(app, make_options(
+        app, bind, workers, threads, preload, keepalive, timeout,
+        graceful_timeout
+    ))
+
+# The flaskr command, with every flask command of the app, including serve
+cli = FlaskGroup(create_app=create_app, help="The flaskr blog.")
+
+def init_app(app):
+    """
+    We register the serve command
+    """
+    app.cli.add_command(serve_command)
@@ -0,0 +1,376 @@
+import hashlib
+import json
+import mimetypes
+import os
+from collections import defaultdict
+from urllib.parse import unquote
+import click
+from flask import current_app, g, render_template, url_for
+from flask.cli import with_appcontext
+from flaskr import compress
+from flaskr.blog import POST_COLUMNS, PostsPage, get_post
+from flaskr.db import get_read_db
+
+# The name of the file in the output directory that remembers the last
+#   build, to find out what changed since. Bump BUILD_FORMAT whenever
+#   the pages are laid out differently, which rebuilds everything.
+MANIFEST = "manifest.json"
+BUILD_FORMAT = 1
+
+class StaticPostsPage(PostsPage):
+    """
+    One page of posts of the static site.
+    Its newer and older attributes are the numbers of the pages around it,
+        counted from the oldest posts, so that the pages of older posts
+        keep their posts and their urls when new posts are written.
+    """
+    def __init__(self, posts, number, count, base):
+        """
+        Constructor to store the posts, the number of the page
+            and of the pages there are, and the url of the first page
+        """
+        super().__init__(
+            posts,
+            newer=number + 1 if number < count else None,
+            older=number - 1 if number > 1 else None,
+        )
+        self.base = base
+
+    def _url(self, before=None, after=None):
+        return page_url(self.base, before or after)
+
+def page_url(base, number):
+    """
+    Returns the url of a page of posts below the base url
+    """
+    return "{0}page/{1}/".format(base, number)
+
+def url_to_path(url):
+    """
+    Returns the file of the static site served for a url, with
+        nginx try_files $uri $uri/index.html or the like
+    """
+    path = unquote(url).lstrip("/")
+    if not path or path.endswith("/"):
+        return path + "index.html"
+    return path + "/index.html"
+
+def count_pages(count, per_page):
+    """
+    Returns the number of pages of count posts. With no posts,
+        there is still one empty page.
+    """
+    return max(1, -(-count // per_page))
+
+def changed_pages(old_ids, new_ids, updated, per_page):
+    """
+    Returns the numbers of the pages of a list of posts to render again,
+        given the ids of its posts, oldest first, at the last build and now,
+        and the ids of the posts edited since.
+    Every page from the first position where the lists differ onwards has
+        other posts now, which for a new post is only the newest page.
+        When the number of pages changes, the last page of the shorter
+        list gains or loses its link to newer posts as well.
+    """
+    old_count = count_pages(len(old_ids), per_page)
+    new_count = count_pages(len(new_ids), per_page)
+    pages = set()
+
+    first = next((i for i, (old, new) in enumerate(zip(old_ids, new_ids))
+                  if old != new), min(len(old_ids), len(new_ids)))
+    if first < max(len(old_ids), len(new_ids)) or old_count != new_count:
+        start = first // per_page + 1
+        if old_count != new_count:
+            start = min(start, old_count, new_count)
+        pages.update(range(start, new_count + 1))
+
+    for position, id in enumerate(new_ids):
+        if id in updated:
+            pages.add(position // per_page + 1)
+    return pages
+
+def get_fingerprint():
+    """
+    Returns a hash of everything besides the posts that the pages are
+        made of: the templates, the static files and the config.
+        When it changes, every page is rendered again.
+    """
+    digest = hashlib.sha256()
+    digest.update(repr((
+        BUILD_FORMAT,
+        current_app.config["POSTS_PER_PAGE"],
+        current_app.config["STATIC_FINGERPRINTS"],
+    )).encode("utf-8"))
+    for folder in (current_app.template_folder, current_app.static_folder):
+        folder = os.path.join(current_app.root_path, folder)
+        for root, dirs, files in sorted(os.walk(folder)):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith((".gz", ".br")):
+                    continue
+                path = os.path.join(root, name)
+                digest.update(os.path.relpath(path, folder).encode("utf-8"))
+                with open(path, "rb") as f:
+                    digest.update(f.read())
+    return digest.hexdigest()
+
+def load_manifest(output):
+    """
+    Returns the manifest of the last build in output,
+        or an empty one if there was none
+    """
+    try:
+        with open(os.path.join(output, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"fingerprint": None, "posts": {}, "authors": {}, "files": {}}
+
+class SiteBuilder(object):
+    """
+    Writes the pages of one build of the static site to output,
+        keeping count of what it did
+    """
+    def __init__(self, output, files):
+        """
+        Constructor to store the output directory and the fingerprints
+            of the files written by the last build, which are updated
+            as pages are written
+        """
+        self.output = output
+        self.files = files
+        self.rendered = self.written = self.removed = 0
+
+    def write(self, path, data):
+        """
+        Writes data to the file at path below output, unless it already
+            has that data, with precompressed variants if it is text.
+        Files are replaced at once, so they are never served half written.
+        """
+        fingerprint = hashlib.sha256(data).hexdigest()[:12]
+        target = os.path.join(self.output, path)
+        if self.files.get(path) == fingerprint and os.path.exists(target):
+            return
+        variants = [("", data)]
+        if mimetypes.guess_type(path)[0] in compress.COMPRESSIBLE_MIMETYPES:
+            variants += [
+                (suffix, compress.compress(data, encoding, best=True))
+                for encoding, suffix in (("br", ".br"), ("gzip", ".gz"))
+                if encoding in compress.get_encodings()
+            ]
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        for suffix, variant in variants:
+            with open(target + suffix + ".tmp", "wb") as f:
+                f.write(variant)
+            os.replace(target + suffix + ".tmp", target + suffix)
+        self.files[path] = fingerprint
+        self.written += 1
+
+    def render(self, url, template, **context):
+        """
+        Renders a template as the page at url and writes it,
+            as nobody is logged in
+        """
+        with current_app.test_request_context(url):
+            g.user = None
+            html = render_template(template, **context)
+        self.rendered += 1
+        self.write(url_to_path(url), html.encode("utf-8"))
+
+    def render_pages(self, ids, pages, base, template, **context):
+        """
+        Renders the pages of posts of a list of post ids, oldest first,
+            whose numbers are in pages, below the base url.
+            The newest page is the first page as well.
+        """
+        per_page = current_app.config["POSTS_PER_PAGE"]
+        count = count_pages(len(ids), per_page)
+        for number in sorted(pages):
+            page_ids = ids[(number - 1) * per_page:number * per_page]
+            page = StaticPostsPage(get_posts(page_ids[::-1]), number, count, base)
+            self.render(page_url(base, number), template, page=page, **context)
+            if number == count:
+                self.render(base, template, page=page, **context)
+
+    def copy_static(self):
+        """
+        Copies the static files under the names the pages link to them by,
+            which have their fingerprints, and returns their paths
+        """
+        paths = []
+        folder = current_app.static_folder
+        for root, dirs, files in os.walk(folder):
+            for name in files:
+                # Variants of precompress-static are written by write
+                if name.endswith((".gz", ".br")):
+                    continue
+                filename = os.path.relpath(os.path.join(root, name), folder)
+                # Static urls name a file, not a directory
+                with current_app.test_request_context():
+                    url = url_for("static", filename=filename)
+                path = unquote(url).lstrip("/")
+                with open(os.path.join(root, name), "rb") as f:
+                    self.write(path, f.read())
+                paths.append(path)
+        return paths
+
+    def remove(self, paths):
+        """
+        Removes the files of pages that no longer exist
+        """
+        for path in paths:
+            for suffix in ("", ".gz", ".br"):
+                try:
+                    os.remove(os.path.join(self.output, path + suffix))
+                except FileNotFoundError:
+                    pass
+            self.files.pop(path, None)
+            self.removed += 1
+
+def get_posts(ids):
+    """
+    Retrieves the posts with the ids for a page of posts, in that order
+    """
+    if not ids:
+        return []
+    posts = get_read_db().execute(
+        "SELECT " + POST_COLUMNS + " FROM post p JOIN user u"
+        " ON p.author_id = u.id WHERE p.id IN (" + ", ".join("?" * len(ids)) + ")",
+        ids
+    ).fetchall()
+    posts = {post["id"]: post for post in posts}
+    return [posts[id] for id in ids]
+
+def build_site(output, full=False):
+    """
+    Renders the index, author and post pages to static HTML files in
+        output, and returns the SiteBuilder that did it.
+    Only the pages affected by the posts written, changed or deleted
+        since the last build are rendered again, found by comparing the
+        version of every post with the manifest of the last build, unless
+        full is set or the templates, static files or config changed.
+    """
+    per_page = current_app.config["POSTS_PER_PAGE"]
+    manifest = load_manifest(output)
+    fingerprint = get_fingerprint()
+    if full or manifest["fingerprint"] != fingerprint:
+        manifest = dict(manifest, posts={}, authors={})
+    builder = SiteBuilder(output, dict(manifest["files"]))
+
+    # The posts of the last build and now, oldest first,
+    #   as {id: [version, author_id]}, using the post_created_id index
+    db = get_read_db()
+    old_posts = {int(id): post for id, post in manifest["posts"].items()}
+    old_order = [int(id) for id in manifest.get("order", [])] if old_posts else []
+    posts = {}
+    for row in db.execute(
+        "SELECT id, version, author_id FROM post ORDER BY created, id"
+    ):
+        posts[row["id"]] = [row["version"], row["author_id"]]
+    order = list(posts)
+    updated = {id for id, post in posts.items()
+               if id in old_posts and old_posts[id] != post}
+
+    # A post is only rendered again when it is new or has been edited
+    for id in order:
+        if id not in old_posts or id in updated:
+            builder.render(
+                url_for_post(id), "blog/post.html",
+                post=get_post(id, check_author=False)
+            )
+
+    # The index, from its newest page
+    builder.render_pages(
+        order, changed_pages(old_order, order, updated, per_page),
+        "/", "blog/index.html"
+    )
+
+    # Every author has their own pages, with their number of posts on top,
+    #   so all of them change when the number does
+    ids, old_ids = defaultdict(list), defaultdict(list)
+    for id in order:
+        ids[posts[id][1]].append(id)
+    for id in old_order:
+        old_ids[old_posts[id][1]].append(id)
+    authors = {}
+    for author in db.execute("SELECT id, username, post_count FROM user"):
+        id = author["id"]
+        authors[id] = [author["username"], author["post_count"]]
+        if manifest["authors"].get(str(id)) != authors[id]:
+            pages = range(1, count_pages(len(ids[id]), per_page) + 1)
+        else:
+            pages = changed_pages(old_ids[id], ids[id], updated, per_page)
+        builder.render_pages(
+            ids[id], pages, url_for_author(author["username"]),
+            "blog/author.html", author=author
+        )
+
+    # Files of deleted posts and pages, and of older static files,
+    #   are removed
+    paths = set(builder.copy_static()) | set(
+        get_paths(order, authors.values(), per_page)
+    )
+    builder.remove(set(builder.files) - paths)
+    with open(os.path.join(output, MANIFEST), "w") as f:
+        json.dump({
+            "fingerprint": fingerprint,
+            "order": order,
+            "posts": posts,
+            "authors": authors,
+            "files": builder.files,
+        }, f, separators=(",", ":"))
+    return builder
+
+def url_for_post(id):
+    """
+    Returns the url of the page of a post, as the templates link to it
+    """
+    with current_app.test_request_context():
+        return url_for("blog.detail", id=id)
+
+def url_for_author(username):
+    """
+    Returns the url below which the pages of an author are
+    """
+    with current_app.test_request_context():
+        return url_for("blog.author", username=username) + "/"
+
+def get_paths(order, authors, per_page):
+    """
+    Returns the paths of every page the site is made of, given the post ids
+        and the [username, post_count] of every author
+    """
+    paths = [url_to_path(url_for_post(id)) for id in order]
+    lists = [("/", len(order))] + [
+        (url_for_author(username), count) for username, count in authors
+    ]
+    for base, count in lists:
+        paths.append(url_to_path(base))
+        for number in range(1, count_pages(count, per_page) + 1):
+            paths.append(url_to_path(page_url(base, number)))
+    return paths
+
+@click.command("build-static")
+@click.argument("output", type=click.Path(file_okay=False), required=False)
+@click.option("--full", is_flag=True,
+              help="Render every page, not only the changed ones.")
+@with_appcontext
+def build_static_command(output, full):
+    """
+    This function renders the blog to static HTML files in OUTPUT,
+        by default the site directory of the instance folder, using
+        build_site, so that a web server can serve them without Python.
+    The function is linked to a newly created flask command build-static
+    """
+    output = output or os.path.join(current_app.instance_path, "site")
+    builder = build_site(output, full)
+    click.echo(
+        "Rendered {0} pages, wrote {1} files, removed {2} to {3}".format(
+            builder.rendered, builder.written, builder.removed, output
+        )
+    )
+
+def init_app(app):
+    """
+    We register the build-static command
+    """
+    app.cli.add_command(build_static_command)
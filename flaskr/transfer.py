@@ -0,0 +1,185 @@
+import csv
+import json
+import time
+from datetime import datetime, timezone
+import click
+from flask.cli import with_appcontext
+from flaskr.blog import make_excerpt
+from flaskr.db import TIMESTAMP_FORMAT, get_db, get_read_db
+
+# The fields of an exported post, in the order of the CSV columns.
+#   Authors are exported by username, since ids differ between databases.
+FIELDS = ("title", "body", "author", "created", "updated")
+
+def export_posts(f, format="jsonl"):
+    """
+    Writes every post to the file f as JSON Lines or CSV, oldest first,
+        and returns the number of posts written.
+    Rows are read from the cursor one at a time and written straight away,
+        so memory use does not grow with the number of posts.
+    """
+    cursor = get_read_db().execute(
+        "SELECT title, body, username AS author, created, updated"
+        " FROM post p JOIN user u ON p.author_id = u.id"
+        " ORDER BY created, p.id"
+    )
+
+    if format == "csv":
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(FIELDS)
+        write = lambda post: writer.writerow(post[field] for field in FIELDS)
+    else:
+        write = lambda post: f.write(json.dumps(
+            {field: post[field] for field in FIELDS}, default=str
+        ) + "\n")
+
+    count = 0
+    for post in cursor:
+        write(post)
+        count += 1
+    return count
+
+def read_posts(f, format="jsonl"):
+    """
+    Yields the posts of a file written by export_posts, one dict at a time
+    """
+    if format == "csv":
+        yield from csv.DictReader(f)
+    else:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def parse_timestamp(value):
+    """
+    Turns an ISO 8601 time or date from an imported file into the form
+        sqlite stores TIMESTAMP columns in, in UTC, which is the only form
+        they can be read back in. Times without a timezone are taken to be
+        UTC already, like the ones export_posts writes.
+    Returns None for a missing time, and raises ValueError for one that
+        is not a time.
+    """
+    if value is None or value == "":
+        return None
+    if not isinstance(value, str):
+        raise ValueError("Invalid time {0!r}".format(value))
+    value = datetime.fromisoformat(value.strip())
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.strftime(TIMESTAMP_FORMAT)
+
+def import_posts(posts, batch_size=1000):
+    """
+    Inserts the posts of an iterable of dicts, like read_posts yields,
+        and returns the numbers of posts imported, skipped for their
+        unknown authors and skipped for their invalid times.
+    Authors are looked up by username, and posts of unknown authors
+        are skipped. Posts are inserted with executemany in batches of
+        batch_size rows, each batch in its own transaction, so only one
+        batch is ever held in memory and a commit costs one fsync per batch.
+    A missing created or updated time is set to the time of the import,
+        and the others are stored as parse_timestamp reads them.
+    """
+    db = get_db()
+    # Imports have far fewer authors than posts, so we remember them all
+    authors = {}
+    imported = skipped = invalid = 0
+    batch = []
+
+    def insert(batch):
+        db.executemany(
+            "INSERT INTO post"
+            " (title, body, excerpt, truncated, author_id, created, updated)"
+            " VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP),"
+            " COALESCE(?, CURRENT_TIMESTAMP))",
+            batch
+        )
+        db.commit()
+
+    for post in posts:
+        username = post["author"]
+        if username not in authors:
+            row = db.execute(
+                "SELECT id FROM user WHERE username = ?", (username, )
+            ).fetchone()
+            authors[username] = row["id"] if row is not None else None
+        if authors[username] is None:
+            skipped += 1
+            continue
+
+        # Empty CSV cells mean the time is missing
+        try:
+            created = parse_timestamp(post.get("created"))
+            updated = parse_timestamp(post.get("updated"))
+        except ValueError:
+            invalid += 1
+            continue
+        excerpt = make_excerpt(post["body"])
+        batch.append((
+            post["title"], post["body"], excerpt, excerpt != post["body"],
+            authors[username], created, updated,
+        ))
+        if len(batch) >= batch_size:
+            insert(batch)
+            imported += len(batch)
+            batch = []
+
+    if batch:
+        insert(batch)
+        imported += len(batch)
+    return imported, skipped, invalid
+
+def format_rate(count, seconds):
+    """
+    Formats how many rows were moved in how many seconds
+    """
+    return "{0} posts in {1:.2f}s ({2:.0f} posts/s)".format(
+        count, seconds, count / seconds if seconds else 0
+    )
+
+@click.command("export-posts")
+@click.argument("file", type=click.File("w", encoding="utf-8", lazy=False),
+                default="-")
+@click.option("--format", type=click.Choice(("jsonl", "csv")),
+              default="jsonl", help="JSON Lines (the default) or CSV.")
+@with_appcontext
+def export_posts_command(file, format):
+    """
+    This function writes every post to FILE, or to the standard output,
+        using export_posts and prints how fast it went to the standard error.
+    The function is linked to a newly created flask command export-posts
+    """
+    start = time.perf_counter()
+    count = export_posts(file, format)
+    click.echo("Exported " + format_rate(count, time.perf_counter() - start),
+               err=True)
+
+@click.command("import-posts")
+@click.argument("file", type=click.File("r", encoding="utf-8"), default="-")
+@click.option("--format", type=click.Choice(("jsonl", "csv")),
+              default="jsonl", help="JSON Lines (the default) or CSV.")
+@click.option("--batch-size", type=click.IntRange(min=1), default=1000,
+              help="Posts inserted per transaction.")
+@with_appcontext
+def import_posts_command(file, format, batch_size):
+    """
+    This function adds the posts of FILE, or of the standard input,
+        to the database using import_posts and prints how fast it went.
+    The function is linked to a newly created flask command import-posts
+    """
+    start = time.perf_counter()
+    imported, skipped, invalid = import_posts(
+        read_posts(file, format), batch_size
+    )
+    click.echo("Imported " + format_rate(imported, time.perf_counter() - start))
+    if skipped:
+        click.echo("Skipped {0} posts of unknown authors".format(skipped))
+    if invalid:
+        click.echo("Skipped {0} posts with invalid times".format(invalid))
+
+def init_app(app):
+    """
+    We register the export-posts and import-posts commands
+    """
+    app.cli.add_command(export_posts_command)
+    app.cli.add_command(import_posts_command)
@@ -0,0 +1,244 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from flask import current_app
+from flaskr.db import get_db, get_pool
+from flaskr.metrics import add_request_time, get_metrics
+
+# Guards the creation of the write queues of every app
+_queue_lock = threading.Lock()
+
+class WriteQueue(object):
+    """
+    A queue of writes, committed in groups by one writer thread.
+    Every commit waits for the disk, and only one connection can write
+        at a time, so when many requests write at once they mostly wait
+        for each other. Instead, requests hand their writes to this queue
+        and the writer runs as many of them as are waiting, up to
+        max_batch, in one transaction with one commit. It waits at most
+        max_latency seconds after the first write for others to join.
+    Every write runs in its own savepoint, so a failing write is undone
+        and reported to its caller alone, while the others still commit.
+    A write is only reported as done once its commit is on disk: the
+        writer connection commits with synchronous=FULL, which syncs the
+        WAL at every commit rather than at checkpoints. That sync is what
+        batching saves, since it is paid once for the whole batch.
+    If the writer thread fails, for example because the database cannot
+        be opened, every queued and later write fails with its error
+        instead of waiting forever, and get_write_queue makes a new queue.
+    """
+    def __init__(self, connect, max_batch, max_latency, metrics=None):
+        """
+        Constructor to store the function opening the writer connection,
+            the limits of a batch and the metrics to report to, if any,
+            and to start the writer thread
+        """
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self._connect = connect
+        self._metrics = metrics
+        self._queue = queue.Queue()
+        # The error the writer thread died of, after which nothing is queued
+        self.error = None
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._run, name="flaskr-writer", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, operation):
+        """
+        Queues operation, a function called with the writer connection,
+            and returns a Future of its result, set once it is committed
+        """
+        future = Future()
+        with self._lock:
+            if self.error is not None:
+                future.set_exception(self.error)
+            else:
+                self._queue.put((operation, future, time.perf_counter()))
+        return future
+
+    def stop(self):
+        """
+        Commits the writes already queued and stops the writer thread
+        """
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        """
+        The writer thread, failing every write left if it cannot go on
+        """
+        try:
+            self._loop()
+        except BaseException as e:
+            with self._lock:
+                self.error = e
+            # Nothing can be queued any more, so this empties the queue
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    item[1].set_exception(e)
+
+    def _loop(self):
+        """
+        The loop of the writer thread, taking batches of writes off the queue
+        """
+        db = self._connect()
+        try:
+            # We begin and commit the transactions ourselves,
+            #   and each commit is synced to disk before it is reported
+            db.isolation_level = None
+            db.execute("PRAGMA synchronous = FULL")
+            stopping = False
+            while not stopping:
+                item = self._queue.get()
+                if item is None:
+                    break
+                batch = [item]
+                deadline = time.perf_counter() + self.max_latency
+                while len(batch) < self.max_batch:
+                    remaining = deadline - time.perf_counter()
+                    try:
+                        if remaining > 0:
+                            item = self._queue.get(timeout=remaining)
+                        else:
+                            item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stopping = True
+                        break
+                    batch.append(item)
+                try:
+                    self._commit(db, batch)
+                except BaseException as e:
+                    # Writes of the batch still waiting share the error
+                    for operation, future, queued in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    raise
+        finally:
+            db.close()
+
+    def _commit(self, db, batch):
+        """
+        Runs a batch of writes in one transaction, and gives every caller
+            its result, or its error, once the transaction has committed
+        """
+        start = time.perf_counter()
+        results = []
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            for operation, future, queued in batch:
+                db.execute("SAVEPOINT operation")
+                try:
+                    results.append((future, operation(db), None))
+                except Exception as e:
+                    db.execute("ROLLBACK TO operation")
+                    results.append((future, None, e))
+                db.execute("RELEASE operation")
+            db.execute("COMMIT")
+        except Exception as e:
+            # Nothing of the batch was committed, so every write failed.
+            #   If even the rollback fails, the connection is broken
+            #   and the writer thread stops.
+            results = [(future, None, e) for operation, future, queued in batch]
+            if db.in_transaction:
+                try:
+                    db.execute("ROLLBACK")
+                except Exception:
+                    self._resolve(results)
+                    raise
+
+        done = time.perf_counter()
+        self._resolve(results)
+
+        if self._metrics is not None:
+            failed = sum(1 for future, result, error in results if error)
+            self._metrics.inc("flaskr_write_queue_batches_total", ())
+            self._metrics.inc(
+                "flaskr_write_queue_writes_total", (), len(batch) - failed
+            )
+            if failed:
+                self._metrics.inc("flaskr_write_queue_errors_total", (), failed)
+            self._metrics.observe(
+                "flaskr_write_queue_commit_seconds", (), done - start
+            )
+            self._metrics.observe(
+                "flaskr_write_queue_wait_seconds", (),
+                sum(done - queued for operation, future, queued in batch),
+                len(batch)
+            )
+
+    def _resolve(self, results):
+        """
+        Gives every caller of a batch its result or its error
+        """
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+def get_write_queue():
+    """
+    Returns the write queue of the application, made the first time
+        it is needed with the WRITE_QUEUE_BATCH_SIZE and
+        WRITE_QUEUE_MAX_LATENCY config.
+    Threads do not survive a fork, so a forked child makes its own,
+        and a queue whose writer thread failed is replaced by a new one.
+    """
+    extensions = current_app.extensions
+    with _queue_lock:
+        pid, write_queue = extensions.get("flaskr.write_queue", (None, None))
+        if (write_queue is None or pid != os.getpid()
+                or write_queue.error is not None):
+            write_queue = WriteQueue(
+                get_pool().connect,
+                current_app.config["WRITE_QUEUE_BATCH_SIZE"],
+                current_app.config["WRITE_QUEUE_MAX_LATENCY"],
+                get_metrics(),
+            )
+            extensions["flaskr.write_queue"] = (os.getpid(), write_queue)
+        return write_queue
+
+def stop_write_queue(app):
+    """
+    Stops the write queue of the application, if it has one,
+        after committing the writes already queued
+    """
+    pid, write_queue = app.extensions.pop("flaskr.write_queue", (None, None))
+    if write_queue is not None and pid == os.getpid():
+        write_queue.stop()
+
+def write(operation):
+    """
+    Runs operation, a function called with a connection that writes,
+        commits it and returns its result.
+    With WRITE_QUEUE, the operation is run by the writer thread together
+        with the writes of other requests, and this waits until they are
+        committed, so the caller may redirect as soon as it returns.
+        It waits at most WRITE_QUEUE_TIMEOUT seconds and then raises
+        TimeoutError, though the write may still be committed later.
+    Otherwise it is run and committed on the connection of get_db.
+    """
+    if not current_app.config["WRITE_QUEUE"]:
+        db = get_db()
+        result = operation(db)
+        db.commit()
+        return result
+
+    start = time.perf_counter()
+    try:
+        return get_write_queue().submit(operation).result(
+            timeout=current_app.config["WRITE_QUEUE_TIMEOUT"]
+        )
+    finally:
+        add_request_time("db", time.perf_counter() - start)
@@ -9,4 +9,18 @@ setup(
     install_requires=[
         "flask",
     ],
+    extras_require={
+        # Needed by the async views of ASYNC_VIEWS
+        "async": ["flask[async]"],
+        # Lets API responses be compressed with brotli as well as gzip
+        "brotli": ["brotli"],
+        # Needed by flaskr serve
+        "serve": ["gunicorn"],
+    },
+    entry_points={
+        "console_scripts": [
+            # flaskr serve, flaskr init-db and every other flask command
+            "flaskr = flaskr.serve:cli",
+        ],
+    },
 )
@@ -3,17 +3,18 @@ import tempfile
 
 import pytest
 from flaskr import create_app
-from flaskr.db import get_db, init_db
+from flaskr.db import dispose_pool, get_db, init_db
 
 # Open SQL code from data.sql, read it and parse it
 with open(os.path.join(os.path.dirname(__file__), 'data.sql'), 'rb') as f:
     _data_sql = f.read().decode('utf8')
 
 @pytest.fixture
-def app():
+def app(request):
     """
     This function is a pytest fixture, meaning that it can be used as an object in pytest function.
     This function returns the flask app with testing configurations and a temporary fake database
+    Tests can add to the configuration by parametrizing app indirectly with a dict.
     """
     # We make a temporary file for the database instance
     db_fd, db_path = tempfile.mkstemp()
@@ -21,10 +22,10 @@ def app():
     # We use the application factory to create the flask app and 
     #   give it a new database path and set TESTING mode to true
     #   which disables error catching.
-    app = create_app({
+    app = create_app(dict({
         'TESTING': True,
         'DATABASE': db_path,
-    })
+    }, **getattr(request, "param", {})))
     
     # I don't really understand this part yet,
     #   I just will say this is how to initialize the fake db
@@ -35,6 +36,9 @@ def app():
 
     yield app
     
+    # Pooled connections stay open after the tests, so we close them
+    #   before removing the database file
+    dispose_pool(app)
     os.close(db_fd)
     os.unlink(db_path)
 
@@ -0,0 +1,244 @@
+import gzip
+
+import pytest
+from flaskr import compress
+from flaskr.db import get_db
+
+def test_posts(client):
+    """
+    Checks that /api/v1/posts returns the page of posts as JSON,
+        with the default fields and no other pages
+    """
+    response = client.get("/api/v1/posts")
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["posts"] == [{
+        "id": 1,
+        "title": "test title",
+        "excerpt": "test\nbody",
+        "author": "test",
+        "created": "2018-01-01T00:00:00Z",
+        "updated": data["posts"][0]["updated"],
+    }]
+    assert data["newer"] is None and data["older"] is None
+    assert data["links"] == {"newer": None, "older": None}
+
+def test_posts_fields(client):
+    """
+    Checks that ?fields= only returns the fields asked for,
+        and that unknown fields are refused
+    """
+    data = client.get("/api/v1/posts?fields=id,title,id").get_json()
+    assert data["posts"] == [{"id": 1, "title": "test title"}]
+
+    data = client.get("/api/v1/posts/1?fields=body").get_json()
+    assert data == {"body": "test\nbody"}
+
+    response = client.get("/api/v1/posts?fields=id,password")
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Unknown fields: password."}
+
+def test_posts_pagination(app, client):
+    """
+    Checks that the newer and older links walk through every post
+        exactly once, keeping the fields and the author
+    """
+    app.config["POSTS_PER_PAGE"] = 2
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            "INSERT INTO post (title, body, author_id, created)"
+            " VALUES (?, '', 1, '2018-01-02 00:00:00')",
+            [("post {0}".format(i), ) for i in range(4)]
+        )
+        db.commit()
+
+    url, titles = "/api/v1/posts?fields=title&author=test", []
+    while url:
+        data = client.get(url).get_json()
+        titles.extend(post["title"] for post in data["posts"])
+        url = data["links"]["older"]
+    assert titles == ["post 3", "post 2", "post 1", "post 0", "test title"]
+
+    # The last page leads back to the one before it
+    data = client.get(
+        "/api/v1/posts?fields=title&after=" + data["newer"]
+    ).get_json()
+    assert [post["title"] for post in data["posts"]] == ["post 1", "post 0"]
+
+def test_posts_ids(app, client):
+    """
+    Checks that ?ids= returns the posts in the order asked for,
+        reading them in one query and leaving out missing posts
+    """
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            "INSERT INTO post (title, body, author_id) VALUES (?, '', 2)",
+            [("post {0}".format(i), ) for i in range(2)]
+        )
+        db.commit()
+
+    statements = []
+    with app.app_context():
+        get_db().set_trace_callback(statements.append)
+        data = client.get("/api/v1/posts?ids=3,1,99,3&fields=id").get_json()
+        get_db().set_trace_callback(None)
+    assert data == {"posts": [{"id": 3}, {"id": 1}]}
+    assert len([s for s in statements if "FROM post p" in s]) == 1
+
+@pytest.mark.parametrize("ids", (
+    "1,x", ",".join(map(str, range(101))), "99999999999999999999999", "-1",
+))
+def test_posts_invalid_ids(client, ids):
+    """
+    Checks that ids that are not numbers sqlite can hold,
+        or too many of them, are refused with a JSON error
+    """
+    response = client.get("/api/v1/posts?ids=" + ids)
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+def test_post_id_out_of_range(client):
+    """
+    Checks that post ids beyond what sqlite can hold are not found
+        rather than failing, in the API and on the blog
+    """
+    id = "99999999999999999999999"
+    assert client.get("/api/v1/posts/" + id).status_code == 404
+    assert client.get("/" + id).status_code == 404
+
+def test_post(client):
+    """
+    Checks that one post is returned with its body,
+        and that a missing post is a 404 error as JSON
+    """
+    data = client.get("/api/v1/posts/1").get_json()
+    assert data["body"] == "test\nbody"
+    assert data["version"] == 0
+
+    response = client.get("/api/v1/posts/2")
+    assert response.status_code == 404
+    assert response.get_json() == {"error": "Post id 2 doesn't exist."}
+
+def test_user(client):
+    """
+    Checks that a user is returned with their number of posts,
+        and that a missing user or their posts are a 404 error
+    """
+    data = client.get("/api/v1/users/test").get_json()
+    assert data == {"id": 1, "username": "test", "post_count": 1}
+    assert client.get("/api/v1/users/nobody").status_code == 404
+    assert client.get("/api/v1/posts?author=nobody").status_code == 404
+
+def test_conditional_get(client):
+    """
+    Checks that the API answers 304 while the posts have not changed
+    """
+    response = client.get("/api/v1/posts")
+    etag = response.headers["ETag"]
+    response = client.get("/api/v1/posts", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+@pytest.mark.parametrize(("method", "path"), (
+    ("POST", "/api/v1/posts"),
+    ("PATCH", "/api/v1/posts/1"),
+    ("DELETE", "/api/v1/posts/1"),
+))
+def test_login_required(client, method, path):
+    """
+    Checks that writes answer 401 instead of redirecting to the login page
+    """
+    response = client.open(path, method=method, json={"title": "x"})
+    assert response.status_code == 401
+    assert "error" in response.get_json()
+
+def test_author_required(client, auth):
+    """
+    Checks that only the author of a post may change or delete it
+    """
+    auth.login("other", "other")
+    assert client.patch("/api/v1/posts/1", json={"title": "x"}).status_code == 403
+    assert client.delete("/api/v1/posts/1").status_code == 403
+    assert client.delete("/api/v1/posts/2").status_code == 404
+
+def test_create_update_delete(client, auth, app):
+    """
+    Checks that a post is created, changed and deleted through the API
+    """
+    auth.login()
+    response = client.post("/api/v1/posts", json={"title": "new", "body": "x"})
+    assert response.status_code == 201
+    assert response.headers["Location"].endswith("/api/v1/posts/2")
+    assert response.get_json()["author"] == "test"
+
+    # Fields left out keep their value
+    response = client.patch("/api/v1/posts/2", json={"body": "changed"})
+    assert response.get_json()["title"] == "new"
+    assert response.get_json()["body"] == "changed"
+    assert response.get_json()["version"] == 1
+
+    assert client.delete("/api/v1/posts/2").status_code == 204
+    with app.app_context():
+        count = get_db().execute("SELECT COUNT(id) FROM post").fetchone()[0]
+        assert count == 1
+
+def test_update_conflict(client, auth):
+    """
+    Checks that a change with an outdated version answers 409 error
+    """
+    auth.login()
+    response = client.patch(
+        "/api/v1/posts/1", json={"title": "a", "body": "", "version": 0}
+    )
+    assert response.get_json()["version"] == 1
+
+    response = client.patch("/api/v1/posts/1", json={"title": "b", "version": 0})
+    assert response.status_code == 409
+    assert client.get("/api/v1/posts/1").get_json()["title"] == "a"
+    response = client.patch("/api/v1/posts/1", json={"version": "1"})
+    assert response.status_code == 400
+
+@pytest.mark.parametrize("data", ({}, {"title": ""}, {"title": 1}, [1]))
+def test_create_validate(client, auth, data):
+    """
+    Checks that posts without a title, or not a JSON object, are refused
+    """
+    auth.login()
+    response = client.post("/api/v1/posts", json=data)
+    assert response.status_code == 400
+
+def test_compression(app, client):
+    """
+    Checks that responses of at least COMPRESS_MIN_SIZE bytes are
+        gzipped for clients that accept it, and smaller ones are not
+    """
+    app.config["COMPRESS_MIN_SIZE"] = 10 ** 6
+    response = client.get("/api/v1/posts", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+    assert "Accept-Encoding" in response.headers["Vary"]
+
+    app.config["COMPRESS_MIN_SIZE"] = 0
+    response = client.get("/api/v1/posts", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert b"test title" in gzip.decompress(response.data)
+
+    response = client.get("/api/v1/posts")
+    assert "Content-Encoding" not in response.headers
+
+def test_brotli(app, client, monkeypatch):
+    """
+    Checks that brotli is preferred when it is installed,
+        and that gzip is used without it
+    """
+    app.config["COMPRESS_MIN_SIZE"] = 0
+    headers = {"Accept-Encoding": "gzip, br"}
+    monkeypatch.setattr(compress, "brotli", None)
+    response = client.get("/api/v1/posts", headers=headers)
+    assert response.headers["Content-Encoding"] == "gzip"
+
+    brotli = pytest.importorskip("brotli")
+    monkeypatch.setattr(compress, "brotli", brotli)
+    response = client.get("/api/v1/posts", headers=headers)
+    assert response.headers["Content-Encoding"] == "br"
+    assert b"test title" in brotli.decompress(response.data)
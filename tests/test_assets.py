@@ -0,0 +1,109 @@
+import gzip
+import os
+import shutil
+
+import pytest
+from flask import url_for
+from flaskr.assets import get_fingerprint
+
+def static_url(app, filename="style.css"):
+    """
+    Returns the url of a static file, as the templates link to it
+    """
+    with app.test_request_context():
+        return url_for("static", filename=filename)
+
+def test_fingerprinted_url(app, client):
+    """
+    Checks that pages link to the fingerprinted static file,
+        which is sent with its contents and may be kept forever
+    """
+    url = static_url(app)
+    with app.app_context():
+        fingerprint = get_fingerprint("style.css")
+    assert url == "/static/style.{0}.css".format(fingerprint)
+    assert url.encode() in client.get("/").data
+
+    response = client.get(url)
+    assert response.status_code == 200
+    with open(os.path.join(app.static_folder, "style.css"), "rb") as f:
+        assert response.data == f.read()
+    assert response.cache_control.immutable
+    assert response.cache_control.max_age == 365 * 24 * 60 * 60
+
+def test_unfingerprinted_url(app, client):
+    """
+    Checks that plain and outdated static urls still get the file,
+        but without letting browsers keep it forever
+    """
+    for url in ("/static/style.css", "/static/style.0123456789ab.css"):
+        response = client.get(url)
+        assert response.status_code == 200
+        assert not response.cache_control.immutable
+    assert client.get("/static/nothing.0123456789ab.css").status_code == 404
+
+@pytest.mark.parametrize("app", [{"STATIC_FINGERPRINTS": False}], indirect=True)
+def test_fingerprints_off(app):
+    """
+    Checks that STATIC_FINGERPRINTS turns the fingerprints off
+    """
+    assert static_url(app) == "/static/style.css"
+
+def test_fingerprint_changes(app, tmp_path):
+    """
+    Checks that the fingerprint follows the contents of the file
+    """
+    shutil.copy(os.path.join(app.static_folder, "style.css"), str(tmp_path))
+    app.static_folder = str(tmp_path)
+    before = static_url(app)
+    with open(str(tmp_path / "style.css"), "a") as f:
+        f.write("body { color: red; }\n")
+    assert static_url(app) != before
+
+def test_precompress_static(app, client, runner, tmp_path):
+    """
+    Checks that precompress-static writes compressed variants once,
+        and that they are sent to the clients that accept them
+    """
+    shutil.copy(os.path.join(app.static_folder, "style.css"), str(tmp_path))
+    app.static_folder = str(tmp_path)
+
+    result = runner.invoke(args=["precompress-static"])
+    assert "Compressed" in result.output and "0 up to date" in result.output
+    result = runner.invoke(args=["precompress-static"])
+    assert "Compressed 0 static files" in result.output
+
+    with open(str(tmp_path / "style.css"), "rb") as f:
+        data = f.read()
+    url = static_url(app)
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.mimetype == "text/css"
+    assert response.cache_control.immutable
+    assert gzip.decompress(response.data) == data
+
+    response = client.get(url)
+    assert "Content-Encoding" not in response.headers
+    assert response.data == data
+
+def test_html_compression(app, client):
+    """
+    Checks that pages of at least COMPRESS_MIN_SIZE bytes are compressed,
+        but not streamed ones, which are sent while they are rendered
+    """
+    app.config["COMPRESS_MIN_SIZE"] = 0
+    headers = {"Accept-Encoding": "gzip"}
+    response = client.get("/", headers=headers)
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert b"test title" in gzip.decompress(response.data)
+    # Pages are cached uncompressed, and compressed for every client
+    response = client.get("/")
+    assert b"test title" in response.data
+
+    app.config["STREAM_PAGES"] = True
+    response = client.get("/u/test", headers=headers)
+    assert response.status_code == 200
+    assert "Content-Encoding" not in response.headers
+
+    app.config["COMPRESS_MIN_SIZE"] = None
+    assert "Content-Encoding" not in client.get("/", headers=headers).headers
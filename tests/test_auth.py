@@ -1,5 +1,6 @@
 import pytest
 from flask import g, session
+from flaskr.auth import invalidate_user
 from flaskr.db import get_db
 
 def test_register(client, app):
@@ -75,3 +76,99 @@ def test_logout(client, auth):
         assert "user_id" not in session
 
 
+
+def test_user_loaded_lazily(client, auth):
+    """
+    Checks that a request that never reads g.user
+        does not open a database connection for it
+    """
+    auth.login()
+
+    with client:
+        client.get("/hello")
+        assert "db" not in g
+        assert g.user["username"] == "test"
+
+def test_user_cache(app, client, auth):
+    """
+    Checks that the logged in user is read from the cache
+        until it is invalidated
+    """
+    auth.login()
+    client.get("/")
+
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE user SET username = 'renamed' WHERE id = 1")
+        db.commit()
+
+    with client:
+        client.get("/hello")
+        assert g.user["username"] == "test"
+
+    with app.app_context():
+        invalidate_user(1)
+
+    with client:
+        client.get("/hello")
+        assert g.user["username"] == "renamed"
+
+@pytest.mark.parametrize("workers", (0, 1))
+def test_rehash_on_login(app, auth, workers):
+    """
+    Checks that a password hashed with another method than
+        PASSWORD_HASH_METHOD is hashed again when the user logs in,
+        both in the request and in the process pool
+    """
+    app.config["PASSWORD_HASH_WORKERS"] = workers
+    app.config["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:1000"
+    auth.login()
+
+    with app.app_context():
+        password = get_db().execute(
+            "SELECT password FROM user WHERE id = 1"
+        ).fetchone()[0]
+        assert password.startswith("pbkdf2:sha256:1000$")
+
+    auth.logout()
+    assert auth.login().headers["Location"] == "http://localhost/"
+
+@pytest.mark.parametrize("path", ("/auth/login", "/auth/register"))
+def test_rate_limit(app, client, path):
+    """
+    Checks that an address gets 429 after LOGIN_RATE_LIMIT attempts
+        to log in or register, whatever the username
+    """
+    app.config["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:1000"
+    app.extensions["flaskr.login_limiter"].limit = 3
+
+    for i in range(3):
+        response = client.post(
+            path, data={"username": "a{0}".format(i), "password": "test"}
+        )
+        assert response.status_code != 429
+
+    response = client.post(path, data={"username": "b", "password": "test"})
+    assert response.status_code == 429
+    assert b"Too many attempts" in response.data
+
+@pytest.mark.parametrize("app", [{"TRUSTED_PROXIES": 1}], indirect=True)
+def test_rate_limit_behind_proxy(app, client):
+    """
+    Checks that behind a trusted proxy, the rate limit counts the address
+        of every client the proxy forwards separately
+    """
+    app.config["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:1000"
+    app.extensions["flaskr.login_limiter"].limit = 1
+
+    for i in range(3):
+        response = client.post(
+            "/auth/login", data={"username": "a{0}".format(i), "password": "x"},
+            headers={"X-Forwarded-For": "10.0.0.{0}".format(i)}
+        )
+        assert response.status_code != 429
+    response = client.post(
+        "/auth/login", data={"username": "b", "password": "x"},
+        headers={"X-Forwarded-For": "10.0.0.0"}
+    )
+    assert response.status_code == 429
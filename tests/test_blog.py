@@ -1,5 +1,10 @@
+import base64
+import xml.etree.ElementTree as ElementTree
+
 import pytest
-from flaskr.db import get_db
+from flaskr import blog
+from flaskr.blog import FEED_QUERY, make_excerpt
+from flaskr.db import get_db, get_pool
 
 def test_index(client, auth):
     """
@@ -82,6 +87,63 @@ def test_update(client, auth, app):
         post = db.execute("SELECT * FROM post WHERE id = 1").fetchone()
         assert post["title"] == "updated"
 
+def test_update_conflict(client, auth, app):
+    """
+    Check that saving a post that was changed since the form was served
+        does not undo that change, but shows the form again with the
+        new version, and that saving that form does replace it
+    """
+    auth.login()
+    assert b'name="version" value="0"' in client.get("/1/update").data
+
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE post SET title = 'meanwhile', version = 1")
+        db.commit()
+
+    response = client.post(
+        "/1/update", data={"title": "mine", "body": "", "version": "0"}
+    )
+    assert response.status_code == 409
+    assert b"changed while you were editing" in response.data
+    assert b'name="version" value="1"' in response.data
+    assert b'value="mine"' in response.data
+    with app.app_context():
+        title = get_db().execute("SELECT title FROM post").fetchone()[0]
+        assert title == "meanwhile"
+
+    response = client.post(
+        "/1/update", data={"title": "mine", "body": "", "version": "1"}
+    )
+    assert response.status_code == 302
+
+@pytest.mark.parametrize("path", ("/1/update", "/1/delete"))
+def test_mutation_is_one_statement(client, auth, app, path):
+    """
+    Check that a successful update or delete does not read the post first,
+        but checks its author in the write itself
+    """
+    auth.login()
+    # The idle connections of both pools, which the request will use
+    statements = []
+    with app.app_context():
+        pools = (get_pool(), get_pool(readonly=True))
+    connections = [pool.acquire() for pool in pools]
+    for pool, db in zip(pools, connections):
+        db.set_trace_callback(statements.append)
+        pool.release(db)
+    try:
+        response = client.post(path, data={"title": "updated", "body": ""})
+    finally:
+        for db in connections:
+            db.set_trace_callback(None)
+    assert response.status_code == 302
+    # Statements run by triggers start with --, and sqlite traces the
+    #   statement again for every trigger it runs
+    statements = {s for s in statements if "post" in s and s[:2] != "--"}
+    assert len(statements) == 1
+    assert "AND author_id = 1" in statements.pop()
+
 @pytest.mark.parametrize("path", (
     "/create",
     "/1/update"
@@ -107,3 +169,367 @@ def test_delete(client, auth, app):
         db = get_db()
         post = db.execute("SELECT * FROM post WHERE id = 1").fetchone()
         assert post is None
+
+def test_index_pagination(app, client):
+    """
+    Check that the index shows POSTS_PER_PAGE posts at a time,
+        and that the older/newer links walk through every post exactly once
+    """
+    app.config["POSTS_PER_PAGE"] = 2
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            "INSERT INTO post (title, body, author_id, created)"
+            " VALUES (?, '', 1, '2018-01-02 00:00:00')",
+            [("post {0}".format(i), ) for i in range(4)]
+        )
+        db.commit()
+
+    # Posts with the same created timestamp are ordered by id
+    response = client.get("/")
+    assert b"post 3" in response.data and b"post 2" in response.data
+    assert b"Newer posts" not in response.data
+    older = response.data.split(b'class="next" href="')[1].split(b'"')[0]
+
+    response = client.get(older.decode())
+    assert b"post 1" in response.data and b"post 0" in response.data
+    assert b"Newer posts" in response.data
+    older = response.data.split(b'class="next" href="')[1].split(b'"')[0]
+
+    response = client.get(older.decode())
+    assert b"test title" in response.data
+    assert b"Older posts" not in response.data
+    newer = response.data.split(b'class="prev" href="')[1].split(b'"')[0]
+
+    response = client.get(newer.decode())
+    assert b"post 1" in response.data and b"post 0" in response.data
+
+def walk_pages(client, url):
+    """
+    Follows the Older posts links from url,
+        and returns every response on the way
+    """
+    responses = []
+    while url:
+        response = client.get(url)
+        responses.append(response)
+        parts = response.data.split(b'class="next" href="')
+        url = parts[1].split(b'"')[0].decode() if len(parts) > 1 else None
+    return responses
+
+@pytest.mark.parametrize("path", ("/", "/u/test"))
+def test_streamed_pages(app, client, path):
+    """
+    Check that with STREAM_PAGES the pages of posts are streamed,
+        and come out the same as when they are rendered at once
+    """
+    app.config["POSTS_PER_PAGE"] = 2
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            "INSERT INTO post (title, body, excerpt, author_id, created)"
+            " VALUES (?, '', '', 1, '2018-01-02 00:00:00')",
+            [("post {0}".format(i), ) for i in range(4)]
+        )
+        db.commit()
+
+    app.config["STREAM_PAGES"] = True
+    streamed = walk_pages(client, path)
+    assert len(streamed) == 3
+    # Streamed responses do not know their length up front
+    assert all("Content-Length" not in r.headers for r in streamed)
+    # Going back from the last page is not streamed, but has to work too
+    newer = streamed[-1].data.split(b'class="prev" href="')[1].split(b'"')[0]
+    assert b"post 1" in client.get(newer.decode()).data
+
+    app.config["STREAM_PAGES"] = False
+    rendered = walk_pages(client, path)
+    assert [r.data for r in streamed] == [r.data for r in rendered]
+
+def test_index_invalid_cursor(client):
+    """
+    Check that a tampered page cursor is rejected with 400 error
+    """
+    assert client.get("/?before=garbage").status_code == 400
+
+@pytest.mark.parametrize("value", (
+    "2018-01-01 00:00:00|99999999999999999999999",
+    "2018-01-01 00:00:00|-1",
+    "yesterday|1",
+))
+def test_index_cursor_out_of_range(client, value):
+    """
+    Check that a cursor with an id sqlite cannot hold, or without
+        a timestamp, is rejected with 400 error before it is queried
+    """
+    cursor = base64.urlsafe_b64encode(value.encode()).decode()
+    for arg in ("before", "after"):
+        response = client.get("/", query_string={arg: cursor})
+        assert response.status_code == 400
+
+def test_detail(client):
+    """
+    Check that /id shows the whole post, and 404 for a missing post
+    """
+    response = client.get("/1")
+    assert b"test title" in response.data
+    assert b"test\nbody" in response.data
+    assert client.get("/2").status_code == 404
+
+def test_excerpt(client, auth, app):
+    """
+    Check that the index only shows the excerpt of a long post
+        with a link to the whole post, which /id shows
+    """
+    app.config["POST_EXCERPT_LENGTH"] = 20
+    auth.login()
+    body = "first words of a long post " + "and more " * 100 + "the end"
+    client.post("/create", data={"title": "long", "body": body})
+
+    response = client.get("/")
+    assert b"first words of a..." in response.data
+    assert b"Read more" in response.data
+    assert b"the end" not in response.data
+    assert b"the end" in client.get("/2").data
+
+    client.post("/2/update", data={"title": "long", "body": "short now"})
+    response = client.get("/")
+    assert b"short now" in response.data
+    assert b"Read more" not in response.data
+
+    # A short post ending like an excerpt is still shown whole
+    client.post("/2/update", data={"title": "long", "body": "to be continued..."})
+    response = client.get("/")
+    assert b"to be continued..." in response.data
+    assert b"Read more" not in response.data
+
+@pytest.mark.parametrize(("body", "excerpt"), (
+    ("short", "short"),
+    ("exactly ten", "exactly ten"),
+    ("two words here", "two words..."),
+    ("averyveryverylongword", "averyveryve..."),
+))
+def test_make_excerpt(app, body, excerpt):
+    """
+    Check that excerpts keep whole words when they can
+    """
+    app.config["POST_EXCERPT_LENGTH"] = 11
+    with app.app_context():
+        assert make_excerpt(body) == excerpt
+
+def test_update_sets_updated(client, auth, app):
+    """
+    Check that /update moves the updated timestamp of the post forward
+    """
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE post SET updated = '2018-01-01 00:00:00'")
+        db.commit()
+
+    auth.login()
+    client.post("/1/update", data={"title": "updated", "body": ""})
+
+    with app.app_context():
+        post = get_db().execute("SELECT * FROM post WHERE id = 1").fetchone()
+        assert post["updated"] > post["created"]
+
+def test_author(client):
+    """
+    Check that /u/username shows the posts of that user and how many
+        there are, and 404 for a missing user
+    """
+    response = client.get("/u/test")
+    assert b"Posts by test" in response.data
+    assert b"1 post<" in response.data
+    assert b"test title" in response.data
+
+    response = client.get("/u/other")
+    assert b"0 posts" in response.data
+    assert b"test title" not in response.data
+    assert client.get("/u/nobody").status_code == 404
+
+def test_author_post_count(client, auth, app):
+    """
+    Check that the post count of a user follows the posts
+        they create and delete
+    """
+    auth.login()
+    client.post("/create", data={"title": "second", "body": ""})
+    assert b"2 posts" in client.get("/u/test").data
+
+    client.post("/1/delete")
+    client.post("/2/delete")
+    with app.app_context():
+        assert get_db().execute(
+            "SELECT post_count FROM user WHERE username = 'test'"
+        ).fetchone()[0] == 0
+
+def test_author_pagination(app, client):
+    """
+    Check that the pages of an author only walk through their own posts,
+        and that the query uses the post_author_created_id index
+    """
+    app.config["POSTS_PER_PAGE"] = 1
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            "INSERT INTO post (title, body, author_id, created)"
+            " VALUES (?, '', ?, '2018-01-02 00:00:00')",
+            [("post {0}".format(i), i % 2 + 1) for i in range(4)]
+        )
+        db.commit()
+        plan = db.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM post WHERE author_id = 1"
+            " AND (created, id) < ('2019-01-01', 1) ORDER BY created DESC, id DESC"
+        ).fetchall()
+        assert "post_author_created_id" in str([tuple(row) for row in plan])
+
+    titles = []
+    url = "/u/test"
+    while url:
+        response = client.get(url)
+        titles += [title for title in (b"post 0", b"post 2", b"test title")
+                   if title in response.data]
+        assert b"post 1" not in response.data and b"post 3" not in response.data
+        parts = response.data.split(b'class="next" href="')
+        url = parts[1].split(b'"')[0].decode() if len(parts) > 1 else None
+    assert titles == [b"post 2", b"post 0", b"test title"]
+
+def test_search(client, auth):
+    """
+    Check that /search finds posts by the words of their title and body,
+        and keeps up with created, updated and deleted posts
+    """
+    assert client.get("/search").status_code == 200
+    response = client.get("/search?q=body")
+    assert b"test title" in response.data
+    assert b"test\n<mark>body</mark>" in response.data
+
+    auth.login()
+    client.post("/create", data={"title": "second", "body": "<b>bodies</b>"})
+    response = client.get("/search?q=body")
+    assert b"second" in response.data
+    # Words are stemmed, and the post text is escaped
+    assert b"&lt;b&gt;<mark>bodies</mark>&lt;/b&gt;" in response.data
+
+    client.post("/1/update", data={"title": "updated", "body": "changed"})
+    client.post("/2/delete")
+    response = client.get("/search?q=body")
+    assert b"No posts match" in response.data
+    assert b"updated" in client.get("/search?q=changed").data
+
+@pytest.mark.parametrize("q", ('"', "test*", "body OR", "NEAR(", "a:b"))
+def test_search_syntax(client, q):
+    """
+    Check that FTS5 syntax characters typed by the user are searched for
+        instead of failing the query
+    """
+    assert client.get("/search", query_string={"q": q}).status_code == 200
+
+def test_search_bad_args(client):
+    """
+    Check that control characters are left out of the search,
+        and that pages beyond MAX_SEARCH_PAGE are rejected with 400 error
+    """
+    for q in ("\x00", "test\x00", "\x01\x7f"):
+        assert client.get("/search", query_string={"q": q}).status_code == 200
+    assert b"test title" in client.get("/search?q=test%00").data
+    assert client.get("/search?q=x&page=101").status_code == 400
+    assert client.get(
+        "/search?q=x&page=99999999999999999999"
+    ).status_code == 400
+
+def test_search_pagination(app, client):
+    """
+    Check that search results are paged by POSTS_PER_PAGE,
+        best matches first
+    """
+    app.config["POSTS_PER_PAGE"] = 1
+    with app.app_context():
+        db = get_db()
+        db.execute(
+            "INSERT INTO post (title, body, author_id) VALUES ('body', '', 1)"
+        )
+        db.commit()
+
+    response = client.get("/search?q=body")
+    assert b"<mark>body</mark></a>" not in response.data
+    assert b">body</a>" in response.data
+    assert b"More matches" in response.data
+    response = client.get("/search?q=body&page=2")
+    assert b"test title" in response.data
+    assert b"Better matches" in response.data
+    assert b"More matches" not in response.data
+
+ATOM = "{http://www.w3.org/2005/Atom}"
+
+def test_feeds(app, client):
+    """
+    Check that the Atom and RSS feeds hold the FEED_SIZE latest posts,
+        newest first, with absolute links to them
+    """
+    app.config["FEED_SIZE"] = 2
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            "INSERT INTO post (title, body, author_id, created)"
+            " VALUES (?, 'a < b', 1, ?)",
+            [("post {0}".format(i), "2019-01-0{0} 00:00:00".format(i + 1))
+             for i in range(3)]
+        )
+        db.commit()
+
+    response = client.get("/feed.atom")
+    assert response.mimetype == "application/atom+xml"
+    feed = ElementTree.fromstring(response.data)
+    entries = feed.findall(ATOM + "entry")
+    assert [entry.find(ATOM + "title").text for entry in entries] == \
+        ["post 2", "post 1"]
+    assert entries[0].find(ATOM + "id").text == "http://localhost/4"
+    assert entries[0].find(ATOM + "published").text == "2019-01-03T00:00:00Z"
+    assert entries[0].find(ATOM + "content").text == "a < b"
+
+    response = client.get("/feed.rss")
+    assert response.mimetype == "application/rss+xml"
+    items = ElementTree.fromstring(response.data).findall("channel/item")
+    assert [item.find("title").text for item in items] == ["post 2", "post 1"]
+    assert items[0].find("pubDate").text == "Thu, 03 Jan 2019 00:00:00 GMT"
+
+    assert b'href="/feed.atom"' in client.get("/").data
+
+def test_feed_query_plan(app):
+    """
+    Check that the feeds read the latest posts off the post_created_id index
+        instead of sorting every post
+    """
+    with app.app_context():
+        plan = get_db().execute("EXPLAIN QUERY PLAN " + FEED_QUERY, (20, ))
+        plan = str([tuple(row) for row in plan])
+    assert "post_created_id" in plan
+    assert "TEMP B-TREE" not in plan
+
+@pytest.mark.parametrize("url", ("/feed.atom", "/feed.rss"))
+def test_feed_cached_until_write(app, client, auth, monkeypatch, url):
+    """
+    Check that a feed is rendered once for everybody, answered with 304
+        while the posts are unchanged, and rendered again after a write
+    """
+    response = client.get(url)
+    etag = response.headers["ETag"]
+    assert "Cookie" not in response.vary
+
+    render_feed = blog.render_feed
+    def fail_to_render(*args):
+        raise AssertionError("The feed was rendered again")
+    monkeypatch.setattr(blog, "render_feed", fail_to_render)
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    auth.login()
+    response = client.get(url)
+    assert response.status_code == 200 and b"test title" in response.data
+    assert response.headers["ETag"] == etag
+
+    client.post("/1/update", data={"title": "updated", "body": ""})
+    monkeypatch.setattr(blog, "render_feed", render_feed)
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert b"updated" in response.data
@@ -0,0 +1,37 @@
+import inspect
+
+import pytest
+
+# The async views need asgiref, which is an optional dependency
+pytest.importorskip("asgiref")
+
+from flaskr.asyncdb import get_async_db
+
+# Run every test of test_blog.py again with the async variants of the views
+from test_blog import *
+
+pytestmark = pytest.mark.parametrize(
+    "app", [{"ASYNC_VIEWS": True}], indirect=True
+)
+
+def test_views_are_async(app):
+    """
+    Checks that ASYNC_VIEWS replaces the blog views by async ones
+    """
+    assert inspect.iscoroutinefunction(app.view_functions["blog.search"])
+
+def test_async_connection(app):
+    """
+    Checks that AsyncConnection runs statements on the connection
+        of the app context, and that its cursors fetch the rows
+    """
+    async def run():
+        db = get_async_db()
+        await db.execute("UPDATE post SET title = 'async'")
+        await db.commit()
+        cursor = await db.execute("SELECT title FROM post")
+        return await cursor.fetchall()
+
+    with app.test_request_context():
+        rows = app.ensure_sync(run)()
+        assert [row["title"] for row in rows] == ["async"]
@@ -0,0 +1,244 @@
+import sqlite3
+import time
+
+import pytest
+
+from flaskr import blog, create_app
+from flaskr.cache import LRUCache
+from flaskr.db import dispose_pool
+
+def test_lru_evicts_least_recently_used():
+    """
+    Checks that a full LRUCache forgets the entry that was used longest ago
+    """
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+def test_lru_ttl(monkeypatch):
+    """
+    Checks that LRUCache entries are forgotten after ttl seconds
+    """
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = LRUCache(ttl=10)
+    cache.set("a", 1)
+
+    now[0] += 9
+    assert cache.get("a") == 1
+    now[0] += 1
+    assert cache.get("a") is None
+
+def delete_posts_behind_cache(app):
+    """
+    Deletes every post without going through the views,
+        on a connection of its own like another process would
+    """
+    db = sqlite3.connect(app.config["DATABASE"])
+    db.execute("DELETE FROM post")
+    db.commit()
+    db.close()
+
+def fail_to_render(monkeypatch):
+    """
+    Makes rendering the index fail, so that only cached pages can be served
+    """
+    def render_index(*args):
+        raise AssertionError("The index was rendered again")
+    monkeypatch.setattr(blog, "render_index", render_index)
+
+def test_index_served_from_cache(client, auth, monkeypatch):
+    """
+    Checks that the index is rendered once and then served from the cache,
+        separately for anonymous and logged in visitors
+    """
+    assert b"test title" in client.get("/").data
+    auth.login()
+    assert b"href=\"/1/update\"" in client.get("/").data
+
+    fail_to_render(monkeypatch)
+    response = client.get("/")
+    assert b"test title" in response.data
+    assert b"href=\"/1/update\"" in response.data
+
+    auth.logout()
+    response = client.get("/")
+    assert b"test title" in response.data
+    assert b"href=\"/1/update\"" not in response.data
+
+def test_index_cache_keyed_by_cursor(client, monkeypatch):
+    """
+    Checks that every page of the index has its own cache entry
+    """
+    client.get("/")
+    fail_to_render(monkeypatch)
+    assert b"test title" in client.get("/").data
+    with pytest.raises(AssertionError):
+        client.get("/?before=MjAxOS0wMS0wMXw1")
+
+def test_cache_sees_writes_of_other_processes(app, client):
+    """
+    Checks that a page is not served from the cache once the posts
+        were changed by someone else, who could not clear our cache
+    """
+    assert b"test title" in client.get("/").data
+    assert b"test title" in client.get("/1").data
+    delete_posts_behind_cache(app)
+    assert b"test title" not in client.get("/").data
+    assert client.get("/1").status_code == 404
+
+def test_writes_invalidate_cache(app, client, auth):
+    """
+    Checks that creating, updating and deleting a post
+        drop the cached pages
+    """
+    auth.login()
+    client.get("/")
+
+    client.post("/create", data={"title": "created", "body": ""})
+    assert b"created" in client.get("/").data
+
+    client.post("/1/update", data={"title": "updated", "body": ""})
+    assert b"updated" in client.get("/").data
+
+    client.post("/1/delete")
+    assert b"updated" not in client.get("/").data
+
+def test_null_cache(app):
+    """
+    Checks that PAGE_CACHE = "null" turns the page cache off
+    """
+    app = create_app({
+        "TESTING": True,
+        "DATABASE": app.config["DATABASE"],
+        "PAGE_CACHE": "null",
+    })
+    client = app.test_client()
+    client.get("/")
+    delete_posts_behind_cache(app)
+    assert b"test title" not in client.get("/").data
+    dispose_pool(app)
+
+@pytest.mark.parametrize("path", ("/", "/1"))
+def test_conditional_get(client, auth, path):
+    """
+    Checks that a page is answered with 304 when the client sends back
+        its ETag or Last-Modified, and in full again after a post changes
+    """
+    response = client.get(path)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    last_modified = response.headers["Last-Modified"]
+
+    response = client.get(path, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    response = client.get(path, headers={"If-Modified-Since": last_modified})
+    assert response.status_code == 304
+
+    auth.login()
+    client.post("/1/update", data={"title": "updated", "body": ""})
+    auth.logout()
+
+    response = client.get(path, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+def test_conditional_get_after_write_behind_cache(app, client):
+    """
+    Checks that after someone else adds a post, the page that comes with
+        the new ETag has the new post, so a 304 for that ETag is right
+    """
+    old_etag = client.get("/").headers["ETag"]
+
+    db = sqlite3.connect(app.config["DATABASE"])
+    db.execute(
+        "INSERT INTO post (title, body, author_id) VALUES ('behind', '', 2)"
+    )
+    db.commit()
+    db.close()
+
+    response = client.get("/", headers={"If-None-Match": old_etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != old_etag
+    assert b"behind" in response.data
+
+    response = client.get("/", headers={"If-None-Match": response.headers["ETag"]})
+    assert response.status_code == 304
+
+def test_conditional_get_per_user(client, auth):
+    """
+    Checks that the ETag of a page differs between logged in users,
+        since they do not see the same page
+    """
+    etag = client.get("/").headers["ETag"]
+    auth.login()
+    response = client.get("/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert b"Log Out" in response.data
+
+@pytest.mark.parametrize("app", [{"PAGE_CACHE": "null"}], indirect=True)
+def test_fragment_cache(app, client):
+    """
+    Checks that a rendered post is reused on the index
+        until its version changes
+    """
+    client.get("/")
+
+    db = sqlite3.connect(app.config["DATABASE"])
+    db.execute("UPDATE post SET title = 'changed'")
+    db.commit()
+    assert b"test title" in client.get("/").data
+
+    db.execute("UPDATE post SET version = version + 1")
+    db.commit()
+    db.close()
+    assert b"changed" in client.get("/").data
+
+def test_fragment_cache_invalidated(client, auth):
+    """
+    Checks that updating a post through the view drops its rendered HTML,
+        even within the same second
+    """
+    auth.login()
+    client.get("/")
+    client.post("/1/update", data={"title": "updated", "body": ""})
+    assert b"updated" in client.get("/").data
+
+@pytest.mark.parametrize("app", [{"PAGE_CACHE": "null"}], indirect=True)
+def test_fragment_cache_edits_of_other_processes(app, client):
+    """
+    Checks that a post edited by another process within the same second
+        as its last edit is not shown from the cache
+    """
+    other = create_app({"TESTING": True, "DATABASE": app.config["DATABASE"]})
+    with other.app_context():
+        blog.update_post(1, "first edit", "", 1)
+    assert b"first edit" in client.get("/").data
+
+    with other.app_context():
+        blog.update_post(1, "second edit", "", 1)
+    assert b"second edit" in client.get("/").data
+    dispose_pool(other)
+
+@pytest.mark.parametrize("app", [{"TEMPLATE_BYTECODE_CACHE": None}], indirect=True)
+def test_template_bytecode_cache_off(app):
+    """
+    Checks that TEMPLATE_BYTECODE_CACHE = None turns the bytecode cache off
+    """
+    assert app.jinja_env.bytecode_cache is None
+
+def test_template_bytecode_cache(tmp_path):
+    """
+    Checks that compiled templates are written to TEMPLATE_BYTECODE_CACHE
+    """
+    app = create_app({"TESTING": True, "TEMPLATE_BYTECODE_CACHE": str(tmp_path)})
+    app.jinja_env.get_template("base.html")
+    assert list(tmp_path.iterdir())
@@ -1,7 +1,12 @@
 import sqlite3
 
 import pytest
-from flaskr.db import get_db
+from flask import current_app
+from flaskr import db as flaskr_db
+from flaskr.db import (
+    MIGRATIONS, PRAGMA_PROFILES, dispose_pool, get_db, get_pool,
+    get_read_db, get_schema_version, migrate
+)
 
 def test_get_close_db(app):
     """
@@ -31,3 +36,261 @@ def test_init_db_command(runner, monkeypatch):
     result = runner.invoke(args=["init-db"])
     assert "Initialized" in result.output
     assert Recorder.called
+
+def test_pool_reuses_connections(app):
+    """
+    Checks that a connection given back at the end of an app context
+        is handed out again in the next one
+    """
+    with app.app_context():
+        first = get_db()._db
+
+    with app.app_context():
+        assert get_db()._db is first
+
+def test_pool_replaces_broken_connections(app):
+    """
+    Checks that an idle connection that fails the health check
+        is thrown away instead of being handed out
+    """
+    with app.app_context():
+        broken = get_db()._db
+    broken.close()
+
+    with app.app_context():
+        db = get_db()
+        assert db._db is not broken
+        assert db.execute("SELECT 1").fetchone()[0] == 1
+
+def test_pool_rolls_back_uncommitted_work(app):
+    """
+    Checks that uncommitted writes of one app context
+        do not leak into the next one through the pooled connection
+    """
+    with app.app_context():
+        get_db().execute("DELETE FROM post")
+
+    with app.app_context():
+        assert get_db().execute("SELECT COUNT(*) FROM post").fetchone()[0] == 1
+
+def test_pool_disabled(app):
+    """
+    Checks that DATABASE_POOL_SIZE = 0 opens a new connection every time
+    """
+    app.config["DATABASE_POOL_SIZE"] = 0
+    dispose_pool(app)
+
+    with app.app_context():
+        first = get_db()._db
+
+    with app.app_context():
+        assert get_db()._db is not first
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        first.execute("SELECT 1")
+
+def test_pragma_profile(app):
+    """
+    Checks that the pragmas of the configured profile
+        are applied to the connections get_db hands out
+    """
+    with app.app_context():
+        db = get_db()
+        assert db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert db.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+        assert db.execute("PRAGMA temp_store").fetchone()[0] == 2
+
+@pytest.mark.parametrize(("pragmas", "readable"), (
+    ({"busy_timeout": 50, "journal_mode": "DELETE"}, False),
+    (dict(PRAGMA_PROFILES["wal"], busy_timeout=50), True),
+))
+def test_readers_during_write(app, client, pragmas, readable):
+    """
+    Checks that while a writer holds the write lock,
+        the index cannot be read with a rollback journal,
+        but keeps serving the last committed posts in WAL mode
+    """
+    app.config["DATABASE_PRAGMAS"] = pragmas
+    dispose_pool(app)
+
+    with app.app_context():
+        writer = get_pool().connect()
+    writer.execute("BEGIN EXCLUSIVE")
+    writer.execute(
+        "INSERT INTO post (title, body, author_id) VALUES ('uncommitted', '', 1)"
+    )
+
+    try:
+        if readable:
+            response = client.get("/")
+            assert b"test title" in response.data
+            assert b"uncommitted" not in response.data
+        else:
+            with pytest.raises(sqlite3.OperationalError) as e:
+                client.get("/")
+            assert "locked" in str(e)
+    finally:
+        writer.rollback()
+        writer.close()
+
+def test_read_db_is_read_only(app):
+    """
+    Checks that the connections of get_read_db cannot write,
+        but see what get_db has committed
+    """
+    with app.app_context():
+        db = get_read_db()
+        assert db.execute("PRAGMA query_only").fetchone()[0] == 1
+        assert db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        with pytest.raises(sqlite3.OperationalError) as e:
+            db.execute("DELETE FROM post")
+        assert "readonly" in str(e.value)
+
+    with app.app_context():
+        get_db().execute("DELETE FROM post")
+        get_db().commit()
+    with app.app_context():
+        count = get_read_db().execute("SELECT COUNT(*) FROM post").fetchone()
+        assert count[0] == 0
+
+def test_read_db_after_write(app):
+    """
+    Checks that a request that has the writing connection reads from it
+    """
+    with app.app_context():
+        read_db = get_read_db()
+        db = get_db()
+        assert get_read_db() is db and read_db is not db
+
+def test_read_replica(app, client, auth, tmp_path):
+    """
+    Checks that with DATABASE_READ pages are read from the replica,
+        while writes still go to DATABASE
+    """
+    replica = str(tmp_path / "replica.sqlite")
+    with app.app_context():
+        with sqlite3.connect(replica) as copy:
+            get_db().backup(copy)
+        copy.close()
+    app.config["DATABASE_READ"] = replica
+    dispose_pool(app)
+
+    auth.login()
+    client.post("/create", data={"title": "not replicated", "body": ""})
+    assert b"not replicated" not in client.get("/").data
+    with app.app_context():
+        count = get_db().execute("SELECT COUNT(*) FROM post").fetchone()
+        assert count[0] == 2
+
+def test_rebuild_search_command(runner, app):
+    """
+    Checks that flask rebuild-search adds the search index
+        to a database made without it, and fills it with the posts
+    """
+    with app.app_context():
+        db = get_db()
+        db.execute("DROP TABLE post_fts")
+        db.commit()
+
+    result = runner.invoke(args=["rebuild-search"])
+    assert "Rebuilt" in result.output
+
+    with app.app_context():
+        assert get_db().execute(
+            "SELECT rowid FROM post_fts WHERE post_fts MATCH 'body'"
+        ).fetchall()[0][0] == 1
+
+def make_first_schema(app):
+    """
+    Makes the database of app like one created by the first schema.sql,
+        with one user and one post
+    """
+    with app.app_context():
+        db = get_db()
+        with current_app.open_resource("schema.sql") as f:
+            db.executescript(f.read().decode("utf-8"))
+        db.execute("INSERT INTO user (username, password) VALUES ('a', 'x')")
+        db.execute(
+            "INSERT INTO post (title, body, author_id, created)"
+            " VALUES ('old title', 'old body', 1, '2018-01-01 00:00:00')"
+        )
+        db.commit()
+
+def test_migrate_marks_truncated_excerpts(app, runner):
+    """
+    Checks that the migrations mark the old posts whose excerpt
+        is only the beginning of their body
+    """
+    make_first_schema(app)
+    app.config["POST_EXCERPT_LENGTH"] = 3
+    runner.invoke(args=["migrate"])
+
+    with app.app_context():
+        post = get_db().execute("SELECT excerpt, truncated FROM post").fetchone()
+    assert post["excerpt"] == "old..."
+    assert post["truncated"]
+
+def test_init_db_is_up_to_date(app):
+    """
+    Checks that init_db applies every migration
+    """
+    with app.app_context():
+        assert get_schema_version(get_db()) == len(MIGRATIONS)
+
+def test_migrate_command(app, runner):
+    """
+    Checks that flask migrate brings a database of the first schema
+        up to date without losing its posts, and does nothing the next time
+    """
+    make_first_schema(app)
+
+    result = runner.invoke(args=["migrate"])
+    assert "from version 0 to {0}".format(len(MIGRATIONS)) in result.output
+
+    with app.app_context():
+        db = get_db()
+        post = db.execute("SELECT * FROM post").fetchone()
+        assert post["title"] == "old title"
+        assert post["updated"] == post["created"]
+        assert post["version"] == 0
+        assert db.execute(
+            "SELECT rowid FROM post_fts WHERE post_fts MATCH 'old'"
+        ).fetchone()[0] == post["id"]
+
+        assert post["excerpt"] == "old body"
+        assert not post["truncated"]
+
+        revision = db.execute("SELECT revision FROM post_revision").fetchone()[0]
+        db.execute(
+            "INSERT INTO post (title, body, author_id) VALUES ('new', '', 1)"
+        )
+        db.commit()
+        assert db.execute(
+            "SELECT revision FROM post_revision"
+        ).fetchone()[0] == revision + 1
+        assert db.execute("SELECT post_count FROM user").fetchone()[0] == 2
+
+    result = runner.invoke(args=["migrate"])
+    assert "up to date" in result.output
+
+def test_failed_migration_rolls_back(app, monkeypatch):
+    """
+    Checks that a migration that fails leaves the database
+        at the version of the last one that worked
+    """
+    make_first_schema(app)
+
+    def broken(db):
+        db.execute("CREATE TABLE half_done (id INTEGER)")
+        raise RuntimeError("broken migration")
+
+    monkeypatch.setattr(flaskr_db, "MIGRATIONS", MIGRATIONS[:1] + (broken, ))
+    with app.app_context():
+        with pytest.raises(RuntimeError):
+            migrate()
+
+        db = get_db()
+        assert get_schema_version(db) == 1
+        assert db.execute(
+            "SELECT name FROM sqlite_master WHERE name = 'half_done'"
+        ).fetchone() is None
@@ -0,0 +1,81 @@
+import logging
+
+import pytest
+from flaskr.db import PooledConnection, get_db
+from flaskr.metrics import Metrics
+
+enabled = pytest.mark.parametrize(
+    "app", [{"METRICS_ENABLED": True}], indirect=True
+)
+
+def test_metrics_disabled(app, client):
+    """
+    Checks that without METRICS_ENABLED there is no /_metrics,
+        and connections are not wrapped
+    """
+    assert client.get("/_metrics").status_code == 404
+    with app.app_context():
+        assert isinstance(get_db(), PooledConnection)
+
+@enabled
+def test_request_metrics(client, auth):
+    """
+    Checks that requests are counted and timed by endpoint,
+        with their database, template and password hashing time
+    """
+    client.get("/")
+    client.get("/")
+    auth.login()
+    text = client.get("/_metrics").data.decode()
+
+    assert "# TYPE flaskr_requests_total counter" in text
+    assert (
+        'flaskr_requests_total{endpoint="blog.index",method="GET",status="200"} 2'
+        in text
+    )
+    assert 'flaskr_request_seconds_count{endpoint="blog.index"} 2' in text
+    assert 'flaskr_request_template_seconds_count{endpoint="blog.index"} 2' in text
+
+    lines = dict(line.rsplit(" ", 1) for line in text.splitlines()
+                 if not line.startswith("#"))
+    assert float(lines['flaskr_request_db_seconds_sum{endpoint="blog.index"}']) > 0
+    assert float(lines[
+        'flaskr_request_password_hash_seconds_sum{endpoint="auth.login"}'
+    ]) > 0
+
+@enabled
+def test_query_metrics(client):
+    """
+    Checks that every statement is timed and its rows counted
+    """
+    client.get("/1")
+    text = client.get("/_metrics").data.decode()
+    assert (
+        'flaskr_db_query_seconds_count{sql="SELECT revision, updated'
+        ' FROM post p, post_revision WHERE p.id = ?"} 1'
+    ) in text
+    assert (
+        'flaskr_db_query_rows_total{sql="SELECT revision, updated'
+        ' FROM post p, post_revision WHERE p.id = ?"} 1'
+    ) in text
+
+@pytest.mark.parametrize("app", [{"SLOW_QUERY_SECONDS": 0}], indirect=True)
+def test_slow_query_log(client, caplog):
+    """
+    Checks that statements slower than SLOW_QUERY_SECONDS are logged
+    """
+    with caplog.at_level(logging.WARNING):
+        client.get("/")
+    assert "Slow query" in caplog.text
+    assert "FROM post p JOIN user u" in caplog.text
+
+def test_label_escaping():
+    """
+    Checks that label values are escaped in the Prometheus format
+    """
+    metrics = Metrics()
+    metrics.inc("flaskr_db_query_rows_total", (("sql", 'a "b"\n\\'), ))
+    assert (
+        'flaskr_db_query_rows_total{sql="a \\"b\\"\\n\\\\"} 1'
+        in metrics.render()
+    )
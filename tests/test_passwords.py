@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+from flaskr.db import dispose_pool
+from flaskr.passwords import (
+    RateLimiter, get_executor, hash_password, needs_rehash
+)
+
+def test_rate_limiter(monkeypatch):
+    """
+    Checks that RateLimiter allows limit hits per key within the window,
+        and allows more once the earlier hits leave the window
+    """
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    limiter = RateLimiter(limit=2, window=10)
+
+    assert limiter.hit("a")
+    now[0] += 5
+    assert limiter.hit("a")
+    assert not limiter.hit("a")
+    assert limiter.hit("b")
+
+    now[0] += 5
+    assert limiter.hit("a")
+    assert not limiter.hit("a")
+
+@pytest.mark.parametrize("method", ("pbkdf2:sha256", "pbkdf2:sha256:1000"))
+def test_no_rehash_with_configured_method(app, method):
+    """
+    Checks that a fresh hash does not need to be made again,
+        also when werkzeug fills in the iterations the method leaves out
+    """
+    app.config["PASSWORD_HASH_WORKERS"] = 0
+    app.config["PASSWORD_HASH_METHOD"] = method
+    with app.app_context():
+        assert not needs_rehash(hash_password("secret"))
+
+def test_rehash_other_cost_or_salt(app):
+    """
+    Checks that hashes made with other iterations or salt length
+        than the config need to be made again
+    """
+    app.config["PASSWORD_HASH_WORKERS"] = 0
+    app.config["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:1000"
+    with app.app_context():
+        pwhash = hash_password("secret")
+        app.config["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:2000"
+        assert needs_rehash(pwhash)
+
+        app.config["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:1000"
+        app.config["PASSWORD_SALT_LENGTH"] = 8
+        assert needs_rehash(pwhash)
+
+def test_dispose_pool_stops_executor(app):
+    """
+    Checks that dispose_pool stops the password hashing processes
+    """
+    app.config["PASSWORD_HASH_WORKERS"] = 1
+    with app.app_context():
+        executor = get_executor()
+        assert hash_password("secret")
+    dispose_pool(app)
+    assert "flaskr.password_executor" not in app.extensions
+    with pytest.raises(RuntimeError):
+        executor.submit(len, "")
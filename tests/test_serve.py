@@ -0,0 +1,51 @@
+import sys
+
+import pytest
+from flaskr import serve
+from flaskr.db import dispose_pool, get_pool
+
+def test_default_workers(monkeypatch):
+    """
+    Checks that there are 2 workers per CPU plus 1 by default
+    """
+    monkeypatch.setattr(serve, "get_cpu_count", lambda: 4)
+    assert serve.default_workers() == 9
+
+@pytest.mark.parametrize(("threads", "worker_class"), (
+    (1, "sync"),
+    (4, "gthread"),
+))
+def test_make_options(app, threads, worker_class):
+    """
+    Checks the gunicorn settings of flaskr serve
+    """
+    options = serve.make_options(
+        app, "0.0.0.0:8000", 3, threads, True, 5, 30, 30
+    )
+    assert options["workers"] == 3
+    assert options["threads"] == threads
+    assert options["worker_class"] == worker_class
+    assert options["preload_app"] is True
+    assert options["keepalive"] == 5
+
+def test_post_fork(app):
+    """
+    Checks that a new worker opens one connection of each pool
+    """
+    dispose_pool(app)
+    options = serve.make_options(app, "127.0.0.1:0", 1, 1, True, 5, 30, 30)
+    options["post_fork"](None, None)
+    with app.app_context():
+        assert len(get_pool()._idle) == 1
+        assert len(get_pool(readonly=True)._idle) == 1
+
+def test_serve_without_gunicorn(runner, monkeypatch):
+    """
+    Checks that serve says how to install gunicorn when it is missing
+    """
+    monkeypatch.setitem(sys.modules, "gunicorn", None)
+    monkeypatch.setitem(sys.modules, "gunicorn.app", None)
+    monkeypatch.setitem(sys.modules, "gunicorn.app.base", None)
+    result = runner.invoke(args=["serve"])
+    assert result.exit_code != 0
+    assert "pip install flaskr[serve]" in result.output
@@ -0,0 +1,149 @@
+import json
+import os
+
+import pytest
+from flask import url_for
+from flaskr.blog import create_post, delete_post, update_post
+from flaskr.db import get_db
+from flaskr.staticsite import build_site, changed_pages
+
+def add_posts(app, count, author_id=1, start=0):
+    """
+    Writes count posts by the author, each a second newer than the last,
+        from start seconds into 2019
+    """
+    with app.app_context():
+        for i in range(start, start + count):
+            id = create_post("post {0}".format(i), "body", author_id)
+            get_db().execute(
+                "UPDATE post SET created = datetime('2019-01-01', ?)"
+                " WHERE id = ?", ("+{0} seconds".format(i), id)
+            )
+            get_db().commit()
+
+def read(output, path):
+    """
+    Returns the text of a file of the static site
+    """
+    with open(os.path.join(str(output), path)) as f:
+        return f.read()
+
+def build(app, output, full=False):
+    """
+    Builds the static site and returns the SiteBuilder that did it
+    """
+    with app.app_context():
+        return build_site(str(output), full)
+
+def test_build_static(app, runner, tmp_path):
+    """
+    Checks that build-static renders the index, author and post pages,
+        and links the static files under the names it copied them to
+    """
+    result = runner.invoke(args=["build-static", str(tmp_path)])
+    assert "Rendered" in result.output
+
+    assert "test title" in read(tmp_path, "index.html")
+    assert read(tmp_path, "index.html") == read(tmp_path, "page/1/index.html")
+    assert "test" in read(tmp_path, "1/index.html")
+    assert "Posts by test" in read(tmp_path, "u/test/index.html")
+    assert "Posts by other" in read(tmp_path, "u/other/page/1/index.html")
+    assert "Log Out" not in read(tmp_path, "index.html")
+
+    with app.test_request_context():
+        style = url_for("static", filename="style.css")
+    assert style in read(tmp_path, "index.html")
+    assert os.path.isfile(os.path.join(str(tmp_path), style.lstrip("/")))
+    manifest = json.loads(read(tmp_path, "manifest.json"))
+    assert manifest["order"] == [1]
+
+def test_build_nothing_changed(app, tmp_path):
+    """
+    Checks that building again without changes renders no page
+        and writes no file, unless a full build is asked for
+    """
+    build(app, tmp_path)
+    builder = build(app, tmp_path)
+    assert (builder.rendered, builder.written, builder.removed) == (0, 0, 0)
+
+    builder = build(app, tmp_path, full=True)
+    assert builder.rendered > 0
+    assert builder.written == 0
+
+def test_build_new_post(app, tmp_path):
+    """
+    Checks that a new post renders its own page, the newest pages of the
+        index and all the pages of its author, whose count changed,
+        and that older pages keep their urls
+    """
+    app.config["POSTS_PER_PAGE"] = 2
+    add_posts(app, 4)
+    build(app, tmp_path)
+    assert "post 1" in read(tmp_path, "page/2/index.html")
+
+    add_posts(app, 1, author_id=2, start=10)
+    builder = build(app, tmp_path)
+
+    # The post page, index page 3 and the first,
+    #   and page 1 and the first of its author
+    assert builder.rendered == 1 + 2 + 2
+    assert "post 10" in read(tmp_path, "6/index.html")
+    assert "post 10" in read(tmp_path, "index.html")
+    assert "page/2/" in read(tmp_path, "index.html")
+    assert "page/3/" in read(tmp_path, "page/2/index.html")
+    assert "Posts by other" in read(tmp_path, "u/other/index.html")
+
+def test_build_updated_post(app, tmp_path):
+    """
+    Checks that editing a post renders only its pages again
+    """
+    app.config["POSTS_PER_PAGE"] = 2
+    add_posts(app, 4)
+    build(app, tmp_path)
+
+    with app.app_context():
+        update_post(1, "edited", "body", 1)
+    builder = build(app, tmp_path)
+    # The post page, the index page and the author page it is on
+    assert builder.rendered == 3
+    assert "edited" in read(tmp_path, "page/1/index.html")
+    assert "edited" in read(tmp_path, "u/test/page/1/index.html")
+
+def test_build_deleted_post(app, tmp_path):
+    """
+    Checks that the files of a deleted post and of pages that no longer
+        exist, on the index and the page of its author, are removed
+    """
+    app.config["POSTS_PER_PAGE"] = 2
+    add_posts(app, 2)
+    build(app, tmp_path)
+    assert os.path.isfile(str(tmp_path / "page" / "2" / "index.html"))
+
+    with app.app_context():
+        delete_post(3, 1)
+    builder = build(app, tmp_path)
+    assert builder.removed == 3
+    assert not os.path.exists(str(tmp_path / "3" / "index.html"))
+    assert not os.path.exists(str(tmp_path / "page" / "2" / "index.html"))
+    assert not os.path.exists(str(tmp_path / "u/test/page/2/index.html"))
+    assert "post 0" in read(tmp_path, "index.html")
+    assert "post 1" not in read(tmp_path, "index.html")
+    assert "page/2/" not in read(tmp_path, "index.html")
+
+@pytest.mark.parametrize(("old_ids", "new_ids", "updated", "pages"), (
+    ([1, 2, 3], [1, 2, 3], set(), set()),
+    # A new post goes on the newest page
+    ([1, 2, 3], [1, 2, 3, 4], set(), {2}),
+    # A new page, and the newest page before it gets its link
+    ([1, 2, 3, 4], [1, 2, 3, 4, 5], set(), {2, 3}),
+    # Deleting a post moves every newer post
+    ([1, 2, 3, 4, 5], [1, 3, 4, 5], set(), {1, 2}),
+    ([1, 2, 3], [1, 2, 3], {2}, {1}),
+    ([], [], set(), set()),
+    ([], [1], set(), {1}),
+))
+def test_changed_pages(old_ids, new_ids, updated, pages):
+    """
+    Checks the pages rendered again when posts change, two posts a page
+    """
+    assert changed_pages(old_ids, new_ids, updated, 2) == pages
@@ -0,0 +1,99 @@
+import json
+
+import pytest
+from flaskr.db import get_db
+
+@pytest.mark.parametrize("format", ("jsonl", "csv"))
+def test_export_import_round_trip(app, runner, tmp_path, format):
+    """
+    Checks that posts exported by export-posts are imported again
+        by import-posts with the same title, body, author and times
+    """
+    path = str(tmp_path / "posts")
+    result = runner.invoke(args=["export-posts", path, "--format", format])
+    assert "Exported 1 posts" in result.output
+
+    result = runner.invoke(
+        args=["import-posts", path, "--format", format, "--batch-size", "1"]
+    )
+    assert "Imported 1 posts" in result.output
+
+    with app.app_context():
+        posts = get_db().execute(
+            "SELECT title, body, author_id, created, updated FROM post"
+        ).fetchall()
+        assert len(posts) == 2
+        assert tuple(posts[0]) == tuple(posts[1])
+
+def test_export_jsonl(runner):
+    """
+    Checks that export-posts writes one JSON object per post,
+        with the author by username
+    """
+    result = runner.invoke(args=["export-posts"])
+    # The report goes to the standard error, mixed in by the runner
+    lines = [line for line in result.output.splitlines() if line.startswith("{")]
+    assert len(lines) == 1
+    post = json.loads(lines[0])
+    assert post["title"] == "test title"
+    assert post["body"] == "test\nbody"
+    assert post["author"] == "test"
+    assert post["created"] == "2018-01-01 00:00:00"
+
+def test_import_batches_and_unknown_authors(app, runner):
+    """
+    Checks that import-posts inserts posts in batches, fills in
+        missing times and skips posts of unknown authors
+    """
+    lines = [
+        json.dumps({"title": "imported {0}".format(i), "body": "",
+                    "author": "other"})
+        for i in range(5)
+    ]
+    lines.append(json.dumps({"title": "lost", "body": "", "author": "nobody"}))
+    result = runner.invoke(
+        args=["import-posts", "--batch-size", "2"], input="\n".join(lines)
+    )
+    assert "Imported 5 posts" in result.output
+    assert "Skipped 1 posts" in result.output
+
+    with app.app_context():
+        db = get_db()
+        assert db.execute(
+            "SELECT COUNT(*) FROM post WHERE author_id = 2"
+            " AND created IS NOT NULL AND updated IS NOT NULL"
+        ).fetchone()[0] == 5
+        assert db.execute(
+            "SELECT COUNT(*) FROM post WHERE title = 'lost'"
+        ).fetchone()[0] == 0
+
+def test_import_normalizes_times(app, client, runner):
+    """
+    Checks that import-posts stores ISO 8601 times and dates in UTC in the
+        form sqlite reads back, and skips posts with invalid times
+    """
+    posts = [
+        ("zulu", "2018-01-01T10:00:00Z"),
+        ("offset", "2018-01-01T12:00:00+02:00"),
+        ("date", "2018-01-02"),
+        ("broken", "yesterday"),
+        ("number", 5),
+    ]
+    lines = [
+        json.dumps({"title": title, "body": "", "author": "test",
+                    "created": created, "updated": created})
+        for title, created in posts
+    ]
+    result = runner.invoke(args=["import-posts"], input="\n".join(lines))
+    assert "Imported 3 posts" in result.output
+    assert "Skipped 2 posts with invalid times" in result.output
+
+    with app.app_context():
+        times = dict(get_db().execute(
+            "SELECT title, CAST(created AS TEXT) FROM post"
+        ).fetchall())
+    assert times["zulu"] == "2018-01-01 10:00:00"
+    assert times["offset"] == "2018-01-01 10:00:00"
+    assert times["date"] == "2018-01-02 00:00:00"
+    assert client.get("/").status_code == 200
+    assert client.get("/feed.atom").status_code == 200
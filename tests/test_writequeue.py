@@ -0,0 +1,168 @@
+import os
+import sqlite3
+import time
+
+import pytest
+from flaskr.db import get_db, get_pool
+from flaskr.metrics import Metrics
+from flaskr.writequeue import WriteQueue, get_write_queue, write
+
+def insert_post(title):
+    """
+    Returns a write inserting a post of the test user
+    """
+    return lambda db: db.execute(
+        "INSERT INTO post (title, body, author_id) VALUES (?, '', 1)", (title, )
+    ).lastrowid
+
+def count_posts(app):
+    with app.app_context():
+        return get_db().execute("SELECT COUNT(*) FROM post").fetchone()[0]
+
+def test_batches(app):
+    """
+    Checks that writes queued together are committed in one transaction,
+        and that every caller gets the result of its own write
+    """
+    metrics = Metrics()
+    with app.app_context():
+        connect = get_pool().connect
+    # A long latency, so that the writer waits for every write to join
+    write_queue = WriteQueue(connect, 10, 5, metrics)
+    try:
+        futures = [write_queue.submit(insert_post(str(i))) for i in range(10)]
+        ids = [future.result(timeout=5) for future in futures]
+    finally:
+        write_queue.stop()
+
+    assert ids == list(range(2, 12))
+    assert count_posts(app) == 11
+    rendered = metrics.render()
+    assert "flaskr_write_queue_batches_total 1\n" in rendered
+    assert "flaskr_write_queue_writes_total 10\n" in rendered
+    assert "flaskr_write_queue_wait_seconds_count 10\n" in rendered
+
+def test_failed_write(app):
+    """
+    Checks that a failing write is undone and reported to its caller,
+        while the other writes of its batch are committed
+    """
+    def failing(db):
+        insert_post("undone")(db)
+        db.execute("INSERT INTO post (title) VALUES (NULL)")
+
+    with app.app_context():
+        connect = get_pool().connect
+    write_queue = WriteQueue(connect, 3, 5)
+    try:
+        futures = [
+            write_queue.submit(insert_post("first")),
+            write_queue.submit(failing),
+            write_queue.submit(insert_post("last")),
+        ]
+        with pytest.raises(sqlite3.IntegrityError):
+            futures[1].result(timeout=5)
+        futures[2].result(timeout=5)
+    finally:
+        write_queue.stop()
+
+    with app.app_context():
+        titles = [row[0] for row in get_db().execute(
+            "SELECT title FROM post ORDER BY id"
+        )]
+    assert titles == ["test title", "first", "last"]
+
+def test_write_without_queue(app):
+    """
+    Checks that without WRITE_QUEUE writes are committed on get_db
+    """
+    with app.app_context():
+        assert write(insert_post("direct")) == 2
+        assert not get_db().in_transaction
+        assert "flaskr.write_queue" not in app.extensions
+    assert count_posts(app) == 2
+
+@pytest.mark.parametrize("app", [{
+    "WRITE_QUEUE": True, "METRICS_ENABLED": True,
+}], indirect=True)
+def test_views_use_queue(app, client, auth):
+    """
+    Checks that register, create, update and delete go through the queue,
+        and that each is committed before the view redirects.
+    The test password is hashed with other settings than the config,
+        so the login writes its new hash as well.
+    """
+    assert client.post(
+        "/auth/register", data={"username": "a", "password": "a"}
+    ).status_code == 302
+    auth.login()
+    client.post("/create", data={"title": "queued", "body": ""})
+    assert b"queued" in client.get("/").data
+    client.post("/2/update", data={"title": "changed", "body": ""})
+    assert b"changed" in client.get("/").data
+    client.post("/2/delete")
+    assert b"changed" not in client.get("/").data
+
+    with app.app_context():
+        assert get_write_queue() is app.extensions["flaskr.write_queue"][1]
+    metrics = client.get("/_metrics").data.decode()
+    assert "flaskr_write_queue_writes_total 5\n" in metrics
+
+def test_writer_failure(app):
+    """
+    Checks that when the writer thread cannot open its connection,
+        queued and later writes fail at once instead of waiting forever,
+        and that get_write_queue then makes a new queue
+    """
+    def connect():
+        # Gives the test time to queue a write first
+        time.sleep(0.1)
+        raise sqlite3.OperationalError("unable to open database file")
+
+    write_queue = WriteQueue(connect, 10, 0)
+    queued = write_queue.submit(insert_post("queued"))
+    with pytest.raises(sqlite3.OperationalError):
+        queued.result(timeout=5)
+    with pytest.raises(sqlite3.OperationalError):
+        write_queue.submit(insert_post("later")).result(timeout=5)
+    write_queue.stop()
+
+    with app.app_context():
+        app.extensions["flaskr.write_queue"] = (os.getpid(), write_queue)
+        assert get_write_queue() is not write_queue
+        assert get_write_queue().submit(insert_post("new")).result(timeout=5)
+    assert count_posts(app) == 2
+
+def test_writer_failing_rollback(app):
+    """
+    Checks that the writes of a batch fail with the error that stopped
+        the writer thread, here a rollback failing on a broken connection
+    """
+    class BrokenConnection(object):
+        in_transaction = True
+        isolation_level = None
+
+        def execute(self, sql):
+            if sql.startswith("PRAGMA"):
+                return None
+            raise sqlite3.DatabaseError(sql)
+
+        def close(self):
+            pass
+
+    write_queue = WriteQueue(BrokenConnection, 10, 0)
+    with pytest.raises(sqlite3.DatabaseError):
+        write_queue.submit(insert_post("lost")).result(timeout=5)
+    write_queue.stop()
+    assert write_queue.error is not None
+
+@pytest.mark.parametrize("app", [{"WRITE_QUEUE": True}], indirect=True)
+def test_writer_durable(app):
+    """
+    Checks that the writer commits with synchronous=FULL,
+        so that a write is on disk once it is acknowledged
+    """
+    with app.app_context():
+        assert write(lambda db: db.execute(
+            "PRAGMA synchronous"
+        ).fetchone()[0]) == 2